@@ -0,0 +1,67 @@
+"""
+Compares the time and CPU used to fetch the listing pages with WortenHttpScraper
+and (optionally) with the Selenium WortenScraper, against the local stand-in site
+
+run from the src folder:
+    python -m benchmarks.bench_http_fetch --selenium
+"""
+import time
+import argparse
+
+from web_scraper import config
+from web_scraper.extract.scraper_config import WORTEN_SP_CONFIG_PER_SYSTEM
+from web_scraper.extract.scraper_http import WortenHttpScraper
+from web_scraper.extract.rate_limiter import AdaptiveRateLimiter
+from web_scraper.extract.scraper_worten import WortenScraper
+from benchmarks.local_site import LocalWortenSite
+
+
+def timed(scrape) -> dict:
+    start, start_cpu = time.perf_counter(), time.process_time()
+    n_pages = sum(section.metadata["n_pages_scraped"] for section in scrape() if section is not None)
+    elapsed = time.perf_counter() - start
+    return {
+        "pages": n_pages,
+        "elapsed_sec": elapsed,
+        "cpu_sec": time.process_time() - start_cpu,
+        "pages_per_sec": n_pages / elapsed,
+    }
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--categories", type=int, default=8)
+    arg_parser.add_argument("--pages", type=int, default=5)
+    arg_parser.add_argument("--latency", type=float, default=0.2, help="server latency per page (s)")
+    arg_parser.add_argument("--selenium", action="store_true", help="also benchmark the Selenium scraper")
+    args = arg_parser.parse_args()
+
+    with LocalWortenSite(args.categories, args.pages, latency_sec=args.latency) as site:
+        base_config = WORTEN_SP_CONFIG_PER_SYSTEM[config.MODE]
+        local_config = base_config.__class__(HOME_PAGE=site.url, MAX_PAGES_PER_SECTION=args.pages)
+        tasks = [(url, None) for url in site.category_urls]
+        results = {}
+
+        # unthrottled, like the Selenium scraper (sleep_pattern_sec=0)
+        rate_limiter = AdaptiveRateLimiter(initial_rate=1000, max_rate=1000, burst=100, jitter=0)
+        http_scraper = WortenHttpScraper(local_config, max_concurrent_sections=4, rate_limiter=rate_limiter)
+        results["http"] = timed(lambda: http_scraper.get_sections(tasks))
+        http_scraper.close()
+
+        if args.selenium:
+            scraper = WortenScraper(local_config, load_wait_sec=10, sleep_pattern_sec=0)
+            scraper.set_headless()
+            scraper.start_chrome()
+            results["selenium"] = timed(lambda: (scraper.try_get_section(url, specs) for url, specs in tasks))
+            scraper.quit()
+
+    print(f"{'engine':>9} {'pages':>6} {'elapsed_s':>10} {'cpu_s':>7} {'pages/s':>8}")
+    for engine, result in results.items():
+        print(
+            f"{engine:>9} {result['pages']:>6} {result['elapsed_sec']:>10.2f} "
+            f"{result['cpu_sec']:>7.2f} {result['pages_per_sec']:>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Compares parsing each section right after scraping it (as run_scraper used to)
+with the ParsePipeline, which parses in worker processes while scraping goes on
+
+The scraping is simulated: each page of synthetic HTML takes --page-wait
+seconds to "load", like a browser waiting on the site, so no Chrome is needed.
+The overlap is the share of the parsing time hidden behind the scraping.
+
+run from the src folder:
+    python -m benchmarks.bench_parse_pipeline --workers 1 2 4
+"""
+import time
+import argparse
+from typing import Iterator
+
+from web_scraper.extract.scraper_base import SectionScrape
+from web_scraper.transform.content_parser import WortenHtmlParser
+from web_scraper.transform.parse_pipeline import ParsePipeline
+from web_scraper.support.worten_pages import listing_page
+
+
+def scrape_sections(n_sections: int, n_pages: int, page_wait_sec: float) -> Iterator[SectionScrape]:
+    for i in range(n_sections):
+        category = f"category-{i}"
+        pages = []
+        for page in range(1, n_pages + 1):
+            time.sleep(page_wait_sec)
+            pages.append(listing_page(category, page, n_pages, seed=i * n_pages + page))
+        specs = {
+            "base_url": category, "n_pages": n_pages,
+            "category_lvl1": "lvl1", "category_lvl2": "lvl2", "category_lvl3": category,
+        }
+        yield SectionScrape(pages, specs, {"n_pages_scraped": n_pages})
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--sections", type=int, default=8)
+    arg_parser.add_argument("--pages", type=int, default=5)
+    arg_parser.add_argument("--page-wait", type=float, default=0.1, help="simulated load time per page (s)")
+    arg_parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    arg_parser.add_argument("--backend", default="html.parser")
+    arg_parser.add_argument(
+        "--restrict", action=argparse.BooleanOptionalAction, default=True,
+        help="parse only the product containers (--no-restrict: the whole page)"
+    )
+    args = arg_parser.parse_args()
+    metadata = {"date": "2022-12-04"}
+
+    # scraping alone and parsing alone, to know how much they could overlap
+    start = time.perf_counter()
+    sections = list(scrape_sections(args.sections, args.pages, args.page_wait))
+    scrape_sec = time.perf_counter() - start
+    parser = WortenHtmlParser(metadata, args.backend, args.restrict)
+    start = time.perf_counter()
+    n_products = sum(len(parser.parse_category(section)) for section in sections)
+    parse_sec = time.perf_counter() - start
+
+    results = {"inline": scrape_sec + parse_sec}
+    for n_workers in args.workers:
+        start = time.perf_counter()
+        with ParsePipeline(
+                metadata, n_workers, backend=args.backend, restrict_to_products=args.restrict) as pipeline:
+            parsed = pipeline.map(scrape_sections(args.sections, args.pages, args.page_wait))
+            assert sum(len(products) for _, products in parsed) == n_products
+        results[f"pipeline x{n_workers}"] = time.perf_counter() - start
+
+    print(f"{args.sections * args.pages} pages, {n_products} products: "
+          f"scraping {scrape_sec:.2f}s, parsing {parse_sec:.2f}s")
+    print(f"{'mode':>12} {'wall_s':>7} {'overlap':>8}")
+    for mode, wall_sec in results.items():
+        overlap = (scrape_sec + parse_sec - wall_sec) / parse_sec
+        print(f"{mode:>12} {wall_sec:>7.2f} {overlap:>8.0%}")
+
+
+if __name__ == "__main__":
+    main()
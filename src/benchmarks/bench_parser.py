@@ -0,0 +1,127 @@
+"""
+Measures the parsing throughput of WortenHtmlParser on synthetic listing pages,
+for each installed backend and page size: pages/s, products/s and the memory
+taken by parsing (how much the peak RSS grew while parsing, the pages aside)
+
+Each configuration runs in its own process, so the peak RSS is its own.
+Results can be saved as a baseline and later runs checked against it, which
+fails (exit code 1) when a configuration got slower than the tolerance allows.
+
+run from the src folder:
+    python -m benchmarks.bench_parser --save-baseline parser_baseline.json
+    python -m benchmarks.bench_parser --baseline parser_baseline.json --tolerance 0.2
+"""
+import sys
+import json
+import time
+import argparse
+import logging
+import resource
+import multiprocessing
+from pathlib import Path
+from typing import Any
+
+from web_scraper.transform import content_parser
+from web_scraper.transform.content_parser import WortenHtmlParser
+from web_scraper.transform.parser_backends import PARSER_BACKENDS
+from web_scraper.support.worten_pages import listing_page
+
+
+def run_config(
+        backend: str,
+        n_products: int,
+        n_pages: int,
+        restrict_to_products: bool,
+        malformed_price_share: float) -> dict[str, Any]:
+    # the malformed prices would log (and time) a warning each
+    content_parser.logger.setLevel(logging.ERROR)
+    pages = [
+        listing_page("bench", page, n_pages, n_products, malformed_price_share=malformed_price_share)
+        for page in range(1, n_pages + 1)
+    ]
+    parser = WortenHtmlParser({"date": "2022-12-04"}, backend, restrict_to_products)
+    # kilobytes on linux
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    n_parsed = sum(1 for page in pages for product in parser.parse_containers(page) if product)
+    elapsed = time.perf_counter() - start
+    return {
+        "pages_per_sec": n_pages / elapsed,
+        "products_per_sec": n_parsed / elapsed,
+        "products": n_parsed,
+        "parse_rss_mb": (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before) / 1024,
+    }
+
+
+def installed_backends() -> list[str]:
+    backends = []
+    for name, backend in PARSER_BACKENDS.items():
+        try:
+            backend()
+        except ImportError:
+            continue
+        backends.append(name)
+    return backends
+
+
+def check_regressions(results: dict[str, dict], baseline: dict[str, dict], tolerance: float) -> list[str]:
+    regressions = []
+    for config, result in results.items():
+        if config not in baseline:
+            continue
+        expected = baseline[config]["pages_per_sec"] * (1 - tolerance)
+        if result["pages_per_sec"] < expected:
+            regressions.append(
+                f"{config}: {result['pages_per_sec']:.1f} pages/s, "
+                f"baseline {baseline[config]['pages_per_sec']:.1f} (-{tolerance:.0%} = {expected:.1f})"
+            )
+    return regressions
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--backends", nargs="+", default=None, help="default: all the installed backends")
+    arg_parser.add_argument("--products", type=int, nargs="+", default=[12, 48, 96], help="products per page")
+    arg_parser.add_argument("--pages", type=int, default=20, help="pages parsed per configuration")
+    arg_parser.add_argument(
+        "--restrict", action=argparse.BooleanOptionalAction, default=True,
+        help="parse only the product containers, like in production (--no-restrict: the whole page)"
+    )
+    arg_parser.add_argument("--malformed", type=float, default=0.05, help="share of malformed prices")
+    arg_parser.add_argument("--save-baseline", type=Path, default=None)
+    arg_parser.add_argument("--baseline", type=Path, default=None)
+    arg_parser.add_argument("--tolerance", type=float, default=0.2, help="slowdown allowed against the baseline")
+    args = arg_parser.parse_args()
+
+    # a fresh process per configuration, so they don't share their peak RSS
+    context = multiprocessing.get_context("spawn")
+    results: dict[str, dict] = {}
+    for backend in args.backends or installed_backends():
+        for n_products in args.products:
+            # keyed by the slicing too, a baseline is only compared with runs of the same mode
+            config = f"{backend}/{n_products}/{'sliced' if args.restrict else 'full'}"
+            with context.Pool(1) as pool:
+                results[config] = pool.apply(
+                    run_config, (backend, n_products, args.pages, args.restrict, args.malformed)
+                )
+
+    print(f"{'backend/products/mode':>28} {'pages/s':>9} {'products/s':>11} {'parse_rss_mb':>13}")
+    for config, result in results.items():
+        print(
+            f"{config:>28} {result['pages_per_sec']:>9.1f} {result['products_per_sec']:>11.0f} "
+            f"{result['parse_rss_mb']:>13.1f}"
+        )
+
+    if args.save_baseline is not None:
+        with open(args.save_baseline, "w") as file:
+            json.dump(results, file, indent=1)
+    if args.baseline is not None:
+        with open(args.baseline) as file:
+            regressions = check_regressions(results, json.load(file), args.tolerance)
+        if regressions:
+            print("slower than the baseline:\n" + "\n".join(regressions))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
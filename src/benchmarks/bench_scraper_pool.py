@@ -0,0 +1,64 @@
+"""
+Benchmarks the scraping throughput (pages/min) of WortenScraperPool against
+a local stand-in site, for an increasing number of workers
+
+run from the src folder (requires Chrome):
+    python -m benchmarks.bench_scraper_pool --workers 1 2 4
+"""
+import time
+import argparse
+
+from web_scraper import config
+from web_scraper.extract.scraper_config import WORTEN_SP_CONFIG_PER_SYSTEM
+from web_scraper.extract.scraper_pool import WortenScraperPool
+from benchmarks.local_site import LocalWortenSite
+
+
+def bench_pool(site: LocalWortenSite, n_workers: int, sleep_pattern_sec: tuple) -> dict:
+    base_config = WORTEN_SP_CONFIG_PER_SYSTEM[config.MODE]
+    local_config = base_config.__class__(
+        HOME_PAGE=site.url,
+        PRODUCT_PAGE_URL=f"{site.url}/diretorio-de-categorias",
+        MAX_PAGES_PER_SECTION=site.n_pages,
+    )
+    pool = WortenScraperPool(local_config, n_workers, load_wait_sec=10, sleep_pattern_sec=sleep_pattern_sec)
+    pool.set_headless()
+
+    start = time.perf_counter()
+    n_pages = 0
+    for section in pool.get_site():
+        if section is not None:
+            n_pages += section.metadata["n_pages_scraped"]
+    elapsed = time.perf_counter() - start
+    return {
+        "workers": n_workers,
+        "pages": n_pages,
+        "elapsed_sec": elapsed,
+        "pages_per_min": 60 * n_pages / elapsed,
+        "failed": len(pool.sections_failed),
+    }
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    arg_parser.add_argument("--categories", type=int, default=8)
+    arg_parser.add_argument("--pages", type=int, default=3)
+    arg_parser.add_argument("--latency", type=float, default=0.2, help="server latency per page (s)")
+    arg_parser.add_argument("--sleep", type=float, nargs=2, default=(0.5, 1.0), help="scraper throttle (s)")
+    args = arg_parser.parse_args()
+
+    with LocalWortenSite(args.categories, args.pages, latency_sec=args.latency) as site:
+        print(f"{'workers':>8} {'pages':>6} {'elapsed_s':>10} {'pages/min':>10} {'speedup':>8}")
+        baseline = None
+        for n_workers in args.workers:
+            result = bench_pool(site, n_workers, tuple(args.sleep))
+            baseline = baseline or result["pages_per_min"]
+            print(
+                f"{result['workers']:>8} {result['pages']:>6} {result['elapsed_sec']:>10.1f} "
+                f"{result['pages_per_min']:>10.1f} {result['pages_per_min'] / baseline:>8.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
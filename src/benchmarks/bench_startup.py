@@ -0,0 +1,70 @@
+"""
+Benchmarks the scraper startup (driver resolution, Chrome launch, home page and
+cookies pop-up) with a cold profile against a warm persistent profile, using
+the local stand-in site
+
+run from the src folder (requires Chrome):
+    python -m benchmarks.bench_startup
+"""
+import time
+import tempfile
+import argparse
+from pathlib import Path
+
+from web_scraper import config
+from web_scraper.extract.scraper_base import resolve_driver_path
+from web_scraper.extract.scraper_config import WORTEN_SP_CONFIG_PER_SYSTEM
+from web_scraper.extract.scraper_worten import WortenScraper
+from benchmarks.local_site import LocalWortenSite
+
+
+def timed_startup(scraper: WortenScraper) -> dict:
+    timings = {}
+    start = time.perf_counter()
+    resolve_driver_path(scraper.config.DRIVER_PATH)
+    timings["driver_sec"] = time.perf_counter() - start
+    scraper.start_chrome()
+    timings["chrome_sec"] = time.perf_counter() - start - timings["driver_sec"]
+    scraper.get_home_page()
+    scraper.rm_cookies_pop_up()
+    timings["total_sec"] = time.perf_counter() - start
+    scraper.quit()
+    return timings
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--runs", type=int, default=3)
+    args = arg_parser.parse_args()
+
+    with LocalWortenSite(latency_sec=0) as site, tempfile.TemporaryDirectory() as profile_dir:
+        base_config = WORTEN_SP_CONFIG_PER_SYSTEM[config.MODE]
+        local_config = base_config.__class__(HOME_PAGE=site.url)
+
+        def scraper(profile: str) -> WortenScraper:
+            scraper = WortenScraper(local_config, load_wait_sec=10)
+            scraper.set_profile(Path(profile_dir) / profile)
+            scraper.set_headless()
+            return scraper
+
+        # an untimed launch first, so the warm profile and driver path are there from the first run
+        timed_startup(scraper("warm"))
+        results = []
+        for run in range(args.runs):
+            # a new profile folder each run, like before persistent profiles, and the
+            # driver resolved again without the cached path (it's written again once resolved)
+            config.DRIVER_CACHE_FN.unlink(missing_ok=True)
+            resolve_driver_path.cache_clear()
+            results.append(("cold", timed_startup(scraper(f"cold_{run}"))))
+            results.append(("warm", timed_startup(scraper("warm"))))
+
+    print(f"{'profile':>8} {'driver_s':>9} {'chrome_s':>9} {'total_s':>8}")
+    for profile, timings in results:
+        print(
+            f"{profile:>8} {timings['driver_sec']:>9.2f} {timings['chrome_sec']:>9.2f} "
+            f"{timings['total_sec']:>8.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Local stand-in for the Worten site, serves the synthetic pages of web_scraper/support/worten_pages
+with a configurable latency so scraping can be benchmarked offline
+"""
+import time
+import threading
+from typing import Optional
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from web_scraper.support import worten_pages
+
+
+class LocalWortenSite:
+    """
+    Serves a home page, a category directory and n_categories level 3 categories
+    with n_pages pages each, on http://127.0.0.1:<port>
+    """
+    def __init__(
+            self,
+            n_categories: int = 8,
+            n_pages: int = 3,
+            n_products: int = 48,
+            latency_sec: float = 0.2,
+            port: int = 0) -> None:
+        self.n_pages = n_pages
+        self.n_products = n_products
+        self.latency_sec = latency_sec
+        self.lvl2_path = "grandes-eletrodomesticos/maquinas-de-roupa"
+        self.lvl3_names = [f"categoria-{i}" for i in range(n_categories)]
+        self.n_requests = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def category_urls(self) -> list[str]:
+        return [f"{self.url}/{self.lvl2_path}/{name}" for name in self.lvl3_names]
+
+    def render(self, path: str, query: dict[str, list[str]]) -> Optional[str]:
+        if path in ("", "/"):
+            return worten_pages.home_page()
+        if path == "/diretorio-de-categorias":
+            return worten_pages.category_directory(
+                {"Grandes Eletrodomésticos": {self.lvl2_path: self.lvl3_names}}
+            )
+        lvl3 = path.rstrip("/").split("/")[-1]
+        if lvl3 in self.lvl3_names:
+            page = int(query.get("page", ["1"])[0])
+            return worten_pages.listing_page(lvl3, page, self.n_pages, self.n_products)
+        return None
+
+    def _handler(self) -> type:
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                url = urlparse(self.path)
+                with site._lock:
+                    site.n_requests += 1
+                time.sleep(site.latency_sec)
+                page = site.render(url.path, parse_qs(url.query))
+                if page is None:
+                    self.send_error(404)
+                    return
+                body = page.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args) -> None:
+                pass
+
+        return Handler
+
+    def start(self) -> "LocalWortenSite":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "LocalWortenSite":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
@@ -2,6 +2,8 @@
 Pytest configuration file with mocks and fixtures
 """
 # TODO: mock Worten config object
+import socket
+from typing import Iterator
 
 import pytest
 
@@ -34,3 +36,33 @@ def worten_scraper() -> scraper_worten.WortenScraper:
     scraper.get_home_page()
     scraper.rm_cookies_pop_up()
     return scraper
+
+
+@pytest.fixture(scope="session")
+def moto_endpoint() -> Iterator[str]:
+    """
+    URL of a local moto server standing in for AWS (S3, DynamoDB)
+    """
+    moto_server = pytest.importorskip("moto.server")
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = moto_server.ThreadedMotoServer(ip_address="127.0.0.1", port=port, verbose=False)
+    server.start()
+    yield f"http://127.0.0.1:{port}"
+    server.stop()
+
+
+@pytest.fixture
+def s3_bucket(moto_endpoint):
+    """
+    S3 client of the moto server and the name of an empty bucket
+    """
+    import boto3
+    client = boto3.client(
+        "s3", endpoint_url=moto_endpoint, region_name="us-east-1",
+        aws_access_key_id="testing", aws_secret_access_key="testing"
+    )
+    bucket = f"shop-scrape-{len(client.list_buckets()['Buckets'])}"
+    client.create_bucket(Bucket=bucket)
+    return client, bucket
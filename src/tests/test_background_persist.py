@@ -0,0 +1,80 @@
+"""
+Unit tests for the background persistence of the scraped sections
+"""
+import threading
+from datetime import datetime
+
+import pytest
+
+from web_scraper.extract.scraper_base import SectionScrape
+from web_scraper.load.background_persist import BackgroundPersist
+from web_scraper.load.persist import Persist
+from web_scraper.support.errors import PersistError
+
+
+def _section(i: int) -> SectionScrape:
+    specs = {"base_url": f"https://www.worten.pt/c{i}", "n_pages": 1}
+    specs.update({f"category_lvl{lvl}": f"c{lvl}-{i}" for lvl in range(1, 4)})
+    metadata = {"datetime": datetime(2022, 12, 4), "n_pages_scraped": 1}
+    return SectionScrape([f"<html>section {i}</html>"], specs, metadata)
+
+
+class _BlockedPersist(Persist):
+    """
+    waits for saving to be allowed, and fails on the sections without pages
+    """
+    def __init__(self, *args) -> None:
+        super().__init__(*args)
+        self.allowed = threading.Event()
+
+    def save_section(self, section_scrape: SectionScrape) -> None:
+        self.allowed.wait()
+        if not section_scrape.html:
+            raise OSError("disk full")
+        super().save_section(section_scrape)
+
+
+def test_sections_saved_in_background(tmp_path) -> None:
+    persist = _BlockedPersist(tmp_path, "20221204_2044")
+    background = BackgroundPersist(persist, max_queued=2)
+    # the writer holds one section and the queue two, then there's no room left
+    for i in range(3):
+        background.save_section(_section(i))
+    blocked = threading.Thread(target=background.save_section, args=(_section(3),))
+    blocked.start()
+    blocked.join(timeout=0.2)
+    assert blocked.is_alive(), "waits for room in the queue"
+
+    persist.allowed.set()
+    blocked.join()
+    assert background.flush() == []
+    background.close()
+    resumed = Persist(tmp_path, "20221204_2044")
+    assert [resumed.load(f"https://www.worten.pt/c{i}") for i in range(4)] == [_section(i) for i in range(4)]
+
+
+def test_failures_reported(tmp_path) -> None:
+    persist = _BlockedPersist(tmp_path, "20221204_2044")
+    persist.allowed.set()
+    failed = SectionScrape([], _section(1).section_specs, {})
+    with pytest.raises(PersistError) as error:
+        with BackgroundPersist(persist, n_writers=2) as background:
+            background.save_section(_section(0))
+            background.save_section(failed)
+            background.save_section(_section(2))
+    assert [url for url, _ in error.value.failures] == ["https://www.worten.pt/c1"]
+    assert background.n_saved == 2
+    saved = Persist(tmp_path, "20221204_2044").extracted_urls()
+    assert saved == {"https://www.worten.pt/c0", "https://www.worten.pt/c2"}
+
+
+def test_run_error_not_masked(tmp_path) -> None:
+    persist = _BlockedPersist(tmp_path, "20221204_2044")
+    persist.allowed.set()
+    with pytest.raises(RuntimeError, match="browser crashed"):
+        with BackgroundPersist(persist) as background:
+            background.save_section(SectionScrape([], _section(1).section_specs, {}))
+            background.save_section(_section(2))
+            raise RuntimeError("browser crashed")
+    # the sections queued before the error are still saved, the failures only logged
+    assert background.n_saved == 1 and len(background.failures) == 1
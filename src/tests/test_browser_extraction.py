@@ -0,0 +1,50 @@
+"""
+Unit tests for the products extracted in the browser, the pages are the HTML
+fixtures and the extraction script is replayed with BeautifulSoup
+"""
+from pathlib import Path
+
+import pytest
+from bs4 import BeautifulSoup
+
+from web_scraper.extract import browser_extraction
+from web_scraper.extract.browser_extraction import EXTRACTED_FIELDS
+from web_scraper.extract.scraper_base import SectionScrape
+from web_scraper.transform.content_parser import WortenHtmlParser
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures"
+PARSER = WortenHtmlParser({"date": "2022-12-04"})
+
+
+def _extract_in_browser(page_html: str) -> list[list]:
+    """
+    what PRODUCT_EXTRACTION_JS returns for the page: the same selectors, querySelector
+    is select_one and textContent get_text
+    """
+    def capture(container, path, attr):
+        elem = container
+        for selector in path:
+            elem = elem.select_one(selector)
+            if elem is None:
+                return None
+        return elem.get_text() if attr is None else elem.get(attr)
+
+    soup = BeautifulSoup(page_html, "html.parser")
+    return [
+        [capture(container, path, attr) for path, attr in browser_extraction._CAPTURES]
+        for container in soup.select(browser_extraction._CONTAINER)
+    ]
+
+
+@pytest.mark.parametrize("fixture", ["worten_listing.html", "worten_listing_malformed.html"])
+def test_extracted_like_containers(fixture: str) -> None:
+    page_html = (FIXTURES_DIR / fixture).read_text(encoding="utf-8")
+    extracted = _extract_in_browser(page_html)
+    assert extracted and all(len(product) == len(EXTRACTED_FIELDS) for product in extracted)
+
+    assert PARSER.parse_extracted(extracted) == PARSER.parse_containers(page_html)
+    specs = {"base_url": "lavar", "category_lvl1": "eletro", "category_lvl2": "roupa", "category_lvl3": "lavar"}
+    assert (
+        PARSER.parse_category(SectionScrape([extracted], specs, {})).to_records()
+        == PARSER.parse_category(SectionScrape([page_html], specs, {})).to_records()
+    )
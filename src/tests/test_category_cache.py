@@ -0,0 +1,38 @@
+"""
+Unit tests for the on disk category cache
+"""
+from web_scraper.extract.category_cache import CategoryCache
+from web_scraper.extract.scraper_worten import WortenScraper
+
+LINKS = [
+    ["https://www.worten.pt/grandes-eletrodomesticos/maquinas-de-roupa/maquinas-de-lavar-roupa", "Máquinas"],
+    ["https://www.worten.pt/grandes-eletrodomesticos/frio/mini-bar", "Mini Bar"],
+]
+
+
+def test_parse_lvl3_category_urls() -> None:
+    # the links without a level 3 category (ex: promotions) are skipped
+    categories = WortenScraper._parse_lvl3_category_urls(LINKS + [["https://www.worten.pt/promocoes", "Promoções"]])
+    assert len(categories) == 2
+    assert categories[1] == {
+        "url": LINKS[1][0],
+        "category_lvl1": "grandes-eletrodomesticos",
+        "category_lvl2": "frio",
+        "category_lvl3": "mini-bar",
+        "lvl3_display_name": "Mini Bar",
+    }
+
+
+def test_cache_ttl_and_diff(tmp_path) -> None:
+    categories = WortenScraper._parse_lvl3_category_urls(LINKS)
+    cache = CategoryCache(tmp_path / "category_tree.json", ttl_sec=3600)
+    assert cache.load() is None, "nothing cached yet"
+
+    cache.save(categories[:1])
+    assert cache.load() == categories[:1]
+    diff = cache.save(categories[1:])
+    assert diff.added == categories[1:] and diff.removed == categories[:1]
+
+    expired_cache = CategoryCache(tmp_path / "category_tree.json", ttl_sec=0)
+    assert expired_cache.load() is None
+    assert expired_cache.load(allow_stale=True) == categories[1:]
@@ -0,0 +1,112 @@
+"""
+Unit tests for the DynamoDB loader, against a local moto server
+"""
+import pytest
+
+from web_scraper.load.dynamodb_loader import GSI_NAME, DynamoDBLoader
+from web_scraper.support.errors import UnprocessedItemsError
+
+CATEGORIES = {"category_lvl1": "grandes", "category_lvl2": "roupa", "category_lvl3": "mlr"}
+
+
+def _records(date: str, n: int = 60) -> list[dict]:
+    return [
+        dict(
+            CATEGORIES, name=f"Máquina {i}", price=299.99 + i, img_url=f"https://img/{i}.jpg",
+            url=f"https://www.worten.pt/produtos/maquina-{i}", date=date
+        )
+        for i in range(n)
+    ]
+
+
+@pytest.fixture
+def dynamodb_client(moto_endpoint):
+    import boto3
+    return boto3.client(
+        "dynamodb", endpoint_url=moto_endpoint, region_name="us-east-1",
+        aws_access_key_id="testing", aws_secret_access_key="testing"
+    )
+
+
+def test_load_and_query(dynamodb_client) -> None:
+    loader = DynamoDBLoader("products", dynamodb_client, max_workers=4)
+    loader.create_table()
+    # the same product twice on a date is written once
+    assert loader.load(_records("2022-12-04") + _records("2022-12-04", 1)) == 60
+    assert loader.load(_records("2022-12-11")) == 60
+
+    # price history of a product
+    history = dynamodb_client.query(
+        TableName="products",
+        KeyConditionExpression="PK = :pk AND SK BETWEEN :start AND :end",
+        ExpressionAttributeValues={
+            ":pk": {"S": "PRODUCT#url:https://www.worten.pt/produtos/maquina-3"},
+            ":start": {"S": "DATE#2022-12-01"}, ":end": {"S": "DATE#2022-12-31"},
+        },
+    )["Items"]
+    assert [(item["date"]["S"], float(item["price"]["N"])) for item in history] == \
+        [("2022-12-04", 302.99), ("2022-12-11", 302.99)]
+
+    # products of a category on a date
+    category = dynamodb_client.query(
+        TableName="products",
+        IndexName=GSI_NAME,
+        KeyConditionExpression="GSI1PK = :category AND begins_with(GSI1SK, :date)",
+        ExpressionAttributeValues={":category": {"S": "CATEGORY#grandes/roupa/mlr"}, ":date": {"S": "DATE#2022-12-11"}},
+    )
+    assert category["Count"] == 60
+
+    # a product found in two categories is in the index under both
+    categories = ["grandes/roupa/mlr", "grandes/roupa/mlsr"]
+    records = [dict(record, categories=categories) for record in _records("2022-12-18")]
+    assert loader.load(records) == 120
+    for path in categories:
+        category = dynamodb_client.query(
+            TableName="products",
+            IndexName=GSI_NAME,
+            KeyConditionExpression="GSI1PK = :category AND begins_with(GSI1SK, :date)",
+            ExpressionAttributeValues={":category": {"S": f"CATEGORY#{path}"}, ":date": {"S": "DATE#2022-12-18"}},
+        )
+        assert category["Count"] == 60
+    history = dynamodb_client.query(
+        TableName="products",
+        KeyConditionExpression="PK = :pk AND SK BETWEEN :start AND :end",
+        ExpressionAttributeValues={
+            ":pk": {"S": "PRODUCT#url:https://www.worten.pt/produtos/maquina-3"},
+            ":start": {"S": "DATE#2022-12-01"}, ":end": {"S": "DATE#2022-12-31"},
+        },
+    )["Items"]
+    assert [item["date"]["S"] for item in history] == ["2022-12-04", "2022-12-11", "2022-12-18"]
+
+
+class _ThrottlingClient:
+    """
+    leaves the last item of each request unprocessed the first n times
+    """
+    def __init__(self, n_throttled: int) -> None:
+        self.n_throttled = n_throttled
+        self.written: list[dict] = []
+
+    def batch_write_item(self, RequestItems: dict) -> dict:
+        (table, requests), = RequestItems.items()
+        assert len(requests) <= 25
+        if self.n_throttled:
+            self.n_throttled -= 1
+            self.written += requests[:-1]
+            return {"UnprocessedItems": {table: requests[-1:]}}
+        self.written += requests
+        return {"UnprocessedItems": {}}
+
+
+def test_unprocessed_items_retried() -> None:
+    client = _ThrottlingClient(n_throttled=3)
+    with DynamoDBLoader("products", client, max_workers=1, base_delay=0.001) as loader:
+        assert loader.load(_records("2022-12-04")) == 60
+        assert len(client.written) == 60 and loader.n_retried == 3
+        # the loads share the loader's threads
+        assert loader.load(_records("2022-12-11", 30)) == 30
+        assert len(client.written) == 90
+
+    with DynamoDBLoader("products", _ThrottlingClient(n_throttled=100), max_attempts=3, base_delay=0.001) as loader:
+        with pytest.raises(UnprocessedItemsError):
+            loader.load(_records("2022-12-04", 1))
@@ -0,0 +1,58 @@
+"""
+Unit tests for the declarative product field spec
+"""
+from dataclasses import replace
+from pathlib import Path
+
+import pytest
+
+from web_scraper.transform.content_parser import WortenHtmlParser
+from web_scraper.transform.field_spec import WORTEN_PRODUCT_SPEC, Capture, FieldSpec
+from web_scraper.transform.parser_backends import PARSER_BACKENDS
+
+PAGE_HTML = (Path(__file__).parent / "fixtures" / "worten_listing.html").read_text(encoding="utf-8")
+
+# a field is added by declaring where it is and how to decode it
+SPEC_WITH_TITLE = replace(
+    WORTEN_PRODUCT_SPEC,
+    captures=WORTEN_PRODUCT_SPEC.captures + (Capture("title", (("h3", "w-product__title"),)),),
+    fields=WORTEN_PRODUCT_SPEC.fields + (FieldSpec("title", ("title",), str.strip, required=False),),
+)
+
+
+@pytest.mark.parametrize("backend", list(PARSER_BACKENDS))
+def test_added_field(backend: str) -> None:
+    try:
+        parser = WortenHtmlParser({"date": "2022-10-01"}, backend, spec=SPEC_WITH_TITLE)
+    except ImportError:
+        pytest.skip(f"{backend} is not installed")
+    reference = WortenHtmlParser({"date": "2022-10-01"}).parse_containers(PAGE_HTML)
+    products = parser.parse_containers(PAGE_HTML)
+
+    assert [product.pop("title") for product in products] == [
+        "Máquina de Lavar Roupa BOSCH WAN24263ES (8 kg - 1200 rpm)",
+        "Máquina de Lavar Roupa LG F4WV3009S6W & Secar (9 kg)",
+        "Máquina de Lavar Roupa BEKO WUE8622XCW",
+    ]
+    assert products == reference, "the other fields are unchanged"
+
+
+def test_field_wrappers_and_missing_fields() -> None:
+    parser = WortenHtmlParser({"date": "2022-10-01"})
+    containers = parser.backend.find_all(PAGE_HTML, "div", "w-product__wrapper")
+    assert parser.extract_current_price(containers[0]) == 449.99
+    assert parser.extract_previous_price(containers[0]) == 549.99
+    assert parser.extract_previous_price(containers[1]) is None
+
+    with pytest.raises(ValueError, match="img_src"):
+        WORTEN_PRODUCT_SPEC.decode(dict(parser._compiled_spec.capture(containers[0]), img_src=None))
+
+
+def test_invalid_containers_skipped() -> None:
+    parser = WortenHtmlParser({"date": "2022-10-01"})
+    page_html = (Path(__file__).parent / "fixtures" / "worten_listing_malformed.html").read_text(encoding="utf-8")
+    containers = parser.backend.find_all(page_html, "div", "w-product__wrapper")
+    # the malformed products are None, like in parse_containers, instead of raising
+    assert [parser.try_extract_prod_specs(container) for container in containers] == \
+        parser.parse_containers(page_html)
+    assert None in parser.parse_containers(page_html)
@@ -0,0 +1,105 @@
+"""
+Unit tests for the page states of the Worten listings, with a fake browser
+"""
+import time
+
+from web_scraper.extract import scraper_worten
+from web_scraper.extract.page_sink import ListSink
+from web_scraper.extract.page_state import PageSnapshot, PageState
+from web_scraper.extract.scraper_config import WORTEN_SP_CONFIG_PER_SYSTEM
+from web_scraper import config
+
+
+def _result(state: str, current_page=None, last_page=None, has_pagination=True) -> dict:
+    """
+    what PAGE_STATE_JS returns
+    """
+    return {
+        "state": state,
+        "has_products": state in ("has_next_page", "last_page"),
+        "has_pagination": has_pagination,
+        "current_page": current_page,
+        "last_page": last_page,
+    }
+
+
+class FakeDriver:
+    """
+    Returns the results of the page state script one after the other (the last one repeats)
+    """
+    current_url = "https://www.worten.pt/grandes-eletrodomesticos/maquinas-de-roupa/maquinas-de-lavar-roupa"
+    page_source = ""
+
+    def __init__(self, results: list) -> None:
+        self.results = results
+        self.n_polls = 0
+
+    def execute_script(self, script, *args):
+        self.n_polls += 1
+        return self.results[min(self.n_polls, len(self.results)) - 1]
+
+    def get(self, url) -> None:
+        pass
+
+
+def _scraper(results: list) -> scraper_worten.WortenScraper:
+    scraper = scraper_worten.WortenScraper(WORTEN_SP_CONFIG_PER_SYSTEM[config.MODE], load_wait_sec=1)
+    scraper.sleep_pattern_sec = 0
+    scraper.poll_frequency_sec = 0.01
+    scraper.wd = FakeDriver(results)
+    return scraper
+
+
+def test_snapshot_from_js() -> None:
+    snapshot = PageSnapshot.from_js(_result("has_next_page", current_page=2, last_page=9))
+    assert snapshot == PageSnapshot(PageState.HAS_NEXT_PAGE, True, True, 2, 9)
+    assert snapshot.shows_previous_page(3)
+    assert not snapshot.shows_previous_page(2) and not snapshot.shows_previous_page(None)
+
+
+def test_waits_for_the_expected_page() -> None:
+    scraper = _scraper([None, _result("has_next_page", 1, 3), _result("last_page", 2, 3)])
+    snapshot = scraper.wait_page_state(expected_page=2)
+    assert snapshot.state == PageState.LAST_PAGE and snapshot.current_page == 2
+    assert scraper.wd.n_polls == 3
+
+
+def test_pagination_without_current_page() -> None:
+    scraper = _scraper([_result("has_next_page", current_page=None, last_page=3)])
+    start = time.monotonic()
+    snapshot = scraper.wait_page_state(expected_page=2)
+    assert snapshot.state == PageState.HAS_NEXT_PAGE
+    assert time.monotonic() - start < scraper.load_wait_sec, "doesn't poll until the timeout"
+
+
+def test_timeout() -> None:
+    snapshot = _scraper([None]).wait_page_state()
+    assert snapshot.state == PageState.TIMEOUT
+
+
+def test_captcha_fails_the_section() -> None:
+    scraper = _scraper([_result("captcha", has_pagination=False)])
+    assert scraper.try_get_section(FakeDriver.current_url, {"category_lvl3": "maquinas-de-lavar-roupa"}) is None
+    assert scraper.sections_failed == [
+        {"base_url": FakeDriver.current_url, "category_lvl3": "maquinas-de-lavar-roupa"}
+    ]
+
+
+def test_captcha_aborts_the_sink() -> None:
+    class Sink(ListSink):
+        aborted = closed = False
+
+        def abort_section(self, section_specs, error):
+            super().abort_section(section_specs, error)
+            self.aborted = True
+
+        def close_section(self, section_specs, metadata):
+            self.closed = True
+
+    scraper = _scraper([_result("has_next_page", 1, 2), _result("captcha", has_pagination=False)])
+    scraper.page_content = lambda: "<html></html>"
+    scraper.page_load_stats = lambda: {"bytes_transferred": 0}
+    scraper._move_next_page = lambda: True
+    sink = Sink()
+    assert scraper.try_get_section(FakeDriver.current_url, sink=sink) is None
+    assert sink.aborted and not sink.closed and sink.pages == []
@@ -0,0 +1,53 @@
+"""
+Unit tests for the content-hash parse cache
+"""
+from dataclasses import replace
+from pathlib import Path
+
+from web_scraper.transform.content_parser import WortenHtmlParser
+from web_scraper.transform.field_spec import WORTEN_PRODUCT_SPEC
+from web_scraper.transform.parse_cache import ParseCache
+from web_scraper.transform.html_slicing import slice_elements
+
+PAGE_HTML = (Path(__file__).parent / "fixtures" / "worten_listing.html").read_text(encoding="utf-8")
+
+
+def test_cache_hits_unchanged_products(tmp_path) -> None:
+    cache = ParseCache(tmp_path / "parse_cache.sqlite", max_entries=1)
+    parser = WortenHtmlParser({"date": "2022-10-01"}, cache=cache)
+    products = parser.parse_containers(PAGE_HTML)
+
+    # same products, other scripts and tracking tokens
+    reloaded = PAGE_HTML.replace('"page": "listing"', '"page": "listing", "nonce": "8f3a"').replace(
+        'class="w-product__url"', 'class="w-product__url" data-impression-id="7"')
+    assert parser.parse_containers(reloaded) == products
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    changed = PAGE_HTML.replace(">449<", ">429<")
+    assert parser.parse_containers(changed)[0]["price"] == 429.99
+    assert cache.misses == 2
+
+    # a new cache on the same file (ex: the next run) reads the pages from disk
+    disk_cache = ParseCache(tmp_path / "parse_cache.sqlite")
+    assert len(disk_cache) == 2
+    assert WortenHtmlParser({"date": "2022-10-08"}, cache=disk_cache).parse_containers(PAGE_HTML) == products
+    assert disk_cache.hits == 1
+
+
+def test_spec_change_invalidates() -> None:
+    cache = ParseCache()
+    spec = replace(WORTEN_PRODUCT_SPEC, captures=WORTEN_PRODUCT_SPEC.captures[::-1])
+    containers = slice_elements(PAGE_HTML, *WORTEN_PRODUCT_SPEC.container)
+    assert cache.page_key(containers, WORTEN_PRODUCT_SPEC) != cache.page_key(containers, spec)
+
+
+def test_tracking_params_not_cached() -> None:
+    cache = ParseCache()
+    parser = WortenHtmlParser({"date": "2022-10-01"}, cache=cache)
+    href = 'href="/produtos/maquina-de-lavar-roupa-bosch-7001'
+    first = parser.parse_containers(PAGE_HTML.replace(href, href + "?utm_source=mail&amp;color=white"))
+    # the same page loaded from another campaign is a hit, neither keeps the tracking parameter
+    second = parser.parse_containers(PAGE_HTML.replace(href, href + "?utm_source=ads&amp;color=white"))
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert first == second
+    assert first[0]["url"] == "/produtos/maquina-de-lavar-roupa-bosch-7001?color=white"
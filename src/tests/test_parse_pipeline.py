@@ -0,0 +1,56 @@
+"""
+Unit tests for the parsing pipeline
+"""
+from web_scraper.extract.scraper_base import SectionScrape
+from web_scraper.transform.content_parser import ParserSink, WortenHtmlParser
+from web_scraper.transform.parse_pipeline import ParsePipeline
+from web_scraper.support.worten_pages import listing_page
+
+METADATA = {"date": "2022-12-04"}
+
+
+def _section(category: str, n_pages: int) -> SectionScrape:
+    pages = [listing_page(category, page, n_pages, n_products=6, seed=page) for page in range(1, n_pages + 1)]
+    specs = {"base_url": category, "category_lvl1": "lvl1", "category_lvl2": "lvl2", "category_lvl3": category}
+    return SectionScrape(pages, specs, {})
+
+
+def test_pipeline_keeps_section_order() -> None:
+    sections = [_section(f"category-{i}", n_pages=i % 3 + 1) for i in range(5)]
+    parser = WortenHtmlParser(METADATA)
+    with ParsePipeline(METADATA, n_workers=2, max_in_flight=2) as pipeline:
+        parsed = list(pipeline.map([sections[0], None, *sections[1:]]))
+
+    assert [section for section, _ in parsed] == sections, "failed sections are skipped"
+    for section, products in parsed:
+        assert products.to_records() == parser.parse_category(section).to_records()
+        assert products.extras["category_lvl3"].dictionary == (section.section_specs["category_lvl3"],)
+
+
+def test_parser_sink_keeps_sections_apart() -> None:
+    # two scrapers streaming to the same sink
+    sections = [_section("category-a", n_pages=2), _section("category-b", n_pages=2), _section("failed", 1)]
+    parser = WortenHtmlParser(METADATA)
+    parsed = {}
+    sink = ParserSink(parser, on_section=lambda products, specs, metadata: parsed.update({specs["base_url"]: products}))
+    for section in sections:
+        sink.open_section(section.section_specs)
+    for page_number in (1, 2):
+        for section in sections[:2]:
+            sink.write_page(section.html[page_number - 1], page_number, section.section_specs)
+    sink.write_page(sections[2].html[0], 1, sections[2].section_specs)
+    sink.abort_section(sections[2].section_specs, RuntimeError("blocked"))
+    for section in sections[:2]:
+        sink.close_section(section.section_specs, {})
+
+    assert list(parsed) == ["category-a", "category-b"]
+    for section in sections[:2]:
+        assert parsed[section.section_specs["base_url"]].to_records() == parser.parse_category(section).to_records()
+
+
+def test_section_without_pages() -> None:
+    with ParsePipeline(METADATA, n_workers=1) as pipeline:
+        [(_, products)] = pipeline.map([_section("empty", n_pages=0)])
+    assert len(products) == 0
+    assert products.extras["date"].dictionary == ("2022-12-04",)
+    assert products.extras["category_lvl3"].dictionary == ("empty",)
@@ -0,0 +1,76 @@
+"""
+Conformance tests of the HTML parser backends: every backend must produce
+the same product records as the reference html.parser backend
+"""
+from pathlib import Path
+
+import pytest
+
+from web_scraper.transform.content_parser import WortenHtmlParser
+from web_scraper.transform.parser_backends import PARSER_BACKENDS
+from web_scraper.transform.html_slicing import slice_elements
+from web_scraper.support.worten_pages import listing_page
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures"
+FIXTURES = sorted(FIXTURES_DIR.glob("worten_listing*.html"))
+
+
+def _parser(backend: str, restrict_to_products: bool = False) -> WortenHtmlParser:
+    try:
+        return WortenHtmlParser({"date": "2022-10-01"}, backend, restrict_to_products)
+    except ImportError:
+        pytest.skip(f"{backend} is not installed")
+
+
+@pytest.mark.parametrize("backend", [name for name in PARSER_BACKENDS if name != "html.parser"])
+@pytest.mark.parametrize("fixture", FIXTURES, ids=lambda path: path.stem)
+def test_backend_matches_reference(backend: str, fixture: Path) -> None:
+    page_html = fixture.read_text(encoding="utf-8")
+    reference = _parser("html.parser").parse_containers(page_html)
+    assert _parser(backend).parse_containers(page_html) == reference
+
+
+@pytest.mark.parametrize("backend", list(PARSER_BACKENDS))
+@pytest.mark.parametrize("fixture", FIXTURES, ids=lambda path: path.stem)
+def test_restricted_matches_whole_page(backend: str, fixture: Path) -> None:
+    page_html = fixture.read_text(encoding="utf-8")
+    reference = _parser("html.parser").parse_containers(page_html)
+    assert _parser(backend, restrict_to_products=True).parse_containers(page_html) == reference
+
+
+def test_slice_elements() -> None:
+    page_html = (
+        '<script>var s = "<div class=\'w-product__wrapper\'>";</script>'
+        '<div class="w-product__wrapper big" data-x="a>b"><div><div></div></div>'
+        '<!-- </div> --></div><div class="other"></div>'
+        "<DIV class='w-product__wrapper'>unclosed"
+    )
+    assert slice_elements(page_html, "div", "w-product__wrapper") == [
+        '<div class="w-product__wrapper big" data-x="a>b"><div><div></div></div><!-- </div> --></div>',
+        "<DIV class='w-product__wrapper'>unclosed",
+    ]
+
+
+def test_reference_records() -> None:
+    parser = _parser("html.parser")
+    products = parser.parse_containers((FIXTURES_DIR / "worten_listing.html").read_text(encoding="utf-8"))
+    assert [product["price"] for product in products] == [449.99, 379.9, 899.0]
+    assert products[0]["price_previous"] == 549.99 and "price_previous" not in products[1]
+    assert products[1]["name"] == "Máquina de Lavar Roupa LG F4WV3009S6W & Secar (9 kg)"
+
+    malformed_html = (FIXTURES_DIR / "worten_listing_malformed.html").read_text(encoding="utf-8")
+    malformed = parser.parse_containers(malformed_html)
+    assert malformed[:2] == [None, None]
+    assert malformed[2]["name"] == "Mini Bar HAIER 40L"
+
+
+@pytest.mark.parametrize("backend", list(PARSER_BACKENDS))
+def test_synthetic_malformed_prices(backend: str) -> None:
+    page_html = listing_page("mlr", n_products=40, malformed_price_share=0.5, seed=7)
+    reference = _parser("html.parser").parse_containers(page_html)
+    assert 0 < reference.count(None) < 20, "some malformed prices can't be decoded"
+
+    parser = _parser(backend)
+    assert parser.parse_containers(page_html) == reference
+    batch = parser.parse_page_batch(page_html, {})
+    assert batch.to_records() == [dict(product, date="2022-10-01") for product in reference if product]
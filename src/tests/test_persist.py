@@ -0,0 +1,126 @@
+"""
+Unit tests for the persistence of the scraped sections
+"""
+import pickle
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from datetime import datetime
+from dataclasses import replace
+
+import pytest
+
+from web_scraper.extract.scraper_base import SectionScrape
+from web_scraper.load.persist import Persist
+
+BASE_URL = "https://www.worten.pt/grandes-eletrodomesticos/maquinas-de-roupa/maquinas-de-lavar-roupa"
+
+
+@pytest.fixture
+def section() -> SectionScrape:
+    return SectionScrape(
+        html=["<html>page 1</html>", "<html>page 2</html>"],
+        section_specs={
+            "base_url": BASE_URL,
+            "n_pages": 3,
+            "category_lvl1": "grandes-eletrodomesticos",
+            "category_lvl2": "maquinas-de-roupa",
+            "category_lvl3": "maquinas-de-lavar-roupa",
+        },
+        metadata={"datetime": datetime(2022, 12, 4, 20, 44), "n_pages_scraped": 2},
+    )
+
+
+def test_resume_from_manifest(tmp_path, section) -> None:
+    persist = Persist(tmp_path, "20221204_2044")
+    persist.save_section(section)
+    entry = persist.manifest.get(BASE_URL)
+    assert (entry.n_pages, entry.n_pages_scraped) == (3, 2)
+
+    resumed = Persist(tmp_path, "20221204_2044")
+    assert resumed.extracted_urls() == {BASE_URL}
+    assert resumed.load(BASE_URL) == section
+    assert resumed.load_page(BASE_URL, 1) == "<html>page 2</html>"
+
+
+def test_manifest_rebuilt_for_old_runs(tmp_path, section) -> None:
+    persist = Persist(tmp_path, "20221204_2044")
+    persist.save_section(section)
+    (persist.data_folder / "manifest.sqlite").unlink()
+    assert Persist(tmp_path, "20221204_2044").extracted_urls() == {BASE_URL}
+
+
+def test_compressed_sections(tmp_path, section) -> None:
+    pytest.importorskip("zstandard")
+    from web_scraper.load.page_compression import PageCompressor
+    from web_scraper.load.persist import ZSTD_DICT_DIR
+    from web_scraper.transform.content_parser import WortenHtmlParser
+
+    page_html = (Path(__file__).parent / "fixtures" / "worten_listing.html").read_text(encoding="utf-8")
+    section = replace(section, html=[page_html] * 8)
+    compressor = PageCompressor(tmp_path / ZSTD_DICT_DIR, train_after_pages=8, dict_size=4096)
+    persist = Persist(tmp_path, "20221204_2044", compressor)
+    persist.save_section(section)
+    # the first pages trained the dictionary, the next sections are compressed with it
+    assert compressor.dictionary is not None
+    assert len(list((tmp_path / ZSTD_DICT_DIR).glob("*.zdict"))) == 1
+
+    # a later run loads the dictionary from the data folder
+    loaded = Persist(tmp_path, "20221204_2044").load(BASE_URL)
+    assert loaded.section_specs == section.section_specs
+    parser = WortenHtmlParser({"date": "2022-12-04"})
+    assert [parser.parse_containers(page) for page in loaded.html] == \
+        [parser.parse_containers(page) for page in section.html]
+    assert len(loaded.html[0]) < len(page_html)
+
+
+def test_interrupted_append_dropped(tmp_path, section) -> None:
+    persist = Persist(tmp_path, "20221204_2044")
+    persist.save_section(section)
+    # a section appended without being recorded, as if the run stopped in the middle
+    other = replace(section, section_specs=dict(section.section_specs, base_url=BASE_URL + "-2"))
+    persist.segments.append(other)
+    with open(persist.segments.path, "ab") as file:
+        file.write(b"<html>half a pa")
+
+    resumed = Persist(tmp_path, "20221204_2044")
+    entry = resumed.manifest.get(BASE_URL)
+    assert list(resumed.segments.sections()) == [(entry.offset, entry.length)]
+    resumed.save_section(other)
+    assert resumed.load(BASE_URL + "-2") == other
+    assert resumed.load(BASE_URL) == section
+
+
+def test_interrupted_first_append_dropped(tmp_path, section) -> None:
+    persist = Persist(tmp_path, "20221204_2044")
+    # the run stopped while appending its first section
+    persist.segments.append(section)
+    with open(persist.segments.path, "r+b") as file:
+        file.truncate(26)
+
+    resumed = Persist(tmp_path, "20221204_2044")
+    assert resumed.extracted_urls() == set()
+    resumed.save_section(section)
+    assert Persist(tmp_path, "20221204_2044").load(BASE_URL) == section
+
+
+def test_read_while_appending(tmp_path, section) -> None:
+    persist = Persist(tmp_path, "20221204_2044")
+    sections = [
+        replace(section, section_specs=dict(section.section_specs, base_url=f"{BASE_URL}-{i}")) for i in range(40)
+    ]
+
+    def save_and_read(i: int) -> str:
+        # each read past the end of the map remaps the file, while the other threads read
+        persist.save_section(sections[i])
+        return persist.load_page(f"{BASE_URL}-{i}", 1)
+
+    with ThreadPoolExecutor(8) as executor:
+        assert list(executor.map(save_and_read, range(40))) == ["<html>page 2</html>"] * 40
+
+
+def test_legacy_pickle_sections(tmp_path, section) -> None:
+    persist = Persist(tmp_path, "20221204_2044")
+    with open(persist.raw_data / "old_section.pkl", "wb") as file:
+        pickle.dump(section, file)
+    assert persist.extracted_urls() == {BASE_URL}
+    assert persist.load(BASE_URL) == section
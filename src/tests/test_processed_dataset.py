@@ -0,0 +1,78 @@
+"""
+Unit tests for the partitioned Parquet dataset of the parsed products
+"""
+from pathlib import Path
+
+import pytest
+
+pq = pytest.importorskip("pyarrow.parquet")
+
+from web_scraper.extract.scraper_base import SectionScrape
+from web_scraper.transform.content_parser import WortenHtmlParser
+from web_scraper.transform.product_batch import ProductBatch
+from web_scraper.load.processed_dataset import ProcessedWriter, read_products
+
+PAGE_HTML = (Path(__file__).parent / "fixtures" / "worten_listing.html").read_text(encoding="utf-8")
+
+
+def _batch(date: str, category_lvl1: str):
+    specs = {"base_url": category_lvl1, "category_lvl1": category_lvl1, "category_lvl2": "b", "category_lvl3": "c"}
+    return WortenHtmlParser({"date": date}).parse_category(SectionScrape([PAGE_HTML], specs, {}))
+
+
+def test_write_and_filter(tmp_path) -> None:
+    with ProcessedWriter(tmp_path, row_group_rows=2, name="run") as writer:
+        for date in ("2022-12-04", "2022-12-11"):
+            for category in ("grandes", "pequenos"):
+                writer.write(_batch(date, category))
+    assert writer.n_written == 12
+    files = sorted(path.relative_to(tmp_path).parent.as_posix() for path in tmp_path.rglob("*.parquet"))
+    assert files[0] == "date=2022-12-04/category_lvl1=grandes"
+    assert len(files) == 4
+
+    # each file is sorted by price, with the price range of each row group
+    metadata = pq.ParquetFile(next(tmp_path.rglob("*.parquet"))).metadata
+    price = metadata.schema.to_arrow_schema().get_field_index("price")
+    ranges = [
+        (metadata.row_group(i).column(price).statistics.min, metadata.row_group(i).column(price).statistics.max)
+        for i in range(metadata.num_row_groups)
+    ]
+    assert metadata.num_row_groups == 2 and ranges[0][1] <= ranges[1][0]
+
+    all_products = read_products(tmp_path)
+    assert all_products.num_rows == 12
+    cheap = read_products(tmp_path, dates=["2022-12-11"], categories=["grandes"], max_price=500)
+    assert cheap.num_rows > 0
+    assert set(cheap["date"].to_pylist()) == {"2022-12-11"}
+    assert set(cheap["category_lvl1"].to_pylist()) == {"grandes"}
+    assert max(cheap["price"].to_pylist()) <= 500
+    assert read_products(tmp_path, min_price=10_000, columns=["name"]).num_rows == 0
+
+
+def test_categories_column(tmp_path) -> None:
+    batch = _batch("2022-12-04", "grandes")
+    categories = [["grandes/b/c"], ["grandes/b/c", "grandes/b/d"], ["grandes/b/c"]]
+    with ProcessedWriter(tmp_path) as writer:
+        writer.write(batch, categories)
+    products = read_products(tmp_path, columns=["name", "categories"]).to_pylist()
+    by_name = {product["name"]: product["categories"] for product in products}
+    assert by_name[batch.to_records()[1]["name"]] == ["grandes/b/c", "grandes/b/d"]
+    with pytest.raises(ValueError):
+        writer.write(batch, categories[:1])
+
+
+def test_overwrite_previous_attempt(tmp_path) -> None:
+    for _ in range(2):
+        with ProcessedWriter(tmp_path, name="20221204_2044", overwrite=True) as writer:
+            writer.write(_batch("2022-12-04", "grandes"))
+    with ProcessedWriter(tmp_path, name="20221211_2044", overwrite=True) as writer:
+        writer.write(_batch("2022-12-11", "grandes"))
+    assert read_products(tmp_path).num_rows == 6, "only the files of the same run are replaced"
+
+
+def test_empty_batch_skipped(tmp_path) -> None:
+    with ProcessedWriter(tmp_path, name="run") as writer:
+        writer.write(ProductBatch.concat([]))
+        with pytest.raises(ValueError):
+            writer.write(ProductBatch(_batch("2022-12-04", "grandes").columns))
+    assert writer.n_written == 0
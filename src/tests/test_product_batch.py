@@ -0,0 +1,92 @@
+"""
+Unit tests for the columnar ProductBatch
+"""
+from pathlib import Path
+from dataclasses import replace
+
+import numpy as np
+import pytest
+
+from web_scraper.extract.scraper_base import SectionScrape
+from web_scraper.transform.content_parser import WortenHtmlParser
+from web_scraper.transform.product_batch import ProductBatch
+from web_scraper.transform.field_spec import WORTEN_PRODUCT_SPEC, Capture, FieldSpec, decode_prices
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures"
+SPEC_WITH_TITLE = replace(
+    WORTEN_PRODUCT_SPEC,
+    captures=WORTEN_PRODUCT_SPEC.captures + (Capture("title", (("h3", "w-product__title"),)),),
+    fields=WORTEN_PRODUCT_SPEC.fields + (FieldSpec("title", ("title",), str.strip, required=False),),
+)
+SPECS = {"base_url": "mlr", "category_lvl1": "grandes", "category_lvl2": "roupa", "category_lvl3": "mlr"}
+
+
+def _section() -> SectionScrape:
+    pages = [
+        (FIXTURES_DIR / f"{name}.html").read_text(encoding="utf-8")
+        for name in ("worten_listing", "worten_listing_malformed", "worten_listing_empty")
+    ]
+    return SectionScrape(pages, SPECS, {})
+
+
+def test_batch_matches_records() -> None:
+    parser = WortenHtmlParser({"date": "2022-10-01"})
+    section = _section()
+    batch = parser.parse_category(section)
+
+    expected = [
+        dict(prod, date="2022-10-01", category_lvl1="grandes", category_lvl2="roupa", category_lvl3="mlr")
+        for page in section.html for prod in parser.parse_containers(page) if prod
+    ]
+    assert len(batch) == 4
+    assert batch.to_records() == expected
+    assert batch.extras["date"].dictionary == ("2022-10-01",), "stored once"
+
+
+def test_added_field_kept() -> None:
+    parser = WortenHtmlParser({"date": "2022-10-01"}, spec=SPEC_WITH_TITLE)
+    section = _section()
+    batch = parser.parse_category(section)
+    assert [record.get("title") for record in batch.to_records()][:1] == [
+        "Máquina de Lavar Roupa BOSCH WAN24263ES (8 kg - 1200 rpm)"
+    ]
+    expected = [prod for page in section.html for prod in parser.parse_containers(page) if prod]
+    assert [{key: record[key] for key in prod} for record, prod in zip(batch.to_records(), expected)] == expected
+
+
+def test_malformed_previous_price() -> None:
+    # same decoding as parse_containers: the product is left out
+    page_html = _section().html[0].replace(">549<", ">Esgotado<")
+    parser = WortenHtmlParser({"date": "2022-10-01"})
+    records = [prod for prod in parser.parse_containers(page_html) if prod]
+    batch = parser.parse_category(SectionScrape([page_html], SPECS, {}))
+    assert len(batch) == len(records) == 2
+    assert [{key: record[key] for key in prod} for record, prod in zip(batch.to_records(), records)] == records
+
+
+def test_zero_copy_views() -> None:
+    pyarrow = pytest.importorskip("pyarrow")
+    batch = WortenHtmlParser({"date": "2022-10-01"}).parse_category(_section())
+    batch = ProductBatch.concat([batch, batch])
+
+    columns = batch.to_numpy()
+    assert np.shares_memory(columns["price"], batch.column("price"))
+    assert columns["price_previous"].mask.tolist() == [False, True, False, True] * 2
+
+    arrow_batch = batch.to_arrow()
+    assert arrow_batch.column("price").buffers()[1].address == batch.column("price").ctypes.data
+    assert arrow_batch.column("price_previous").null_count == 4
+    assert arrow_batch.column("category_lvl3").type == pyarrow.dictionary(pyarrow.int32(), pyarrow.string())
+    assert arrow_batch.to_pylist()[1]["name"] == batch.to_records()[1]["name"]
+
+
+def test_decode_prices() -> None:
+    prices = decode_prices(["549", None, "€299", "Esgotado"], ["99", "00", "50", "99"])
+    assert prices[0] == 549.99 and prices[2] == 299.5, "the malformed ones decoded like decode_price"
+    assert np.isnan(prices[1]) and np.isnan(prices[3])
+
+
+def test_concat_nothing() -> None:
+    batch = ProductBatch.concat([], extras={"date": "2022-10-01"})
+    assert len(batch) == 0 and list(batch.extras) == ["date"]
+    assert list(batch.columns) == [field_spec.name for field_spec in WORTEN_PRODUCT_SPEC.fields]
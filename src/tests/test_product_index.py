@@ -0,0 +1,57 @@
+"""
+Unit tests for the cross-category product index
+"""
+from pathlib import Path
+
+from web_scraper.extract.scraper_base import SectionScrape
+from web_scraper.transform.content_parser import WortenHtmlParser
+from web_scraper.transform.product_index import ProductIndex
+from web_scraper.load.staged_products import StagedProducts
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures"
+LISTING = (FIXTURES_DIR / "worten_listing.html").read_text(encoding="utf-8")
+MALFORMED = (FIXTURES_DIR / "worten_listing_malformed.html").read_text(encoding="utf-8")
+
+PARSER = WortenHtmlParser({"date": "2022-10-01"})
+
+
+def _section(category_lvl3: str, pages: list[str]) -> SectionScrape:
+    specs = {"base_url": category_lvl3, "category_lvl1": "eletro", "category_lvl2": "roupa",
+             "category_lvl3": category_lvl3}
+    return SectionScrape(pages, specs, {})
+
+
+def _stage(staged: StagedProducts, section: SectionScrape) -> None:
+    staged.add(section.section_specs, PARSER.parse_category(section))
+
+
+def test_duplicates_collapse(tmp_path) -> None:
+    staged = StagedProducts(tmp_path / "staged")
+    _stage(staged, _section("lavar", [LISTING]))
+    # the same products listed in another category (and twice in it)
+    _stage(staged, _section("lavar-e-secar", [LISTING, MALFORMED, LISTING]))
+    assert "lavar" in staged and len(staged) == 2
+
+    index = ProductIndex(tmp_path / "index.sqlite")
+    first, second = staged.first_seen(index)
+    assert len(first) == 3
+    assert [record["name"] for record in second.to_records()] == ["Mini Bar HAIER 40L"], "keyed by name and image"
+    assert len(index) == 4
+    records = index.with_categories(first.to_records())
+    assert records[0]["url"] == "/produtos/maquina-de-lavar-roupa-bosch-7001"
+    assert records[0]["categories"] == ["eletro/roupa/lavar", "eletro/roupa/lavar-e-secar"]
+
+
+def test_resumed_run_keeps_products(tmp_path) -> None:
+    index = ProductIndex(tmp_path / "index.sqlite")
+    staged = StagedProducts(tmp_path / "staged")
+    _stage(staged, _section("lavar", [LISTING]))
+    # a first attempt got to register the products, then crashed before outputting them
+    assert sum(len(products) for products in staged.first_seen(index)) == 3
+
+    # the resumed run stages the other section, the index is rebuilt from the staged products
+    staged = StagedProducts(tmp_path / "staged")
+    _stage(staged, _section("lavar-e-secar", [MALFORMED]))
+    products = list(staged.first_seen(ProductIndex(tmp_path / "index.sqlite")))
+    assert [len(batch) for batch in products] == [3, 1]
+    assert products[0].to_records() == PARSER.parse_category(_section("lavar", [LISTING])).to_records()
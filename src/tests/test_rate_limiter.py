@@ -0,0 +1,44 @@
+"""
+Unit tests for the adaptive rate limiter (with a fake clock, nothing sleeps)
+"""
+import pytest
+
+from web_scraper.extract.rate_limiter import AdaptiveRateLimiter
+
+URL = "https://www.worten.pt/grandes-eletrodomesticos"
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock() -> FakeClock:
+    return FakeClock()
+
+
+def test_token_bucket_waits(clock) -> None:
+    limiter = AdaptiveRateLimiter(initial_rate=0.5, jitter=0, clock=clock)
+    assert limiter.reserve(URL) == 0, "the first request uses the token in the bucket"
+    assert limiter.reserve(URL) == pytest.approx(2), "the second one waits 1/rate"
+    clock.now = 10
+    assert limiter.reserve(URL) == 0, "the bucket refills with time"
+    assert limiter.reserve("https://example.com") == 0, "each host has its own bucket"
+
+
+def test_aimd(clock) -> None:
+    limiter = AdaptiveRateLimiter(
+        initial_rate=1, min_rate=0.1, max_rate=1.2, increase=0.1, decrease_factor=0.5, clock=clock
+    )
+    limiter.record_success(URL)
+    assert limiter.rate(URL) == pytest.approx(1.1)
+    limiter.record_success(URL)
+    limiter.record_success(URL)
+    assert limiter.rate(URL) == pytest.approx(1.2), "the rate is capped by max_rate"
+    for _ in range(10):
+        limiter.record_failure(URL)
+    assert limiter.rate(URL) == pytest.approx(0.1), "the rate is floored by min_rate"
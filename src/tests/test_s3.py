@@ -0,0 +1,83 @@
+"""
+Unit tests for the S3 uploads, against a local moto server
+"""
+import gzip
+import json
+import secrets
+
+import pytest
+
+from web_scraper.support.utils import S3Reader, S3Uploader, S3_MIN_PART_SIZE
+
+
+def _read_records(client, bucket: str, key: str) -> list[dict]:
+    body = client.get_object(Bucket=bucket, Key=key)["Body"].read()
+    return [json.loads(line) for line in gzip.decompress(body).splitlines()]
+
+
+def test_small_sections_batched(s3_bucket) -> None:
+    client, bucket = s3_bucket
+    sections = [[{"name": f"product {i}-{j}", "price": 9.99 + j} for j in range(3)] for i in range(4)]
+    with S3Uploader(bucket, "products/20221204_2044", client) as uploader:
+        for section in sections:
+            uploader.write(section)
+    assert uploader.keys == ["products/20221204_2044-00000.ndjson.gz"]
+    assert _read_records(client, bucket, uploader.keys[0]) == [record for section in sections for record in section]
+
+
+def test_multipart_objects(s3_bucket) -> None:
+    client, bucket = s3_bucket
+    # random hex names compress to about half, ~11MB of compressed records
+    records = [{"name": secrets.token_hex(500), "i": i} for i in range(22_000)]
+    uploader = S3Uploader(bucket, "products/run", client, part_size=S3_MIN_PART_SIZE, object_size=10 * 1024 * 1024)
+    uploader.write(records[:12_000])
+    uploader.write(records[12_000:])
+    keys = uploader.close()
+
+    # the first object reached its size after 2 parts (the 3rd is the end of its gzip stream),
+    # then the rest went to a second object
+    assert keys == ["products/run-00000.ndjson.gz", "products/run-00001.ndjson.gz"]
+    assert client.head_object(Bucket=bucket, Key=keys[0])["ETag"].endswith('-3"')
+    assert [record for key in keys for record in _read_records(client, bucket, key)] == records
+    assert uploader.n_records == len(records)
+
+
+def test_aborted_on_error(s3_bucket) -> None:
+    client, bucket = s3_bucket
+    records = [{"name": secrets.token_hex(500), "i": i} for i in range(12_000)]
+    with pytest.raises(RuntimeError):
+        with S3Uploader(bucket, "products/failed", client, part_size=S3_MIN_PART_SIZE) as uploader:
+            uploader.write(records)
+            raise RuntimeError("the run failed")
+    assert uploader.keys == []
+    assert "Contents" not in client.list_objects_v2(Bucket=bucket, Prefix="products/failed")
+    assert not client.list_multipart_uploads(Bucket=bucket).get("Uploads")
+
+
+def test_parts_too_small() -> None:
+    with pytest.raises(ValueError):
+        S3Uploader("shop-scrape", "products", client=object(), part_size=1024)
+
+
+def test_reader_streams_records(s3_bucket) -> None:
+    client, bucket = s3_bucket
+    records = [{"name": f"product {i}", "price": i + 0.99} for i in range(5_000)]
+    with S3Uploader(bucket, "products/run", client) as uploader:
+        uploader.write(records)
+    # two gzip files one after the other are still read as one
+    two_files = gzip.compress(b'{"i": 1}\n') + gzip.compress(b'{"i": 2}')
+    client.put_object(Bucket=bucket, Key="two.ndjson.gz", Body=two_files)
+    client.put_object(Bucket=bucket, Key="plain.ndjson", Body=b'{"i": 1}\r\n\n{"i": 2}')
+    # objects of write_to_s3, a JSON list
+    client.put_object(Bucket=bucket, Key="worten_products20221204", Body=json.dumps(records[:3]).encode())
+
+    # small chunks, the records are split between chunks
+    reader = S3Reader(bucket, client, chunk_size=1024, max_workers=2)
+    assert list(reader.iter_records(uploader.keys[0])) == records
+    assert list(reader.iter_records("two.ndjson.gz")) == [{"i": 1}, {"i": 2}]
+    assert list(reader.iter_records("plain.ndjson")) == [{"i": 1}, {"i": 2}]
+    assert list(reader.iter_records("worten_products20221204")) == records[:3]
+
+    keys = ["plain.ndjson", "two.ndjson.gz", "worten_products20221204"]
+    assert [key for key, _ in reader.read_many(keys)] == keys
+    assert reader.read_range("plain.ndjson", 11, 8) == b'{"i": 2}'
@@ -0,0 +1,74 @@
+"""
+Unit tests for the HTTP Worten scraper, the site is replaced by a mock transport
+"""
+import httpx
+import pytest
+
+from web_scraper import config
+from web_scraper.extract.scraper_config import WORTEN_SP_CONFIG_PER_SYSTEM
+from web_scraper.extract.scraper_http import WortenHttpScraper
+from web_scraper.extract.rate_limiter import AdaptiveRateLimiter
+
+BASE_URL = "https://www.worten.pt/grandes-eletrodomesticos/maquinas-de-roupa/maquinas-de-lavar-roupa"
+
+
+def listing_page(page: int, n_pages: int) -> str:
+    pages = "".join(f"<li>{p}</li>" for p in range(1, n_pages + 1))
+    return (
+        f'<html><body><div class="w-product__wrapper">product of page {page}</div>'
+        f'<ul aria-label="Pagination">{pages}<li class="pagination-next"><a>&gt;</a></li></ul></body></html>'
+    )
+
+
+class FakeFallback:
+    wd = "already started"
+
+    def __init__(self) -> None:
+        self.urls = []
+
+    def try_get_section(self, base_url, specs=None):
+        self.urls.append(base_url)
+        return "selenium section"
+
+
+@pytest.fixture
+def http_scraper():
+    def handler(request: httpx.Request) -> httpx.Response:
+        if "captcha" in request.url.path:
+            return httpx.Response(200, text="<html>Captcha</html>")
+        page = int(request.url.params.get("page", 1))
+        return httpx.Response(200, text=listing_page(page, 3))
+
+    worten_config = WORTEN_SP_CONFIG_PER_SYSTEM[config.MODE]
+    # the mock site is never throttled
+    rate_limiter = AdaptiveRateLimiter(initial_rate=1000, max_rate=1000, burst=100, jitter=0)
+    scraper = WortenHttpScraper(
+        worten_config, FakeFallback(), transport=httpx.MockTransport(handler), rate_limiter=rate_limiter
+    )
+    yield scraper
+    scraper.close()
+
+
+def test_count_pages_html() -> None:
+    assert WortenHttpScraper.count_pages(listing_page(1, 8)) == 8
+    assert WortenHttpScraper.count_pages("<html><body></body></html>") is None
+
+
+def test_throttled_by_default() -> None:
+    scraper = WortenHttpScraper(WORTEN_SP_CONFIG_PER_SYSTEM[config.MODE])
+    assert isinstance(scraper.rate_limiter, AdaptiveRateLimiter)
+    scraper.close()
+
+
+def test_get_section(http_scraper) -> None:
+    section = http_scraper.try_get_section(BASE_URL, {"category_lvl3": "maquinas-de-lavar-roupa"})
+    n_pages_ref = min(3, http_scraper.config.MAX_PAGES_PER_SECTION)
+    assert section.section_specs["n_pages"] == 3
+    assert section.metadata["n_pages_scraped"] == len(section.html) == n_pages_ref
+    assert all(f"product of page {p}" in html for p, html in enumerate(section.html, 1))
+
+
+def test_captcha_falls_back_to_browser(http_scraper) -> None:
+    sections = list(http_scraper.get_sections([(BASE_URL, None), (f"{BASE_URL}-captcha", None)]))
+    assert "selenium section" in sections
+    assert http_scraper.fallback.urls == [f"{BASE_URL}-captcha"]
@@ -13,5 +13,28 @@ MAIN_DIR = POSSIBLE_MAIN_DIR[MODE]
 LOG_LVL = logging.INFO
 LOG_FN = MAIN_DIR / 'logs' / 'scraper.log'
 DATA_DIR = MAIN_DIR / 'data'
+# level 3 categories found in the site, reused until they expire
+CATEGORY_CACHE_FN = DATA_DIR / 'category_tree.json'
+# where the path of the chromedriver downloaded by webdriver_manager is cached
+DRIVER_CACHE_FN = MAIN_DIR / 'drivers' / 'chromedriver_path.txt'
+# persistent Chrome profiles (keep cookies consent and cache between runs)
+PROFILE_DIR = MAIN_DIR / 'chrome_profiles'
+# processes parsing the scraped sections while the scraper moves on
+PARSE_WORKERS = 2
+# products captured from the pages already parsed, by page content
+PARSE_CACHE_FN = DATA_DIR / 'parse_cache.sqlite'
+# scraped sections waiting to be saved, once reached the scraper waits for the writer
+PERSIST_QUEUE_SIZE = 4
+# slim and compress the raw pages before saving them (requires the compression extra),
+# slimming is lossy: only the product containers of the pages are kept
+COMPRESS_RAW_PAGES = False
+# save the parsed products as a Parquet dataset (requires the arrow extra)
+SAVE_PROCESSED_PRODUCTS = False
+# also upload the parsed products to this S3 bucket (None to only keep them locally)
+S3_BUCKET = None
+# also write the parsed products to this DynamoDB table (None to not use DynamoDB)
+DYNAMODB_TABLE = None
+# region of the DynamoDB table
+AWS_REGION = 'eu-west-1'
 # set value when you want to continue a scrape (otherwise None)
 REFERENCE_TIME = '20221204_2044'
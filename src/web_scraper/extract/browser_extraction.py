@@ -0,0 +1,35 @@
+"""
+Script that extracts the product fields inside the browser
+
+Instead of sending the whole page source over the WebDriver wire to parse it
+afterwards, the captures of the product spec (see transform.field_spec) are
+collected in the browser and returned as a compact array (one array of raw
+strings per product, in the order of EXTRACTED_FIELDS).
+WortenHtmlParser.parse_extracted decodes them into the usual product records.
+"""
+import json
+
+from web_scraper.transform.field_spec import WORTEN_PRODUCT_SPEC
+
+EXTRACTED_FIELDS: tuple[str, ...] = tuple(capture.name for capture in WORTEN_PRODUCT_SPEC.captures)
+
+# each capture is [CSS selector of each step, attribute (null for the text)]
+_CAPTURES = [[capture.css_path, capture.attr] for capture in WORTEN_PRODUCT_SPEC.captures]
+_CONTAINER = "{}.{}".format(*WORTEN_PRODUCT_SPEC.container).replace(" ", ".")
+
+PRODUCT_EXTRACTION_JS = """
+const captures = %s;
+const capture = (container, [path, attr]) => {
+    let elem = container;
+    for (const selector of path) {
+        elem = elem.querySelector(selector);
+        if (elem === null) {
+            return null;
+        }
+    }
+    return attr === null ? elem.textContent : elem.getAttribute(attr);
+};
+return Array.from(document.querySelectorAll('%s')).map(
+    container => captures.map(spec => capture(container, spec))
+);
+""" % (json.dumps(_CAPTURES), _CONTAINER)
@@ -0,0 +1,91 @@
+"""
+Defines the on disk cache of the level 3 categories to scrape
+
+Finding the categories requires loading the (heavy) category directory page,
+so they are kept in a JSON file and only looked up again once it expires.
+When they are refreshed, the new categories are compared to the cached ones.
+"""
+import json
+from pathlib import Path
+from datetime import datetime
+from dataclasses import dataclass, field
+from typing import Optional
+
+from web_scraper.support import utils
+from web_scraper.support.types import Numeric, ListStrDict
+
+
+logger = utils.log_ws(__name__)
+
+
+@dataclass
+class CategoryDiff:
+    added: ListStrDict = field(default_factory=list)
+    removed: ListStrDict = field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed)
+
+
+class CategoryCache:
+    """
+    Level 3 categories (as found by WortenScraper.find_lvl3_category_urls) stored
+    in a JSON file, valid for ttl_sec seconds
+    """
+    def __init__(self, path: Path, ttl_sec: Numeric = 7 * 24 * 3600) -> None:
+        self.path = Path(path)
+        self.ttl_sec = ttl_sec
+
+    def _read(self) -> Optional[dict]:
+        if not self.path.is_file():
+            return None
+        with open(self.path) as file:
+            return json.load(file)
+
+    def age_sec(self) -> Optional[float]:
+        cache = self._read()
+        if cache is None:
+            return None
+        return (datetime.now() - datetime.fromisoformat(cache["fetched_at"])).total_seconds()
+
+    def is_fresh(self) -> bool:
+        age_sec = self.age_sec()
+        return age_sec is not None and age_sec < self.ttl_sec
+
+    def load(self, allow_stale: bool = False) -> Optional[ListStrDict]:
+        """
+        :param allow_stale: return the categories even if the cache expired
+        :return: the cached categories (None if there are none or they expired)
+        """
+        cache = self._read()
+        if cache is None:
+            return None
+        if not allow_stale and not self.is_fresh():
+            return None
+        return cache["categories"]
+
+    def save(self, categories: ListStrDict) -> CategoryDiff:
+        """
+        Replaces the cached categories
+        :return: what changed compared to the previously cached categories
+        """
+        previous = self.load(allow_stale=True) or []
+        diff = self.diff(previous, categories)
+        if previous and diff:
+            logger.info(
+                f"categories changed, {len(diff.added)} added: {[c['url'] for c in diff.added]}, "
+                f"{len(diff.removed)} removed: {[c['url'] for c in diff.removed]}"
+            )
+        self.path.parent.mkdir(exist_ok=True, parents=True)
+        with open(self.path, 'w') as file:
+            json.dump({"fetched_at": datetime.now().isoformat(), "categories": categories}, file, indent=1)
+        return diff
+
+    @staticmethod
+    def diff(old: ListStrDict, new: ListStrDict) -> CategoryDiff:
+        old_urls = {category["url"] for category in old}
+        new_urls = {category["url"] for category in new}
+        return CategoryDiff(
+            added=[category for category in new if category["url"] not in old_urls],
+            removed=[category for category in old if category["url"] not in new_urls],
+        )
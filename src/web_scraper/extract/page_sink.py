@@ -0,0 +1,100 @@
+"""
+Defines the page sinks, where the scrapers send each page as soon as it's captured
+
+Streaming the pages keeps the memory used by a section bounded, no matter how
+many pages it has. ListSink keeps the previous behaviour (all the pages of the
+section in memory).
+"""
+import queue
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Optional
+
+
+class PageSink(ABC):
+    """
+    Receives the pages of the sections being scraped, one at a time
+    """
+    def open_section(self, section_specs: dict[str, Any]) -> None:
+        """
+        Called before the first page of a section
+        """
+        pass
+
+    @abstractmethod
+    def write_page(self, page: Any, page_number: int, section_specs: dict[str, Any]) -> None:
+        """
+        Called for each page scraped
+        :param page: the page content (HTML unless the scraper extracts it in the browser)
+        :param page_number: page number in the section (starting at 1)
+        :param section_specs: specs of the section the page belongs to
+        """
+
+    def close_section(self, section_specs: dict[str, Any], metadata: dict[str, Any]) -> None:
+        """
+        Called after the last page of a section
+        """
+        pass
+
+    def abort_section(self, section_specs: dict[str, Any], error: BaseException) -> None:
+        """
+        Called instead of close_section when the scrape of a section fails, the
+        pages it already received are of no use
+        """
+        pass
+
+
+class ListSink(PageSink):
+    """
+    Keeps all the pages of the last section in memory
+    """
+    def __init__(self) -> None:
+        self.pages: list[Any] = []
+
+    def open_section(self, section_specs: dict[str, Any]) -> None:
+        self.pages = []
+
+    def write_page(self, page: Any, page_number: int, section_specs: dict[str, Any]) -> None:
+        self.pages.append(page)
+
+    def abort_section(self, section_specs: dict[str, Any], error: BaseException) -> None:
+        self.pages = []
+
+
+class CallbackSink(PageSink):
+    """
+    Calls a function on every page, ex: a parser or a persister method
+    """
+    def __init__(
+            self,
+            on_page: Callable[[Any, int, dict[str, Any]], None],
+            on_close: Optional[Callable[[dict[str, Any], dict[str, Any]], None]] = None) -> None:
+        self.on_page = on_page
+        self.on_close = on_close
+
+    def write_page(self, page: Any, page_number: int, section_specs: dict[str, Any]) -> None:
+        self.on_page(page, page_number, section_specs)
+
+    def close_section(self, section_specs: dict[str, Any], metadata: dict[str, Any]) -> None:
+        if self.on_close is not None:
+            self.on_close(section_specs, metadata)
+
+
+class QueueSink(PageSink):
+    """
+    Puts the pages in a queue for a consumer running in another thread.
+    With a bounded queue the scraper waits whenever the consumer falls behind.
+    Items are (section_specs, page_number, page), the end of a section is
+    signaled by (section_specs, None, metadata) and a failed section by
+    (section_specs, None, the exception).
+    """
+    def __init__(self, page_queue: queue.Queue) -> None:
+        self.queue: queue.Queue = page_queue
+
+    def write_page(self, page: Any, page_number: int, section_specs: dict[str, Any]) -> None:
+        self.queue.put((section_specs, page_number, page))
+
+    def close_section(self, section_specs: dict[str, Any], metadata: dict[str, Any]) -> None:
+        self.queue.put((section_specs, None, metadata))
+
+    def abort_section(self, section_specs: dict[str, Any], error: BaseException) -> None:
+        self.queue.put((section_specs, None, error))
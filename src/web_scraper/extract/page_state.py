@@ -0,0 +1,90 @@
+"""
+Defines the states a Worten listing page can be in and the script that detects them
+
+All the conditions (products, pagination, next page, captcha, cookie banner)
+are checked together by a single script, so a page costs one poll loop
+instead of a WebDriverWait per condition, each of which could time out.
+"""
+from enum import Enum
+from typing import Optional, Any
+from dataclasses import dataclass
+
+
+class PageState(Enum):
+    HAS_NEXT_PAGE = "has_next_page"  # products and a link to the next page
+    LAST_PAGE = "last_page"  # products and no next page (single page sections included)
+    EMPTY = "empty"  # loaded but without products
+    CAPTCHA = "captcha"
+    COOKIE_BANNER = "cookie_banner"  # cookies pop-up in front of a page without products
+    TIMEOUT = "timeout"  # none of the above before the load wait ran out
+
+
+@dataclass(frozen=True)
+class PageSnapshot:
+    state: PageState
+    has_products: bool = False
+    has_pagination: bool = False
+    current_page: Optional[int] = None
+    last_page: Optional[int] = None
+
+    @classmethod
+    def from_js(cls, result: dict[str, Any]) -> "PageSnapshot":
+        return cls(
+            state=PageState(result["state"]),
+            has_products=result["has_products"],
+            has_pagination=result["has_pagination"],
+            current_page=result["current_page"],
+            last_page=result["last_page"],
+        )
+
+    def shows_previous_page(self, expected_page: Optional[int]) -> bool:
+        """
+        :param expected_page: page number that must be displayed (None if any)
+        :return: if the page still displays another page number than the
+            expected one (unknown without a current page in the pagination)
+        """
+        return (
+            self.has_products
+            and expected_page is not None
+            and self.current_page is not None
+            and self.current_page != expected_page
+        )
+
+
+# returns null while the page is still loading (the page number displayed is
+# checked by the caller, see PageSnapshot.shows_previous_page)
+PAGE_STATE_JS = """
+const digits = elem => parseInt(elem.textContent.replace(/[^0-9]/g, ''), 10);
+const hasProducts = document.querySelector('div.w-product__wrapper') !== null;
+const pagination = document.querySelector('ul[aria-label="Pagination"]');
+const pageNumbers = pagination
+    ? Array.from(pagination.querySelectorAll('li')).map(digits).filter(n => !isNaN(n))
+    : [];
+const currentElem = pagination && pagination.querySelector('li.current');
+const currentPage = currentElem && !isNaN(digits(currentElem)) ? digits(currentElem) : null;
+const snapshot = state => ({
+    state: state,
+    has_products: hasProducts,
+    has_pagination: pagination !== null,
+    current_page: currentPage,
+    last_page: pageNumbers.length ? pageNumbers[pageNumbers.length - 1] : (hasProducts ? 1 : null)
+});
+
+if (hasProducts) {
+    const nextLink = document.querySelector('li.pagination-next a');
+    return snapshot(nextLink ? 'has_next_page' : 'last_page');
+}
+if (document.documentElement.innerHTML.toLowerCase().includes('captcha')) {
+    return snapshot('captcha');
+}
+const cookieButton = document.evaluate(
+    "//*[contains(text(), 'Aceitar Tudo')]", document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null
+).singleNodeValue;
+if (cookieButton !== null) {
+    return snapshot('cookie_banner');
+}
+if (document.readyState === 'complete') {
+    return snapshot('empty');
+}
+return null;
+"""
@@ -0,0 +1,118 @@
+"""
+Defines an adaptive rate limiter to throttle the scrapers
+
+Each host has a token bucket whose refill rate follows an AIMD policy
+(additive increase, multiplicative decrease): the rate grows slowly while the
+pages load cleanly and is cut down as soon as the site shows signs of
+struggling (timeouts, elements not interactable, captcha).
+The limiter is thread safe so a pool of scrapers can share it.
+"""
+import time
+import threading
+from random import uniform
+from dataclasses import dataclass
+from typing import Callable
+from urllib.parse import urlparse
+
+from web_scraper.support import utils
+
+
+logger = utils.log_ws(__name__)
+
+
+@dataclass
+class HostBucket:
+    rate: float
+    tokens: float
+    updated_at: float
+
+
+class AdaptiveRateLimiter:
+    """
+    Token bucket rate limiter per host with AIMD rate adaptation
+    :param initial_rate: requests per second allowed at the start
+    :param min_rate: lower bound of the rate (requests per second)
+    :param max_rate: upper bound of the rate (requests per second)
+    :param increase: added to the rate after each successful request
+    :param decrease_factor: multiplies the rate after each failed request
+    :param burst: maximum number of tokens a bucket can hold
+    :param jitter: random share of the wait added to it, so requests don't look scheduled
+    :param clock: source of time in seconds
+    """
+    def __init__(
+            self,
+            initial_rate: float = 1 / 3,
+            min_rate: float = 1 / 30,
+            max_rate: float = 2,
+            increase: float = 0.05,
+            decrease_factor: float = 0.5,
+            burst: float = 1,
+            jitter: float = 0.2,
+            clock: Callable[[], float] = time.monotonic,
+            ) -> None:
+        assert 0 < min_rate <= initial_rate <= max_rate, "rates must verify 0 < min <= initial <= max"
+        assert 0 < decrease_factor < 1, "decrease_factor must be between 0 and 1"
+        self.initial_rate = initial_rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease_factor = decrease_factor
+        self.burst = burst
+        self.jitter = jitter
+        self.clock = clock
+        self._buckets: dict[str, HostBucket] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def host(url: str) -> str:
+        return urlparse(url).netloc or url
+
+    def _bucket(self, host: str) -> HostBucket:
+        if host not in self._buckets:
+            self._buckets[host] = HostBucket(self.initial_rate, self.burst, self.clock())
+        return self._buckets[host]
+
+    def rate(self, url: str) -> float:
+        with self._lock:
+            return self._bucket(self.host(url)).rate
+
+    def reserve(self, url: str) -> float:
+        """
+        Takes a token from the host's bucket, if there are none left the
+        token is borrowed from the future
+        :param url: URL (or host) about to be requested
+        :return: the time to wait (seconds) before doing the request
+        """
+        with self._lock:
+            bucket = self._bucket(self.host(url))
+            now = self.clock()
+            bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated_at) * bucket.rate)
+            bucket.updated_at = now
+            bucket.tokens -= 1
+            wait_sec = max(0.0, -bucket.tokens / bucket.rate)
+        return wait_sec * (1 + uniform(0, self.jitter))
+
+    def acquire(self, url: str) -> float:
+        """
+        Blocks until the request to the URL is allowed
+        :return: the time it waited
+        """
+        wait_sec = self.reserve(url)
+        time.sleep(wait_sec)
+        return wait_sec
+
+    def record_success(self, url: str) -> None:
+        with self._lock:
+            bucket = self._bucket(self.host(url))
+            bucket.rate = min(self.max_rate, bucket.rate + self.increase)
+
+    def record_failure(self, url: str) -> None:
+        """
+        Cuts the rate and empties the bucket so the next request has to wait
+        """
+        with self._lock:
+            bucket = self._bucket(self.host(url))
+            bucket.rate = max(self.min_rate, bucket.rate * self.decrease_factor)
+            bucket.tokens = min(bucket.tokens, 0)
+            rate = bucket.rate
+        logger.info(f"backing off {self.host(url)}, rate down to {rate:.3f} requests/s")
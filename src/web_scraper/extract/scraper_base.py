@@ -5,7 +5,10 @@ It implements so of the ideas in this link about masking a web scraper
 https://www.php8legs.com/en/php-web-scraper/51-how-to-avoid-selenium-webdriver-from-being-detected-as-bot-or-web-spider
 """
 import time
+import shutil
+from pathlib import Path
 from random import uniform
+from functools import lru_cache
 from dataclasses import dataclass
 from typing import Union, Type, Optional, Any
 
@@ -14,17 +17,61 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.chrome.service import Service
 from webdriver_manager.chrome import ChromeDriverManager
 
+from web_scraper import config as ws_config
 from web_scraper.support import utils
 from web_scraper.extract import scraper_config as spc
+from web_scraper.extract.rate_limiter import AdaptiveRateLimiter
 from web_scraper.support.types import Numeric, NumericIter
 
 
 logger = utils.log_ws(__name__)
 
+# bytes downloaded (headers and body) and load time of the current page, resource timings
+# are cleared afterwards so pages navigated without a full reload are also measured
+PAGE_LOAD_STATS_JS = """
+const nav = performance.getEntriesByType('navigation')[0];
+const resources = performance.getEntriesByType('resource');
+const resourceBytes = resources.reduce((total, r) => total + (r.transferSize || 0), 0);
+const loadEnd = nav && nav.loadEventEnd > 0 ? nav.loadEventEnd : performance.now();
+performance.clearResourceTimings();
+return {
+    load_time_ms: nav ? loadEnd - nav.startTime : null,
+    bytes_transferred: (nav ? nav.transferSize : 0) + resourceBytes,
+    n_resources: resources.length
+};
+"""
+
+
+@lru_cache(maxsize=None)
+def resolve_driver_path(
+        driver_path: Optional[Union[str, Path]],
+        cache_fn: Path = ws_config.DRIVER_CACHE_FN) -> str:
+    """
+    Finds the chromedriver to use, only the first call of the process does any work:
+        1. the configured driver_path, if the file exists
+        2. the driver downloaded by a previous run (path cached in cache_fn)
+        3. downloads it with webdriver_manager (requires network) and caches its path
+    :param driver_path: the configured DRIVER_PATH
+    :param cache_fn: file where the downloaded driver path is kept
+    :return: path of the chromedriver executable
+    """
+    if driver_path and Path(driver_path).is_file():
+        return str(driver_path)
+    if cache_fn.is_file():
+        cached_path = cache_fn.read_text().strip()
+        if Path(cached_path).is_file():
+            return cached_path
+    logger.info("chromedriver not found locally, installing it")
+    installed_path = ChromeDriverManager().install()
+    cache_fn.parent.mkdir(exist_ok=True, parents=True)
+    cache_fn.write_text(installed_path)
+    return installed_path
+
 
 @dataclass
 class SectionScrape:
-    html: list[str]
+    # page sources, or the products of each page when extracted in the browser
+    html: list[Union[str, list[list[Optional[str]]]]]
     section_specs: dict[str, Any]
     metadata: dict[str, Any]
 
@@ -46,6 +93,11 @@ class Scraper:
         self.chrome_options: webdriver.ChromeOptions = self.__set_chrome_options()
         self.wd: Optional[webdriver.Chrome] = None
         self.sample_share: Numeric = 1
+        self.rate_limiter: Optional[AdaptiveRateLimiter] = None
+        self.user_data_dir: Optional[Path] = None
+        self.profile_seed_dir: Optional[Path] = None
+        if self.config.USER_DATA_DIR:
+            self.set_profile(Path(self.config.USER_DATA_DIR) / 'default')
 
     def __set_chrome_options(self) -> webdriver.ChromeOptions:
         """
@@ -57,8 +109,24 @@ class Scraper:
         options.add_experimental_option("excludeSwitches", ["enable-automation"])
         # if you don't set a user Agent the sites identify straight away that it's a crawler
         options.add_argument(f"user-agent={self.config.USER_AGENT}")
+        if self.config.BLOCK_IMAGES:
+            options.add_experimental_option(
+                "prefs", {"profile.managed_default_content_settings.images": 2}
+            )
         return options
 
+    def _block_urls(self) -> None:
+        """
+        Prevents the browser from downloading the URLs in BLOCKED_URL_PATTERNS
+        (through the Chrome DevTools Protocol, only works once the browser started)
+        """
+        if not self.config.BLOCKED_URL_PATTERNS:
+            return
+        self.wd.execute_cdp_cmd("Network.enable", {})
+        self.wd.execute_cdp_cmd(
+            "Network.setBlockedURLs", {"urls": list(self.config.BLOCKED_URL_PATTERNS)}
+        )
+
     # TODO: define this as a property
     def display_user_agent(self) -> str:
         """
@@ -85,27 +153,87 @@ class Scraper:
         # unless this option is active
         self.chrome_options.add_argument('--disable-dev-shm-usage')
 
+    def set_profile(self, user_data_dir: Path, seed_dir: Optional[Path] = None) -> None:
+        """
+        Makes Chrome use a persistent profile, so the cookies (consent included)
+        and the cache survive between runs.
+        Two Chrome instances can't share a profile, so each scraper running at
+        the same time needs its own user_data_dir.
+        :param user_data_dir: the profile folder
+        :param seed_dir: profile copied to user_data_dir if it doesn't exist yet
+        """
+        assert self.wd is None, "set_profile must be ran before start_chrome"
+        self.user_data_dir = Path(user_data_dir)
+        self.profile_seed_dir = seed_dir
+
+    def _prepare_profile(self) -> None:
+        if self.user_data_dir is None:
+            return
+        seed_dir = self.profile_seed_dir
+        if not self.user_data_dir.exists() and seed_dir and seed_dir.is_dir():
+            logger.info(f"creating profile {self.user_data_dir.name} from {seed_dir.name}")
+            # lock files belong to the Chrome instance using the seed profile
+            shutil.copytree(seed_dir, self.user_data_dir, ignore=shutil.ignore_patterns("Singleton*"))
+        self.user_data_dir.mkdir(exist_ok=True, parents=True)
+        self.chrome_options.arguments[:] = [
+            arg for arg in self.chrome_options.arguments if not arg.startswith("--user-data-dir")
+        ]
+        self.chrome_options.add_argument(f"--user-data-dir={self.user_data_dir}")
+
     def start_chrome(self) -> None:
         """
         Launches Chrome with the specified configuration
         """
-        #self.wd = webdriver.Chrome(self.config.DRIVER_PATH, options=self.chrome_options)
-        self.wd = webdriver.Chrome(service=Service(ChromeDriverManager().install()))
+        self._prepare_profile()
+        self.wd = webdriver.Chrome(
+            service=Service(resolve_driver_path(self.config.DRIVER_PATH)),
+            options=self.chrome_options
+        )
+        self._block_urls()
 
     def get(self, *args, **kwargs):
         self.assert_wd_active()
         self.wd.get(*args, **kwargs)
 
+    def page_load_stats(self) -> dict[str, Optional[Numeric]]:
+        """
+        Measures what it cost to load the current page
+        :return: the load time (ms), bytes transferred and number of resources downloaded
+        """
+        self.assert_wd_active()
+        return self.wd.execute_script(PAGE_LOAD_STATS_JS)
+
     def quit(self) -> None:
         self.assert_wd_active()
         self.wd.quit()
 
+    def set_rate_limiter(self, rate_limiter: AdaptiveRateLimiter) -> None:
+        """
+        Replaces the sleep_pattern_sec throttling by an adaptive rate limiter
+        (which can be shared with other scrapers)
+        """
+        self.rate_limiter = rate_limiter
+
+    def record_page_outcome(self, success: bool) -> None:
+        """
+        Lets the rate limiter (if any) know whether the current page loaded cleanly
+        """
+        if self.rate_limiter is None or self.wd is None:
+            return
+        if success:
+            self.rate_limiter.record_success(self.wd.current_url)
+        else:
+            self.rate_limiter.record_failure(self.wd.current_url)
+
     def sleep(self) -> float:
         """
         Throttling the scraper either for a specific time or
-        for a random time between a given range to emulate a human
+        for a random time between a given range to emulate a human.
+        If there is a rate limiter it waits for as long as it requires instead.
         :return: the time it slept
         """
+        if self.rate_limiter is not None and self.wd is not None:
+            return self.rate_limiter.acquire(self.wd.current_url)
         try:
             sleep_time: Numeric = uniform(
                 self.sleep_pattern_sec[0],
@@ -1,4 +1,5 @@
 from abc import ABC
+from typing import Optional
 from dataclasses import dataclass
 
 from web_scraper import config
@@ -20,13 +21,27 @@ class WortenSearchConfig:
     LVL3_REF: str = 'submenu-third-level'
     LVL3_EXCLUDED_CATEGORIES: list[str] = default_field(['Ver Todos', 'Ajuda-me a escolher'])
     MAX_PAGES_PER_SECTION: int = 2#5
+    # query parameter used by the listing pages to select the page number
+    PAGE_URL_PARAM: str = 'page'
     N_MAX_SECTION_FAIL = 100
+    CATEGORY_CACHE_TTL_SEC: int = 7 * 24 * 3600
 
 
 @dataclass(frozen=True)
 class ScraperConfig(ABC):
     DRIVER_PATH: str
     USER_AGENT: str
+    # the scraper only needs the DOM, so Chrome doesn't have to download images or
+    # any of the URLs matching these patterns (* is a wildcard)
+    # CSS is not blocked by default because clicking on links depends on the page layout
+    BLOCK_IMAGES: bool = True
+    BLOCKED_URL_PATTERNS: tuple[str, ...] = (
+        "*.woff", "*.woff2", "*.ttf", "*.otf", "*.mp4", "*.webm",
+        "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*",
+        "*facebook.net*", "*hotjar.com*", "*criteo.*", "*tiktok.com*",
+    )
+    # persistent Chrome profile (user-data-dir) folder, a new profile every run if None
+    USER_DATA_DIR: Optional[str] = None
 
 
 class WortenSpConfig(WortenSearchConfig, ScraperConfig):
@@ -36,11 +51,13 @@ class WortenSpConfig(WortenSearchConfig, ScraperConfig):
 class LocalhostWSpConfig(WortenSpConfig):
     DRIVER_PATH: str = config.MAIN_DIR / 'drivers' / 'chromedriver_mac64_10605249' #_mod
     USER_AGENT: str = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/106.0.0.0 Safari/537.36"
+    USER_DATA_DIR: str = config.PROFILE_DIR
 
 
 class DockerWSpConfig(WortenSpConfig):
     DRIVER_PATH: str = '/usr/local/bin/chromedriver'
     USER_AGENT: str = "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/107.0.5304.68 Safari/537.36"
+    USER_DATA_DIR: str = config.PROFILE_DIR
 
 
 WORTEN_SP_CONFIG_PER_SYSTEM: dict = {
@@ -0,0 +1,235 @@
+"""
+Defines a Selenium free scraper for the Worten listing pages
+
+Instead of clicking on the next page button, the page URLs are built from the
+number of pages found in the first page and fetched concurrently with a pooled
+async HTTP client. Categories that can't be scraped this way (captcha or pages
+rendered by JS only) are handed to a Selenium WortenScraper.
+"""
+import re
+import asyncio
+from datetime import datetime
+from typing import Type, Optional, Iterable, Iterator
+from urllib.parse import urlparse, urlunparse, parse_qsl, urlencode
+
+import httpx
+from bs4 import BeautifulSoup, SoupStrainer
+
+import web_scraper.extract.scraper_config as spc
+
+from web_scraper.support import utils
+from web_scraper.support.types import StrDict
+from web_scraper.support.errors import BrowserRequiredError
+from web_scraper.extract.scraper_base import SectionScrape
+from web_scraper.extract.scraper_worten import WortenScraper
+from web_scraper.extract.rate_limiter import AdaptiveRateLimiter
+
+
+logger = utils.log_ws(__name__)
+
+
+class WortenHttpScraper:
+    """
+    Scrapes Worten sections over HTTP, falling back to the Selenium scraper
+    (if given) for the sections that require a browser
+    :param rate_limiter: throttles the requests to the site, a new AdaptiveRateLimiter
+        with its default rates if None (it can be shared with the Selenium scrapers)
+    """
+    product_container_class = 'w-product__wrapper'
+
+    def __init__(self,
+                 config: Type[spc.WortenSpConfig],
+                 fallback: Optional[WortenScraper] = None,
+                 max_connections: int = 8,
+                 max_concurrent_sections: int = 2,
+                 timeout_sec: float = 30,
+                 transport: Optional[httpx.AsyncBaseTransport] = None,
+                 rate_limiter: Optional[AdaptiveRateLimiter] = None,
+                 ) -> None:
+        self.config = config
+        self.fallback: Optional[WortenScraper] = fallback
+        self.max_connections: int = max_connections
+        self.max_concurrent_sections: int = max_concurrent_sections
+        self.timeout_sec: float = timeout_sec
+        self.sections_failed: list[StrDict] = []
+        self.sections_fallback: list[str] = []
+        self.rate_limiter: AdaptiveRateLimiter = rate_limiter or AdaptiveRateLimiter()
+        self._transport: Optional[httpx.AsyncBaseTransport] = transport
+        self._loop: asyncio.AbstractEventLoop = asyncio.new_event_loop()
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """
+        The client (and its connection pool) is shared by all the requests
+        """
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                headers={"User-Agent": self.config.USER_AGENT},
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections
+                ),
+                timeout=self.timeout_sec,
+                follow_redirects=True,
+                transport=self._transport,
+            )
+        return self._client
+
+    def close(self) -> None:
+        if self._client is not None:
+            self._loop.run_until_complete(self._client.aclose())
+            self._client = None
+        self._loop.close()
+
+    def page_url(self, base_url: str, page: int) -> str:
+        """
+        Builds the URL of a given page of the section
+        :param base_url: first page of a section
+        :param page: page number (starting at 1)
+        :return: the page URL
+        """
+        url = urlparse(base_url)
+        query = dict(parse_qsl(url.query))
+        query[self.config.PAGE_URL_PARAM] = str(page)
+        return urlunparse(url._replace(query=urlencode(query)))
+
+    @staticmethod
+    def count_pages(page_html: str) -> Optional[int]:
+        """
+        Find the last page in a given section from the HTML of one of its pages
+        (same as WortenScraper.count_pages but without a browser)
+        :return: the last page number
+        """
+        pagination_only = SoupStrainer("ul", {"aria-label": "Pagination"})
+        pagination_elem = BeautifulSoup(page_html, 'html.parser', parse_only=pagination_only).ul
+        if pagination_elem is None:
+            return None
+        page_txt = [re.sub('[^0-9]', '', elem.text) for elem in pagination_elem.find_all("li")]
+        page_number = [int(txt) for txt in page_txt if txt]
+        return page_number[-1] if page_number else None
+
+    def check_page(self, page_html: str) -> None:
+        """
+        Raises an error if the page is only accessible with a browser
+        """
+        if "captcha" in page_html.lower():
+            raise BrowserRequiredError("got Worten captcha")
+        if self.product_container_class not in page_html:
+            raise BrowserRequiredError("no products in the page HTML, probably rendered by JS")
+
+    async def _fetch_page(self, url: str) -> str:
+        await asyncio.sleep(self.rate_limiter.reserve(url))
+        try:
+            page_html = await self._get_page(url)
+        except (httpx.TimeoutException, httpx.HTTPStatusError, BrowserRequiredError):
+            self.rate_limiter.record_failure(url)
+            raise
+        self.rate_limiter.record_success(url)
+        return page_html
+
+    async def _get_page(self, url: str) -> str:
+        response = await self._get_client().get(url)
+        response.raise_for_status()
+        page_html = response.text
+        self.check_page(page_html)
+        return page_html
+
+    async def _fetch_section(
+            self,
+            base_url: str,
+            specs: Optional[dict] = None) -> SectionScrape:
+        logger.info(f'start http extraction {base_url}')
+        first_page = await self._fetch_page(base_url)
+        n_pages = self.count_pages(first_page)
+        n_pages_to_scrape = min(n_pages or 1, self.config.MAX_PAGES_PER_SECTION)
+        if n_pages and n_pages > self.config.MAX_PAGES_PER_SECTION:
+            logger.info("the section has more pages then the search limit")
+        other_pages = await asyncio.gather(*(
+            self._fetch_page(self.page_url(base_url, page))
+            for page in range(2, n_pages_to_scrape + 1)
+        ))
+        html = [first_page, *other_pages]
+        section_specs = WortenScraper.build_section_specs(base_url, n_pages, specs)
+        metadata = {"datetime": datetime.now(), "n_pages_scraped": len(html), "engine": "http"}
+        logger.info(f"scraped {len(html)}/{n_pages} pages")
+        return SectionScrape(html, section_specs, metadata)
+
+    def _fallback_section(
+            self,
+            base_url: str,
+            specs: Optional[StrDict] = None) -> Optional[SectionScrape]:
+        self.sections_fallback.append(base_url)
+        if self.fallback is None:
+            self._register_failure(base_url, specs)
+            return None
+        if self.fallback.wd is None:
+            self.fallback.start_chrome()
+            self.fallback.get_home_page()
+            self.fallback.rm_cookies_pop_up()
+        return self.fallback.try_get_section(base_url, specs)
+
+    def _register_failure(self, base_url: str, specs: Optional[StrDict] = None) -> None:
+        failed = {"base_url": base_url}
+        if specs:
+            failed.update(specs)
+        self.sections_failed.append(failed)
+        if len(self.sections_failed) > self.config.N_MAX_SECTION_FAIL:
+            raise ValueError('exceeded maximum amount of section failures')
+
+    async def _try_fetch_section(
+            self,
+            semaphore: asyncio.Semaphore,
+            base_url: str,
+            specs: Optional[StrDict] = None) -> tuple[Optional[SectionScrape], Optional[Exception]]:
+        async with semaphore:
+            try:
+                return await self._fetch_section(base_url, specs), None
+            except (httpx.HTTPError, BrowserRequiredError) as e:
+                return None, e
+
+    def try_get_section(
+            self,
+            base_url: str,
+            specs: Optional[StrDict] = None) -> Optional[SectionScrape]:
+        """
+        Scrapes a single section, with the browser if required
+        :param base_url: first page of a section
+        :param specs: additional information about the section
+        :return: a SectionScrape object (None if the scrape failed)
+        """
+        return next(self.get_sections([(base_url, specs)]))
+
+    def get_sections(
+            self,
+            tasks: Iterable[tuple[str, Optional[StrDict]]]) -> Iterator[Optional[SectionScrape]]:
+        """
+        Scrapes several sections concurrently, the sections are yielded as they
+        finish. Use WortenScraper.iter_category_tasks to get the Worten categories.
+        :param tasks: the base URL and specs of each section
+        :return: a SectionScrape per section (None if the scrape failed)
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrent_sections)
+        pending = {
+            self._loop.create_task(self._try_fetch_section(semaphore, base_url, specs)): (base_url, specs)
+            for base_url, specs in tasks
+        }
+        try:
+            while pending:
+                done, _ = self._loop.run_until_complete(
+                    asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                )
+                for task in done:
+                    base_url, specs = pending.pop(task)
+                    section, error = task.result()
+                    if isinstance(error, BrowserRequiredError):
+                        logger.info(f"{error}, scraping {base_url} with the browser")
+                        section = self._fallback_section(base_url, specs)
+                    elif error is not None:
+                        logger.warning(f"{error} prevented section scrape")
+                        self._register_failure(base_url, specs)
+                    yield section
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                self._loop.run_until_complete(asyncio.wait(pending))
@@ -0,0 +1,198 @@
+"""
+Defines a pool of Worten scrapers that crawl the site in parallel
+
+Each worker owns a Chrome session and its own throttle, they all pull level 3
+categories from a shared queue and hand back a SectionScrape as soon as a
+category is done.
+"""
+import queue
+import threading
+from typing import Union, Type, Optional, Iterator, Any, Collection
+
+import web_scraper.extract.scraper_config as spc
+
+from web_scraper.support import utils
+from web_scraper.support.types import Numeric, NumericIter, StrDict, ListStrDict
+from web_scraper.extract.scraper_base import SectionScrape
+from web_scraper.extract.page_sink import PageSink
+from web_scraper.extract.scraper_worten import WortenScraper
+from web_scraper.extract.rate_limiter import AdaptiveRateLimiter
+from web_scraper.extract.category_cache import CategoryCache
+
+
+logger = utils.log_ws(__name__)
+
+# signals the consumer that a worker has finished
+_WORKER_DONE = object()
+
+
+class WortenScraperPool:
+    """
+    Scrapes the Worten site with n_workers browsers at the same time.
+    The sections failed are shared by all the workers, so N_MAX_SECTION_FAIL
+    applies to the whole pool. If a rate limiter is given, all the workers
+    share it (instead of each sleeping on its own).
+    """
+    def __init__(self,
+                 config: Type[spc.WortenSpConfig],
+                 n_workers: int = 4,
+                 load_wait_sec: Numeric = 30,
+                 sleep_pattern_sec: Union[Numeric, NumericIter] = (2, 4),
+                 rate_limiter: Optional[AdaptiveRateLimiter] = None,
+                 ) -> None:
+        assert n_workers >= 1, "the pool needs at least one worker"
+        self.config = config
+        self.n_workers: int = n_workers
+        self.load_wait_sec: Numeric = load_wait_sec
+        self.sleep_pattern_sec: Union[Numeric, NumericIter] = sleep_pattern_sec
+        self.rate_limiter: Optional[AdaptiveRateLimiter] = rate_limiter
+        self.headless: bool = False
+        self.sample_share: Numeric = 1
+        self.lvl3_categories: Optional[ListStrDict] = None
+        self.category_cache: Optional[CategoryCache] = None
+        self.sections_failed: list[StrDict] = []
+        self._stop = threading.Event()
+
+    def set_headless(self) -> None:
+        self.headless = True
+
+    def set_category_cache(self, category_cache: CategoryCache) -> None:
+        self.category_cache = category_cache
+
+    def activate_sampling(self, share: float) -> None:
+        """
+        Select the probability with which each category will be scraped
+        :param share: which percentage between 0 and 1 to scrape
+        """
+        self.sample_share = share
+
+    def _create_scraper(self, worker_id: int) -> WortenScraper:
+        scraper = WortenScraper(self.config, self.load_wait_sec, self.sleep_pattern_sec)
+        if scraper.user_data_dir is not None:
+            # each worker has its own persistent profile, new ones start as a copy
+            # of the default profile (so they inherit the cookies consent)
+            scraper.set_profile(
+                scraper.user_data_dir.parent / f"worker_{worker_id}",
+                seed_dir=scraper.user_data_dir
+            )
+        # all workers append to the same list so the failure limit is pool wide
+        scraper.sections_failed = self.sections_failed
+        scraper.activate_sampling(self.sample_share)
+        if self.rate_limiter is not None:
+            scraper.set_rate_limiter(self.rate_limiter)
+        if self.headless:
+            scraper.set_headless()
+        return scraper
+
+    def _start_lead_scraper(self) -> WortenScraper:
+        """
+        Starts the first worker and uses it to find the categories to scrape
+        """
+        scraper = self._create_scraper(0)
+        scraper.start_chrome()
+        try:
+            scraper.get_home_page()
+            scraper.rm_cookies_pop_up()
+            if not self.lvl3_categories:
+                if self.category_cache is not None:
+                    scraper.set_category_cache(self.category_cache)
+                scraper.load_lvl3_categories(allow_stale=False)
+                self.lvl3_categories = scraper.lvl3_categories
+        except BaseException:
+            scraper.quit()
+            raise
+        scraper.lvl3_categories = self.lvl3_categories
+        return scraper
+
+    def _work(
+            self,
+            scraper: WortenScraper,
+            tasks: queue.Queue,
+            results: queue.Queue,
+            warm: bool,
+            sink: Optional[PageSink]) -> None:
+        """
+        Worker loop: scrape categories from the tasks queue until it's empty
+        :param scraper: the worker's scraper (the lead one is already started)
+        :param tasks: queue of (url, specs) to scrape
+        :param results: where the SectionScrape (or the error raised) is put
+        :param warm: if the scraper was already started and went through the home page
+        :param sink: where to stream the pages, shared by all workers (must be thread safe)
+        """
+        try:
+            if not warm:
+                scraper.start_chrome()
+                scraper.get_home_page()
+                scraper.rm_cookies_pop_up()
+            while not self._stop.is_set():
+                try:
+                    url, specs = tasks.get_nowait()
+                except queue.Empty:
+                    break
+                results.put(scraper.try_get_section(url, specs, sink))
+        except Exception as e:  # forwarded to the consumer thread
+            results.put(e)
+        finally:
+            if scraper.wd is not None:
+                scraper.quit()
+            results.put(_WORKER_DONE)
+
+    def get_site(
+            self,
+            select_categories: Optional[list[str]] = None,
+            excluded_urls: Optional[Collection[str]] = None,
+            sink: Optional[PageSink] = None) -> Iterator[Optional[SectionScrape]]:
+        """
+        Scrapes the Worten site with all the workers, yields the sections in the
+        order in which they finish (not in the category order)
+        :param select_categories: level 3 category names to keep (all if None)
+        :param excluded_urls: category URLs to skip (ex: already scraped)
+        :param sink: if given, the pages are streamed to it (ex: a QueueSink) and
+            the SectionScrape objects yielded don't contain them
+        :return: a SectionScrape per category (None if the category failed)
+        """
+        logger.info(f"starting Worten full site parsing with {self.n_workers} workers")
+        self._stop.clear()
+        lead = self._start_lead_scraper()
+
+        # the workers quit their scrapers, until they are started the lead one is quit here
+        try:
+            tasks: queue.Queue = queue.Queue()
+            for task in lead.iter_category_tasks(select_categories, excluded_urls):
+                tasks.put(task)
+            n_workers = min(self.n_workers, max(tasks.qsize(), 1))
+            logger.info(f"{tasks.qsize()} categories to scrape, using {n_workers} workers")
+
+            results: queue.Queue = queue.Queue()
+            scrapers = [lead] + [self._create_scraper(i) for i in range(1, n_workers)]
+            threads = [
+                threading.Thread(
+                    target=self._work,
+                    args=(scraper, tasks, results, scraper is lead, sink),
+                    name=f"scraper_worker_{i}",
+                    daemon=True
+                )
+                for i, scraper in enumerate(scrapers)
+            ]
+        except BaseException:
+            lead.quit()
+            raise
+        for thread in threads:
+            thread.start()
+
+        n_done = 0
+        try:
+            while n_done < n_workers:
+                result: Any = results.get()
+                if result is _WORKER_DONE:
+                    n_done += 1
+                elif isinstance(result, Exception):
+                    raise result
+                else:
+                    yield result
+        finally:
+            # workers finish the section they are on and then stop
+            self._stop.set()
+            for thread in threads:
+                thread.join()
+        logger.info(f"finished site scrape, {len(self.sections_failed)} sections failed")
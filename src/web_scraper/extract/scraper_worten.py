@@ -1,11 +1,13 @@
 """
 Defines the basic the specific scraper make to get the Worten products
 """
-import re
+import time
 
+from pathlib import Path
 from random import uniform
 from datetime import datetime
-from typing import Union, Type, Optional
+from urllib.parse import urlparse
+from typing import Union, Type, Optional, Iterator, Collection
 
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
@@ -28,11 +30,26 @@ from web_scraper.support.types import (
     ListStrDict
 )
 from web_scraper.extract.scraper_base import Scraper, SectionScrape
+from web_scraper.extract.page_sink import PageSink, ListSink
+from web_scraper.extract.browser_extraction import PRODUCT_EXTRACTION_JS
+from web_scraper.extract.page_state import PageState, PageSnapshot, PAGE_STATE_JS
+from web_scraper.extract.category_cache import CategoryCache, CategoryDiff
 from web_scraper.support.errors import ScraperBlockedError, NoPopUpError
 
 
 logger = utils.log_ws(__name__)
 
+# href and text of all the links matching the XPath in arguments[0]
+LINKS_BY_XPATH_JS = """
+const links = document.evaluate(arguments[0], document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+const result = [];
+for (let i = 0; i < links.snapshotLength; i++) {
+    const link = links.snapshotItem(i);
+    result.push([link.href, link.text]);
+}
+return result;
+"""
+
 
 class WortenScraper(Scraper):
     def __init__(self,
@@ -44,22 +61,59 @@ class WortenScraper(Scraper):
         self.config = config
         self.lvl3_categories = None
         self.sections_failed = []
+        self.extract_in_browser: bool = False
+        self.category_cache: Optional[CategoryCache] = None
+        self.poll_frequency_sec: Numeric = 0.25
+        # how long a loaded page must stay without products to be considered empty
+        self.empty_page_wait_sec: Numeric = 3
 
     def get_home_page(self):
         return self.get(self.config.HOME_PAGE)
 
-    def rm_cookies_pop_up(self, method: str = 'ignore') -> None:
+    def activate_browser_extraction(self) -> None:
+        """
+        Extract the product fields in the browser instead of capturing the page
+        source, each page is then a list of products (see browser_extraction)
+        """
+        self.extract_in_browser = True
+
+    def page_content(self) -> Union[str, list[list[Optional[str]]]]:
+        """
+        Captures the current page
+        :return: the page HTML or the products extracted in the browser
+        """
+        if self.extract_in_browser:
+            return self.wd.execute_script(PRODUCT_EXTRACTION_JS)
+        return self.wd.page_source
+
+    @property
+    def _cookies_accepted_fn(self) -> Optional[Path]:
+        if self.user_data_dir is None:
+            return None
+        return self.user_data_dir / '.worten_cookies_accepted'
+
+    def cookies_accepted(self) -> bool:
+        """
+        Whether the cookies were accepted in a previous run with the same profile
+        """
+        return self._cookies_accepted_fn is not None and self._cookies_accepted_fn.exists()
+
+    def rm_cookies_pop_up(self, method: str = 'ignore', force: bool = False) -> None:
         """
         Accept cookies in pop up, if it appears
         method:
             * 'ignore' then it will carry if it doesn't find a pop-up window to close
             * 'raise' it will raise and error if no window showed up
+        force: look for the pop-up even if the profile already accepted the cookies
         """
         button_xpath = "//*[contains(text(), 'Aceitar Tudo')]"
         extra_load_wait_sec = 20
 
         self.assert_wd_active()
         assert method in ['ignore', 'raise']
+        if method == 'ignore' and not force and self.cookies_accepted():
+            logger.info("cookies already accepted in this profile")
+            return
         logger.info("close cookie pop-up (if exists)")
 
         # wait for pop-up button
@@ -75,42 +129,62 @@ class WortenScraper(Scraper):
                 raise NoPopUpError("Couldn't find pop-up window")
         else:
             button.click()
+            if self._cookies_accepted_fn is not None:
+                self._cookies_accepted_fn.touch()
+
+    def wait_page_state(self, expected_page: Optional[int] = None) -> PageSnapshot:
+        """
+        Polls the current page (for at most load_wait_sec) until it reaches one of
+        the states in PageState, all the conditions are checked in the same poll
+        :param expected_page: page number that must be displayed (while the previous
+            page is still displayed the page is considered as loading)
+        :return: the page snapshot (state, pagination info)
+        """
+        self.assert_wd_active()
+        empty_since: Optional[float] = None
+
+        def detect_state(wd) -> Union[PageSnapshot, bool]:
+            nonlocal empty_since
+            result = wd.execute_script(PAGE_STATE_JS)
+            if result is None:
+                return False
+            snapshot = PageSnapshot.from_js(result)
+            if snapshot.shows_previous_page(expected_page):
+                return False
+            if snapshot.state == PageState.EMPTY:
+                # products can still be rendered after the document is complete
+                empty_since = empty_since or time.monotonic()
+                if time.monotonic() - empty_since < self.empty_page_wait_sec:
+                    return False
+            return snapshot
 
-    def _get_pagination_navigation(self) -> Optional[WebElement]:
-        pagination_xpath = '//ul[@aria-label="Pagination"]'
         try:
-            pagination_elem = (
-                WebDriverWait(self.wd, self.load_wait_sec)
-                .until(
-                    EC.presence_of_element_located((By.XPATH, pagination_xpath))
-                )
+            return (
+                WebDriverWait(self.wd, self.load_wait_sec, poll_frequency=self.poll_frequency_sec)
+                .until(detect_state)
             )
         except TimeoutException:
-            return None
-        else:
-            return pagination_elem
+            return PageSnapshot(PageState.TIMEOUT)
 
-    @staticmethod
-    def _get_last_page(pagination_elem: WebElement) -> Optional[int]:
-        try:
-            navigation_elems = pagination_elem.find_elements(By.TAG_NAME, "li")
-        except NoSuchElementException:
-            return None
-        else:
-            page_txt = [re.sub('[^0-9]', '', elem.text) for elem in navigation_elems]
-            page_number = [int(txt) for txt in page_txt if txt]
-            return page_number[-1]
+    def get_page_state(self, expected_page: Optional[int] = None) -> PageSnapshot:
+        """
+        Waits for the page state (see wait_page_state), closing the cookies pop-up
+        if it's in the way
+        """
+        snapshot = self.wait_page_state(expected_page)
+        if snapshot.state == PageState.COOKIE_BANNER:
+            self.rm_cookies_pop_up(force=True)
+            snapshot = self.wait_page_state(expected_page)
+        logger.debug(f"page state {snapshot}")
+        return snapshot
 
     def count_pages(self) -> Optional[int]:
         """
         Find the last page in a given section
-        :return: the last page number
+        :return: the last page number (1 if there are products but no pagination)
         """
         self.assert_wd_active()
-        pagination_elem = self._get_pagination_navigation()
-        if pagination_elem is None:
-            return None
-        return self._get_last_page(pagination_elem)
+        return self.get_page_state().last_page
 
     def _create_lvl3_category_xpath(self) -> str:
         """
@@ -147,30 +221,45 @@ class WortenScraper(Scraper):
             )
         except TimeoutException:
             self.wd.save_screenshot(self.config.MAIN_DIR/"screenshots"/"worten_categories.png")
+            self.record_page_outcome(success=False)
             if "captcha" in self.wd.page_source.lower():
                 raise ScraperBlockedError('got Worten captcha')
             raise TimeoutException("Categories page not properly loaded")
 
     @staticmethod
     def _parse_lvl3_category_urls(
-            lvl3_category_links: list[WebElement]) -> ListStrDict:
-        lvl3_categories = [
-            {
-                "url": link.get_attribute('href'),
-                "category_lvl1": link.get_attribute('href').split("/")[-3],
-                "category_lvl2": link.get_attribute('href').split("/")[-2],
-                "category_lvl3": link.get_attribute('href').split("/")[-1],
-                "lvl3_display_name": link.get_attribute('text')
-            }
-            for link in lvl3_category_links
-        ]
+            lvl3_category_links: list[list[str]]) -> ListStrDict:
+        """
+        :param lvl3_category_links: the href and text of each category link
+        :return: the level 3 categories (the links without the 3 levels in their path are skipped)
+        """
+        lvl3_categories = []
+        for href, text in lvl3_category_links:
+            path_segments = [segment for segment in urlparse(href).path.split("/") if segment]
+            if len(path_segments) < 3:
+                logger.warning(f"skipped category link {href}, its path has no level 3 category")
+                continue
+            category_lvl1, category_lvl2, category_lvl3 = path_segments[-3:]
+            lvl3_categories.append({
+                "url": href,
+                "category_lvl1": category_lvl1,
+                "category_lvl2": category_lvl2,
+                "category_lvl3": category_lvl3,
+                "lvl3_display_name": text
+            })
         logger.info(f"got {len(lvl3_categories)} distinct level 3 categories")
         return lvl3_categories
 
-    def find_lvl3_category_urls(self) -> None:
+    def set_category_cache(self, category_cache: CategoryCache) -> None:
+        self.category_cache = category_cache
+
+    def find_lvl3_category_urls(self) -> CategoryDiff:
         """
         Goes to the product page and populates categories_to_scrape with the names and
-        URLs of the categories (level 3) to scrape
+        URLs of the categories (level 3) to scrape.
+        All the links are read with a single script (instead of a WebDriver call per
+        link attribute) and the category cache, if any, is updated.
+        :return: the categories added and removed since the cached ones
         """
         self.assert_wd_active()
         logger.info("start searching section URLs")
@@ -179,45 +268,31 @@ class WortenScraper(Scraper):
         lvl3_xpath = self._create_lvl3_category_xpath()
         self._wait_lvl3_categories(lvl3_xpath)
 
-        lvl3_category_links = self.wd.find_elements(By.XPATH, lvl3_xpath)
+        lvl3_category_links = self.wd.execute_script(LINKS_BY_XPATH_JS, lvl3_xpath)
         self.lvl3_categories = self._parse_lvl3_category_urls(lvl3_category_links)
+        if self.category_cache is None:
+            return CategoryDiff()
+        return self.category_cache.save(self.lvl3_categories)
 
-    def _check_page_loaded(self) -> bool:
-        current_page_class_name = 'current'
-
-        # sleep for a random amount of time to seem more human
-        sleep_time = self.sleep()
-        # wait for load until the page number is displayed
-        try:
-            _ = (
-                WebDriverWait(self.wd, self.load_wait_sec)
-                .until(
-                    EC.presence_of_element_located((By.CLASS_NAME, current_page_class_name))
-                )
-            )
-        except TimeoutException:
-            total_wait_sec = sleep_time + self.load_wait_sec
-            logger.info(f"page didn't load after, {total_wait_sec:.3}s")
-            return False
-        return True
-
-    def _find_next_page_link(self) -> Optional[WebElement]:
+    def load_lvl3_categories(self, allow_stale: bool = True) -> bool:
         """
-        If there is a next page click on it to move forward, if there isn't then
-        it must be the end of the section return nothing
-        :return: a link to the next page (if exists)
+        Populates lvl3_categories from the category cache, and only goes to the
+        product page if there is nothing usable in the cache
+        :param allow_stale: use the cached categories even if they expired
+        :return: True if the categories loaded are stale (and should be refreshed)
         """
-        next_page_xpath = '//li[@class="pagination-next"]/a'
-        try:
-            next_page_link: WebElement = (
-                WebDriverWait(self.wd, self.load_wait_sec)
-                .until(
-                    EC.presence_of_element_located((By.XPATH, next_page_xpath))
-                )
-            )
-        except (TimeoutException, NoSuchElementException):  # test if only TimeoutException works
-            return
-        return next_page_link
+        if self.category_cache is not None:
+            if self.category_cache.is_fresh():
+                self.lvl3_categories = self.category_cache.load()
+                logger.info(f"got {len(self.lvl3_categories)} level 3 categories from cache")
+                return False
+            cached = self.category_cache.load(allow_stale=True)
+            if allow_stale and cached:
+                self.lvl3_categories = cached
+                logger.info(f"got {len(self.lvl3_categories)} level 3 categories from expired cache")
+                return True
+        self.find_lvl3_category_urls()
+        return False
 
     def _click_next_page_link(self, next_page_link: WebElement) -> bool:
         n_click_attempts = 2
@@ -226,74 +301,148 @@ class WortenScraper(Scraper):
                 next_page_link.click()
             except ElementNotInteractableException:
                 logger.warning(f'ElementNotInteractableException on next page click, {attempt=}')
-                self.rm_cookies_pop_up()
+                self.record_page_outcome(success=False)
+                self.rm_cookies_pop_up(force=True)
             else:
                 return True
         return False
 
     def _move_next_page(self) -> bool:
         """
-        Try to move to the next page as long as there is link to do so other return nothing
-        :return: True if it managed to move to the next page, False otherwise
+        Clicks on the link to the next page (the page state says whether there is one)
+        :return: True if it managed to click on it, False otherwise
         """
-        next_page_link = self._find_next_page_link()
-        if next_page_link is None:
+        next_page_xpath = '//li[@class="pagination-next"]/a'
+        try:
+            next_page_link: WebElement = self.wd.find_element(By.XPATH, next_page_xpath)
+        except NoSuchElementException:
             return False
         return self._click_next_page_link(next_page_link)
 
-    def get_section(
+    @staticmethod
+    def build_section_specs(
+            base_url: str,
+            n_pages: Optional[int],
+            specs: Optional[dict] = None) -> dict:
+        """
+        Gathers the information about the section that goes into "section_specs"
+        :param base_url: first page of a section
+        :param n_pages: number of pages in the section
+        :param specs: additional information about the section
+        :return: the section specs
+        """
+        section_specs = {"base_url": base_url, "n_pages": n_pages}
+        if specs:
+            section_specs_keys = list(section_specs.keys())
+            keys_in_specs = [key in specs for key in section_specs_keys]
+            assert not any(keys_in_specs), \
+                f"specs cannot contain any of this keys: {section_specs_keys}"
+            section_specs.update(specs)
+        return section_specs
+
+    def stream_section(
             self,
             base_url: str,
+            sink: PageSink,
             specs: Optional[dict] = None) -> SectionScrape:
         """
         Starts on the base_url page and then clicks on the next page button to iterate
         through all pages. It stops when the button disappears, meaning we reached the
         end of the section (can be a category or any group of pages).
+        Each page is sent to the sink as soon as it's captured, so nothing accumulates
+        in memory.
         :param base_url: first page of a section
+        :param sink: where the pages are sent
         :param specs: additional information about the section that will be added
             to "section_specs"
-        :return: a SectionScrape object
+        :return: a SectionScrape object without the pages (html is empty)
         """
         logger.info(f'start extraction {base_url}')
         self.assert_wd_active()
         self.wd.get(base_url)
-        n_pages = self.count_pages()
+        # sleep for a random amount of time to seem more human
+        self.sleep()
+        snapshot = self.get_page_state()
+        n_pages = snapshot.last_page
         logger.info(f"{n_pages=} to scrape")
-        html = []
-        section_specs = {"base_url": base_url, "n_pages": n_pages}
+        page_stats = []
+        section_specs = self.build_section_specs(base_url, n_pages, specs)
         metadata = {"datetime": datetime.now(), "n_pages_scraped": 0}
-        if specs:
-            section_specs_keys = list(section_specs.keys())
-            keys_in_specs = [key in specs for key in section_specs_keys]
-            assert not any(keys_in_specs), \
-                f"specs cannot contain any of this keys: {section_specs_keys}"
-            section_specs.update(specs)
-        p = 0
-        while p <= self.config.MAX_PAGES_PER_SECTION:
-            if not self._check_page_loaded():
-                break
-            p += 1
-            # extract page HTML code
-            html.append(self.wd.page_source)
-            # TODO: is the are way to separate the moving function from the validation
-            #  that it indeed moved to the next page?
-            if not self._move_next_page():
-                break
-            if p == self.config.MAX_PAGES_PER_SECTION:
-                logger.info("the section has more pages then the search limit")
+        sink.open_section(section_specs)
+        try:
+            p = 0
+            while True:
+                if snapshot.state == PageState.CAPTCHA:
+                    self.record_page_outcome(success=False)
+                    raise ScraperBlockedError('got Worten captcha')
+                if snapshot.state not in (PageState.HAS_NEXT_PAGE, PageState.LAST_PAGE):
+                    logger.info(f"stopping section, page {p + 1} state: {snapshot.state.value}")
+                    self.record_page_outcome(success=snapshot.state == PageState.EMPTY)
+                    break
+                self.record_page_outcome(success=True)
+                p += 1
+                # extract page HTML code (or its products)
+                sink.write_page(self.page_content(), p, section_specs)
+                page_stats.append(self.page_load_stats())
+                if snapshot.state == PageState.LAST_PAGE:
+                    break
+                if p >= self.config.MAX_PAGES_PER_SECTION:
+                    logger.info("the section has more pages then the search limit")
+                    break
+                if not self._move_next_page():
+                    break
+                self.sleep()
+                expected_page = snapshot.current_page + 1 if snapshot.current_page else None
+                snapshot = self.get_page_state(expected_page)
+        except BaseException as e:
+            sink.abort_section(section_specs, e)
+            raise
         metadata["n_pages_scraped"] = p
-        logger.info(f"scraped {p}/{n_pages} pages")
-        return SectionScrape(html, section_specs, metadata)
+        metadata["page_stats"] = page_stats
+        metadata["bytes_transferred"] = sum(stats["bytes_transferred"] for stats in page_stats)
+        logger.info(f"scraped {p}/{n_pages} pages, {metadata['bytes_transferred'] / 1024:.0f}KB transferred")
+        sink.close_section(section_specs, metadata)
+        return SectionScrape([], section_specs, metadata)
+
+    def get_section(
+            self,
+            base_url: str,
+            specs: Optional[dict] = None) -> SectionScrape:
+        """
+        Scrapes a section keeping all its pages in memory (see stream_section)
+        :param base_url: first page of a section
+        :param specs: additional information about the section that will be added
+            to "section_specs"
+        :return: a SectionScrape object
+        """
+        sink = ListSink()
+        section = self.stream_section(base_url, sink, specs)
+        section.html = sink.pages
+        return section
 
     def try_get_section(
             self,
             base_url: str,
-            specs: Optional[StrDict] = None) -> Optional[SectionScrape]:
+            specs: Optional[StrDict] = None,
+            sink: Optional[PageSink] = None) -> Optional[SectionScrape]:
+        """
+        Scrapes a section, registering it as failed in case of a WebDriverException
+        or a captcha (the rate limiter, if any, already backed off)
+        :param base_url: first page of a section
+        :param specs: additional information about the section
+        :param sink: if given, the pages are streamed to it (see stream_section)
+        :return: a SectionScrape object (None if the scrape failed)
+        """
         logger.info("start extraction")
         try:
-            return self.get_section(base_url, specs)
-        except WebDriverException as e:
-            logger.warning(f"{e} prevented section scrape")
+            if sink is None:
+                return self.get_section(base_url, specs)
+            return self.stream_section(base_url, sink, specs)
+        except (WebDriverException, ScraperBlockedError) as e:
+            logger.warning(f"{e!r} prevented section scrape")
+            if isinstance(e, ScraperBlockedError):
+                # waits before the next section, slower if the rate limiter backed off
+                self.sleep()
             failed = {"base_url": base_url}
             if specs:
                 failed.update(specs)
@@ -319,36 +468,28 @@ class WortenScraper(Scraper):
     def _filter_url(
             self,
             url: str,
-            excluded_urls: Optional[list[str]]) -> bool:
+            excluded_urls: Optional[Collection[str]]) -> bool:
         if excluded_urls and url in excluded_urls:
             logger.info("URL in exclusion list")
             return True
         else:
             return False
 
-    def get_site(
+    def iter_category_tasks(
             self,
             select_categories: Optional[list[str]] = None,
-            excluded_urls: Optional[list[str]] = None) -> Optional[SectionScrape]:
+            excluded_urls: Optional[Collection[str]] = None) -> Iterator[tuple[str, StrDict]]:
         """
-        Scrapes entire Worten site. It first goes to the product home page which contains
-        all the categories of products organised in a hierarchical format.
-        :return:
+        Goes through the level 3 categories found and keeps the ones to scrape
+        :param select_categories: level 3 category names to keep (all if None)
+        :param excluded_urls: category URLs to skip (ex: already scraped)
+        :return: the URL and specs of each category to scrape
         """
         # TODO: select_categories should have an option that contains a tuple that indicating
         #  both the lvl2 and lvl3 categories in case there are 2 lvl3 categories with same name
         #  in 2 different lvl2 categories
-        self.assert_wd_active()
-        logger.info("starting Worten full site parsing")
-        # got to main page and accept cookies (seems more human to start there)
-        self.get_home_page()
-        self.rm_cookies_pop_up()
-
-        # get section URLs
-        if not self.lvl3_categories:
-            self.find_lvl3_category_urls()
-
-        # scrape each page of each section
+        # set lookups, the list of URLs already scraped can be long
+        excluded_urls = set(excluded_urls or ())
         for category in self.lvl3_categories:
             name: str = category['lvl3_display_name']
             logger.info(f"category {name}")
@@ -360,4 +501,43 @@ class WortenScraper(Scraper):
                 key: val for key, val in category.items()
                 if key not in ["url", 'n_pages']
             }
-            yield self.try_get_section(category["url"], category_specs)
+            yield category["url"], category_specs
+
+    def get_site(
+            self,
+            select_categories: Optional[list[str]] = None,
+            excluded_urls: Optional[Collection[str]] = None,
+            sink: Optional[PageSink] = None) -> Iterator[Optional[SectionScrape]]:
+        """
+        Scrapes entire Worten site. It first goes to the product home page which contains
+        all the categories of products organised in a hierarchical format.
+        :param select_categories: level 3 category names to keep (all if None)
+        :param excluded_urls: category URLs to skip (ex: already scraped)
+        :param sink: if given, the pages are streamed to it and the SectionScrape
+            objects yielded don't contain them
+        :return: a SectionScrape per category (None if the category failed)
+        """
+        self.assert_wd_active()
+        logger.info("starting Worten full site parsing")
+        # got to main page and accept cookies (seems more human to start there)
+        self.get_home_page()
+        self.rm_cookies_pop_up()
+
+        # get section URLs (from the cache if possible)
+        categories_stale = False
+        if not self.lvl3_categories:
+            categories_stale = self.load_lvl3_categories()
+
+        # scrape each page of each section
+        for url, category_specs in self.iter_category_tasks(select_categories, excluded_urls):
+            yield self.try_get_section(url, category_specs, sink)
+
+        if categories_stale:
+            # the crawl started from expired categories, refresh them and
+            # scrape the ones that were added in the meantime
+            scraped_urls = {category["url"] for category in self.lvl3_categories}
+            diff = self.find_lvl3_category_urls()
+            if diff.added:
+                excluded_urls = scraped_urls | set(excluded_urls or [])
+                for url, category_specs in self.iter_category_tasks(select_categories, excluded_urls):
+                    yield self.try_get_section(url, category_specs, sink)
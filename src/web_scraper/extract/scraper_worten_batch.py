@@ -2,7 +2,6 @@
 Defines the basic the specific scraper make to get the Worten products
 """
 import re
-import time
 import pickle
 from random import uniform
 from typing import Union, Type, Optional
@@ -20,7 +19,9 @@ from selenium.common.exceptions import (
 from web_scraper.support import utils
 import web_scraper.extract.scraper_config as spc
 from web_scraper.support.types import Numeric, NumericIter
-from web_scraper.extract.scraper_base import Scraper, ScraperBlockedError
+from web_scraper.extract.scraper_base import Scraper
+from web_scraper.extract.page_sink import PageSink
+from web_scraper.support.errors import ScraperBlockedError
 
 
 logger = utils.log_ws(__name__)
@@ -42,13 +43,18 @@ class WortenScraper(Scraper):
         """
         Accept cookies in pop up, if it appears
         """
+        pop_up_wait_sec = 5
         self.assert_wd_active()
         logger.info("close cookie pop-up (if exists)")
-        time.sleep(5)
-        # find button
+        # wait for the button, returns as soon as it shows up
         try:
-            button = self.wd.find_element(By.XPATH, "//*[contains(text(), 'Aceitar Tudo')]")
-        except NoSuchElementException:
+            button = (
+                WebDriverWait(self.wd, pop_up_wait_sec)
+                .until(
+                    EC.presence_of_element_located((By.XPATH, "//*[contains(text(), 'Aceitar Tudo')]"))
+                )
+            )
+        except TimeoutException:
             pass
         else:
             # click to accept cookies
@@ -133,59 +139,75 @@ class WortenScraper(Scraper):
         urls = [val for info in self.lvl3_categories.values() for val in info.values()]
         logger.info(f"got {len(set(urls))} distinct level 3 category URLs")
 
-    def get_lvl3_category(self, base_url: str) -> list:
+    def get_lvl3_category(self, base_url: str, sink: Optional[PageSink] = None) -> list:
         """
         :param base_url:
-        :return:
+        :param sink: if given, each page is sent to it instead of being kept in memory
+        :return: the category pages (empty if streamed to the sink)
         """
         logger.info(f'start extraction {base_url}')
         self.assert_wd_active()
         category_html = []
-        p = 1
-        self.wd.get(base_url)
-        while p <= self.config.MAX_PAGES_PER_SECTION:
-            # sleep for a random amount of time to seem more human
-            sleep_time = self.sleep()
-            # wait for load until the page number is displayed
-            try:
-                _ = (
-                    WebDriverWait(self.wd, self.load_wait_seconds)
-                    .until(
-                        EC.presence_of_element_located((By.CLASS_NAME, 'current'))
+        n_pages_scraped = 0
+        section_specs = {"base_url": base_url}
+        if sink is not None:
+            sink.open_section(section_specs)
+        try:
+            p = 1
+            self.wd.get(base_url)
+            while p <= self.config.MAX_PAGES_PER_SECTION:
+                # sleep for a random amount of time to seem more human
+                sleep_time = self.sleep()
+                # wait for load until the page number is displayed
+                try:
+                    _ = (
+                        WebDriverWait(self.wd, self.load_wait_seconds)
+                        .until(
+                            EC.presence_of_element_located((By.CLASS_NAME, 'current'))
+                        )
                     )
-                )
-            except TimeoutException:
-                total_wait_seconds: float = sleep_time + self.load_wait_seconds
-                logger.info(f"page didn't load after, {total_wait_seconds:.3}s")
-                break
-            # extract page HTML code
-            category_html.append(self.wd.page_source)
+                except TimeoutException:
+                    total_wait_seconds: float = sleep_time + self.load_wait_seconds
+                    logger.info(f"page didn't load after, {total_wait_seconds:.3}s")
+                    break
+                # extract page HTML code
+                n_pages_scraped += 1
+                if sink is None:
+                    category_html.append(self.wd.page_source)
+                else:
+                    sink.write_page(self.wd.page_source, p, section_specs)
 
-            # if there is a next page click on it to move forward, if there isn't then
-            # it must be the end of the section so exit
-            try:
-                next_page_link = (
-                    WebDriverWait(self.wd, self.load_wait_seconds)
-                    .until(
-                        EC.presence_of_element_located((By.XPATH, '//li[@class="pagination-next"]/a'))
-                    )
-                )
-            except (TimeoutException, NoSuchElementException): # test if only TimeoutException works
-                break
-            else:
+                # if there is a next page click on it to move forward, if there isn't then
+                # it must be the end of the section so exit
                 try:
-                    next_page_link.click()
-                except ElementNotInteractableException:
-                    logger.warning('ElementNotInteractableException on next page click, trying to accept cookies again')
-                    self.rm_cookies_pop_up()
+                    next_page_link = (
+                        WebDriverWait(self.wd, self.load_wait_seconds)
+                        .until(
+                            EC.presence_of_element_located((By.XPATH, '//li[@class="pagination-next"]/a'))
+                        )
+                    )
+                except (TimeoutException, NoSuchElementException): # test if only TimeoutException works
+                    break
+                else:
                     try:
                         next_page_link.click()
                     except ElementNotInteractableException:
-                        logger.warning('ElementNotInteractableException on next page click, stopping category scrape')
-                        break
-            if p == self.config.MAX_PAGES_PER_SECTION:
-                logger.info("the section has more pages then the search limit")
-            p += 1
+                        logger.warning('ElementNotInteractableException on next page click, trying to accept cookies again')
+                        self.rm_cookies_pop_up()
+                        try:
+                            next_page_link.click()
+                        except ElementNotInteractableException:
+                            logger.warning('ElementNotInteractableException on next page click, stopping category scrape')
+                            break
+                if p == self.config.MAX_PAGES_PER_SECTION:
+                    logger.info("the section has more pages then the search limit")
+                p += 1
+        except BaseException as e:
+            if sink is not None:
+                sink.abort_section(section_specs, e)
+            raise
+        if sink is not None:
+            sink.close_section(section_specs, {"n_pages_scraped": n_pages_scraped})
         return category_html
 
     def _get_pagination_navigation(self) -> Optional[WebElement]:
@@ -223,10 +245,15 @@ class WortenScraper(Scraper):
             return None
         return self._get_last_page(pagination_elem)
 
-    def get_site(self, select_categories: Optional[list[str]] = None) -> None:
+    def get_site(
+            self,
+            select_categories: Optional[list[str]] = None,
+            sink: Optional[PageSink] = None) -> None:
         """
         Scrapes entire Worten site. It first goes to the product home page which contains
         all the categories of products organised in a hierarchical format.
+        :param select_categories: category names to scrape (all if None)
+        :param sink: if given, the pages are streamed to it instead of kept in site_html
         :return:
         """
         self.assert_wd_active()
@@ -247,6 +274,9 @@ class WortenScraper(Scraper):
             if self.sample_share < 1 and uniform(0, 1) > self.sample_share:
                 logger.info(f"category sampled out, skipping")
                 continue
+            if sink is not None:
+                self.get_lvl3_category(info["url"], sink)
+                continue
             section_html: list[str] = self.get_lvl3_category(info["url"])
             self.site_html[category] = section_html
             info["pages"] = len(section_html)
@@ -0,0 +1,116 @@
+"""
+Defines BackgroundPersist, which saves the scraped sections in writer threads
+
+Saving a section (slimming, compressing and writing its pages) used to run
+between the scrape of two sections, with the browser waiting. The sections
+are now put in a queue and saved by writer threads while the scraper moves
+on. The queue is bounded: when the writers fall behind, save_section waits
+for room instead of keeping every scraped section in memory.
+"""
+import queue
+import threading
+from typing import Any, Optional
+
+from web_scraper.support import utils
+from web_scraper.support.errors import PersistError
+from web_scraper.extract.scraper_base import SectionScrape
+from web_scraper.load.persist import Persist
+
+logger = utils.log_ws(__name__)
+
+# tells a writer thread to stop
+_STOP = None
+
+
+class BackgroundPersist:
+    """
+    Saves sections with a Persist in writer threads
+    :param persist: saves the sections (its save_section must be thread safe)
+    :param n_writers: writer threads
+    :param max_queued: sections waiting to be saved, once reached save_section waits
+    """
+    def __init__(self, persist: Persist, n_writers: int = 1, max_queued: int = 4) -> None:
+        self.persist = persist
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queued)
+        self._lock = threading.Lock()
+        # base URL of each section that couldn't be saved, with the error
+        self.failures: list[tuple[str, BaseException]] = []
+        self.n_saved = 0
+        self._closed = False
+        self._writers = [
+            threading.Thread(target=self._write, name=f"persist_writer_{i}", daemon=True) for i in range(n_writers)
+        ]
+        for writer in self._writers:
+            writer.start()
+
+    def _write(self) -> None:
+        while True:
+            section = self._queue.get()
+            try:
+                if section is _STOP:
+                    return
+                self.persist.save_section(section)
+                with self._lock:
+                    self.n_saved += 1
+            except Exception as e:
+                base_url = section.section_specs.get("base_url")
+                logger.error(f"couldn't save {base_url}: {e!r}")
+                with self._lock:
+                    self.failures.append((base_url, e))
+            finally:
+                self._queue.task_done()
+
+    def save_section(self, section_scrape: Optional[SectionScrape]) -> None:
+        """
+        Queues the section to be saved, waits if the queue is full
+        """
+        if self._closed:
+            raise RuntimeError("the background persist is closed")
+        if section_scrape is None:
+            logger.warning("no section_scrape to save")
+            return
+        self._queue.put(section_scrape)
+
+    def flush(self) -> list[tuple[str, BaseException]]:
+        """
+        Waits for the queued sections to be saved and makes sure they are on disk
+        :return: the sections that couldn't be saved so far, with their error
+        """
+        self._queue.join()
+        self.persist.segments.sync()
+        with self._lock:
+            return list(self.failures)
+
+    def _stop_writers(self) -> list[tuple[str, BaseException]]:
+        failures = self.flush()
+        self._closed = True
+        for _ in self._writers:
+            self._queue.put(_STOP)
+        for writer in self._writers:
+            writer.join()
+        logger.info(f"{self.n_saved} sections saved, {len(failures)} failed")
+        return failures
+
+    def close(self) -> None:
+        """
+        Saves the queued sections and stops the writers
+        :raises PersistError: if some sections couldn't be saved
+        """
+        if self._closed:
+            return
+        failures = self._stop_writers()
+        if failures:
+            raise PersistError(
+                f"{len(failures)} sections couldn't be saved: {', '.join(url for url, _ in failures)}", failures
+            )
+
+    def __enter__(self) -> "BackgroundPersist":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        if exc_info[0] is None:
+            self.close()
+        elif not self._closed:
+            # the run already failed, its error is the one raised
+            for base_url, error in self._stop_writers():
+                logger.error(f"{base_url} wasn't saved: {error!r}")
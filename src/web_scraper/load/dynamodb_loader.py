@@ -0,0 +1,198 @@
+"""
+Defines the DynamoDB loader, which writes the parsed products to the table of the AWS mode
+
+The table is keyed for price histories: a product's items share its
+partition key and are sorted by scrape date, so the prices of a product
+between two dates are a single query. A global secondary index by category
+and date gives the products of a category on a date.
+
+    PK = PRODUCT#<product_key>      SK = DATE#<date>
+    GSI1PK = CATEGORY#<lvl1/lvl2/lvl3>    GSI1SK = DATE#<date>#PRODUCT#<product_key>
+
+An item is indexed under a single category, the product's first one. A
+product found in other categories (see ProductIndex.with_categories) has a
+copy of its item for each of them, under the same partition key, that the
+price history query leaves out:
+
+    PK = PRODUCT#<product_key>      SK = CATEGORY#<lvl1/lvl2/lvl3>#DATE#<date>
+
+The items are written with BatchWriteItem, 25 at a time (the most a request
+takes) by a pool of threads. The items DynamoDB doesn't process (ex: when it
+throttles the writes) are sent again after a random, growing, wait.
+"""
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Iterable, Optional
+
+from botocore.config import Config
+
+from web_scraper.support import utils
+from web_scraper.support.errors import UnprocessedItemsError
+from web_scraper.transform.product_index import category_path, product_key
+
+logger = utils.log_ws(__name__)
+
+# the most items a BatchWriteItem request takes
+BATCH_SIZE = 25
+GSI_NAME = "category_date"
+
+Item = dict[str, dict[str, str]]
+
+
+def product_item(record: dict[str, Any]) -> Item:
+    """
+    :param record: a parsed product, see ProductBatch.to_records (and ProductIndex.with_categories)
+    :return: the record as a DynamoDB item (low level attribute values), indexed
+        under the product's first category
+    """
+    key = product_key(record.get("url"), record["name"], record["img_url"])
+    date = str(record["date"])
+    category = record["categories"][0] if record.get("categories") else category_path(record)
+    item = {
+        "PK": {"S": f"PRODUCT#{key}"},
+        "SK": {"S": f"DATE#{date}"},
+        "GSI1PK": {"S": f"CATEGORY#{category}"},
+        "GSI1SK": {"S": f"DATE#{date}#PRODUCT#{key}"},
+        "date": {"S": date},
+        "name": {"S": record["name"]},
+        "price": {"N": repr(float(record["price"]))},
+        "img_url": {"S": record["img_url"]},
+    }
+    if record.get("price_previous") is not None:
+        item["price_previous"] = {"N": repr(float(record["price_previous"]))}
+    if record.get("url"):
+        item["url"] = {"S": record["url"]}
+    for i in range(1, 4):
+        if record.get(f"category_lvl{i}") is not None:
+            item[f"category_lvl{i}"] = {"S": str(record[f"category_lvl{i}"])}
+    if record.get("categories"):
+        item["categories"] = {"L": [{"S": category} for category in record["categories"]]}
+    return item
+
+
+def product_items(record: dict[str, Any]) -> list[Item]:
+    """
+    :return: the product's item and a copy for each of its other categories,
+        so the category index has the product under all of them
+    """
+    item = product_item(record)
+    items = [item]
+    for category in record.get("categories", [])[1:]:
+        items.append(dict(
+            item,
+            SK={"S": f"CATEGORY#{category}#{item['SK']['S']}"},
+            GSI1PK={"S": f"CATEGORY#{category}"},
+        ))
+    return items
+
+
+class DynamoDBLoader:
+    """
+    Writes parsed products to a DynamoDB table
+    :param table_name: DynamoDB table, see create_table
+    :param client: DynamoDB client, one with the credentials file if None
+    :param region_name: AWS region of the table (when the client is made here)
+    :param max_workers: BatchWriteItem requests sent at the same time
+    :param max_attempts: times a batch is sent before its unprocessed items are given up
+    :param base_delay: seconds, the wait before sending the unprocessed items again
+        is random, up to base_delay doubled at each attempt (and max_delay at most)
+    :param max_delay: seconds
+    """
+    def __init__(
+            self,
+            table_name: str,
+            client: Optional[Any] = None,
+            region_name: Optional[str] = None,
+            max_workers: int = 8,
+            max_attempts: int = 10,
+            base_delay: float = 0.05,
+            max_delay: float = 5) -> None:
+        self.table_name = table_name
+        if client is None:
+            client = utils.aws_session().client(
+                "dynamodb",
+                region_name=region_name,
+                config=Config(max_pool_connections=max_workers, retries={"mode": "adaptive", "max_attempts": 5})
+            )
+        self.client = client
+        self.max_workers = max_workers
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        # unprocessed items sent again, to see how much the table throttles
+        self.n_retried = 0
+        self._lock = threading.Lock()
+        # shared by the loads, the threads are started once
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix="dynamodb_load")
+
+    def create_table(self) -> None:
+        """
+        Creates the table and its category index, billed on demand
+        """
+        key_attributes = ("PK", "SK", "GSI1PK", "GSI1SK")
+        self.client.create_table(
+            TableName=self.table_name,
+            AttributeDefinitions=[{"AttributeName": name, "AttributeType": "S"} for name in key_attributes],
+            KeySchema=[{"AttributeName": "PK", "KeyType": "HASH"}, {"AttributeName": "SK", "KeyType": "RANGE"}],
+            GlobalSecondaryIndexes=[{
+                "IndexName": GSI_NAME,
+                "KeySchema": [
+                    {"AttributeName": "GSI1PK", "KeyType": "HASH"}, {"AttributeName": "GSI1SK", "KeyType": "RANGE"}
+                ],
+                "Projection": {"ProjectionType": "ALL"},
+            }],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        self.client.get_waiter("table_exists").wait(TableName=self.table_name)
+
+    def _write_batch(self, items: list[Item]) -> None:
+        requests = [{"PutRequest": {"Item": item}} for item in items]
+        for attempt in range(self.max_attempts):
+            response = self.client.batch_write_item(RequestItems={self.table_name: requests})
+            requests = response.get("UnprocessedItems", {}).get(self.table_name, [])
+            if not requests:
+                return
+            with self._lock:
+                self.n_retried += len(requests)
+            # full jitter, so the threads don't all send their items again at the same time
+            time.sleep(random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt)))
+        raise UnprocessedItemsError(
+            f"{len(requests)} items still unprocessed after {self.max_attempts} attempts", requests
+        )
+
+    def load(self, records: Iterable[dict[str, Any]]) -> int:
+        """
+        Writes the products, a product scraped twice on a date is only written once
+        :return: number of items written
+        """
+        # a BatchWriteItem request can't have the same key twice
+        items = {}
+        for record in records:
+            for item in product_items(record):
+                items[(item["PK"]["S"], item["SK"]["S"])] = item
+        unique_items = list(items.values())
+        batches = [unique_items[i:i + BATCH_SIZE] for i in range(0, len(unique_items), BATCH_SIZE)]
+        start = time.perf_counter()
+        futures = [self._executor.submit(self._write_batch, batch) for batch in batches]
+        try:
+            for future in futures:
+                future.result()
+        finally:
+            # the other batches are written (or fail) before the first error is raised
+            wait(futures)
+        logger.info(
+            f"wrote {len(items)} items to {self.table_name} in {time.perf_counter() - start:.1f}s "
+            f"({self.n_retried} unprocessed items sent again)"
+        )
+        return len(items)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self) -> "DynamoDBLoader":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
@@ -0,0 +1,90 @@
+"""
+Defines the run manifest, an index of the sections saved during a run
+
+It's a small SQLite file in the run folder, written every time a section is
+saved, so resuming a run only needs to read the index instead of loading
+every section file.
+"""
+import sqlite3
+import threading
+from pathlib import Path
+from datetime import datetime
+from dataclasses import dataclass
+from typing import Optional
+
+
+@dataclass(frozen=True)
+class ManifestEntry:
+    base_url: str
+    file_name: str
+    n_pages: Optional[int]
+    n_pages_scraped: Optional[int]
+    offset: int
+    length: Optional[int]
+    saved_at: str
+
+
+class RunManifest:
+    """
+    Index of the sections saved in a run: their URL, page counts and where
+    they are stored (file, offset and length in bytes)
+    """
+    _columns = ", ".join(ManifestEntry.__dataclass_fields__)
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        # sqlite connections can't be shared between threads
+        self._local = threading.local()
+        self._connection().execute(
+            """
+            CREATE TABLE IF NOT EXISTS sections (
+                base_url TEXT PRIMARY KEY,
+                file_name TEXT NOT NULL,
+                n_pages INTEGER,
+                n_pages_scraped INTEGER,
+                offset INTEGER NOT NULL DEFAULT 0,
+                length INTEGER,
+                saved_at TEXT NOT NULL
+            )
+            """
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        if getattr(self._local, "connection", None) is None:
+            self._local.connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        return self._local.connection
+
+    def record(
+            self,
+            base_url: str,
+            file_name: str,
+            n_pages: Optional[int] = None,
+            n_pages_scraped: Optional[int] = None,
+            offset: int = 0,
+            length: Optional[int] = None) -> None:
+        """
+        Adds a saved section to the index (replaces it if it was already there)
+        """
+        entry = ManifestEntry(
+            base_url, file_name, n_pages, n_pages_scraped, offset, length, datetime.now().isoformat()
+        )
+        self._connection().execute(
+            f"INSERT OR REPLACE INTO sections ({self._columns}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            tuple(entry.__dict__.values())
+        )
+
+    def completed_urls(self) -> set[str]:
+        return {row[0] for row in self._connection().execute("SELECT base_url FROM sections")}
+
+    def get(self, base_url: str) -> Optional[ManifestEntry]:
+        row = self._connection().execute(
+            f"SELECT {self._columns} FROM sections WHERE base_url = ?", (base_url,)
+        ).fetchone()
+        return ManifestEntry(*row) if row else None
+
+    def entries(self) -> list[ManifestEntry]:
+        rows = self._connection().execute(f"SELECT {self._columns} FROM sections ORDER BY saved_at")
+        return [ManifestEntry(*row) for row in rows]
+
+    def __len__(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM sections").fetchone()[0]
@@ -0,0 +1,137 @@
+"""
+Slims and compresses the scraped pages before they are saved
+
+Most of a listing page is header, menus, inline scripts, styles and svgs the
+parser never looks at. Slimming keeps only the product containers (the
+parser finds the same products in the slimmed page) and the pages are then
+compressed with zstd, using a dictionary trained on Worten pages: the pages
+share most of their markup, so even a single page compresses very well.
+
+The dictionaries are kept in a folder, named after their id, and each frame
+records the id of the dictionary it was compressed with, so archives stay
+readable when a new dictionary is trained.
+"""
+import json
+import threading
+from pathlib import Path
+from typing import Optional, Union
+
+try:
+    import zstandard as zstd
+except ImportError:  # optional dependency, see the compression extra
+    zstd = None
+
+from web_scraper.support import utils
+from web_scraper.transform.field_spec import WORTEN_PRODUCT_SPEC
+from web_scraper.transform.html_slicing import slice_elements
+
+logger = utils.log_ws(__name__)
+
+Page = Union[str, list[list[Optional[str]]]]
+
+# the first byte of an encoded page tells if it's HTML or the products extracted in the browser
+_HTML, _EXTRACTED = b"h", b"j"
+
+
+def slim_page(page_html: str) -> str:
+    """
+    :return: a minimal page with only the product containers of the page
+    """
+    containers = "".join(slice_elements(page_html, *WORTEN_PRODUCT_SPEC.container))
+    return f"<!DOCTYPE html><html><body>{containers}</body></html>"
+
+
+def encode_page(page: Page) -> bytes:
+    if isinstance(page, str):
+        return _HTML + page.encode()
+    return _EXTRACTED + json.dumps(page, ensure_ascii=False).encode()
+
+
+def decode_page(data: bytes) -> Page:
+    if data[:1] == _HTML:
+        return data[1:].decode()
+    return json.loads(data[1:])
+
+
+class PageCompressor:
+    """
+    Compresses pages with zstd and a dictionary trained on the pages themselves
+    :param dict_dir: folder of the trained dictionaries, the most recent one is used
+    :param level: zstd compression level
+    :param train_after_pages: without a dictionary, the pages are compressed
+        without one and kept as samples until there are enough to train it
+    :param dict_size: size of the trained dictionary in bytes
+    """
+    def __init__(
+            self,
+            dict_dir: Path,
+            level: int = 3,
+            train_after_pages: int = 100,
+            dict_size: int = 64 * 1024) -> None:
+        if zstd is None:
+            raise ImportError("page compression requires zstandard, install web-scraper[compression]")
+        self.dict_dir = Path(dict_dir)
+        self.level = level
+        self.train_after_pages = train_after_pages
+        self.dict_size = dict_size
+        self._samples: list[bytes] = []
+        self._dictionaries: dict[int, "zstd.ZstdCompressionDict"] = {}
+        self._decompressors: dict[int, "zstd.ZstdDecompressor"] = {}
+        self.dictionary: Optional["zstd.ZstdCompressionDict"] = None
+        self._compressor = zstd.ZstdCompressor(level=level)
+        # zstd (de)compressors can't be used by several threads at once
+        self._lock = threading.Lock()
+
+        dict_files = sorted(self.dict_dir.glob("*.zdict"), key=lambda dict_file: dict_file.stat().st_mtime)
+        if dict_files:
+            self._use_dictionary(self._load_dictionary(int(dict_files[-1].stem)))
+
+    def _load_dictionary(self, dict_id: int) -> "zstd.ZstdCompressionDict":
+        if dict_id not in self._dictionaries:
+            data = (self.dict_dir / f"{dict_id}.zdict").read_bytes()
+            self._dictionaries[dict_id] = zstd.ZstdCompressionDict(data)
+        return self._dictionaries[dict_id]
+
+    def _use_dictionary(self, dictionary: "zstd.ZstdCompressionDict") -> None:
+        self.dictionary = dictionary
+        self._compressor = zstd.ZstdCompressor(level=self.level, dict_data=dictionary)
+
+    def train(self, samples: list[bytes]) -> None:
+        """
+        Trains a dictionary on the samples, saves it and compresses with it from now on
+        """
+        dictionary = zstd.train_dictionary(self.dict_size, samples, level=self.level)
+        self.dict_dir.mkdir(exist_ok=True, parents=True)
+        (self.dict_dir / f"{dictionary.dict_id()}.zdict").write_bytes(dictionary.as_bytes())
+        self._dictionaries[dictionary.dict_id()] = dictionary
+        self._use_dictionary(dictionary)
+        logger.info(f"trained zstd dictionary {dictionary.dict_id()} on {len(samples)} pages")
+
+    def compress(self, data: bytes) -> bytes:
+        with self._lock:
+            frame = self._compressor.compress(data)
+            if self.dictionary is None:
+                self._samples.append(data)
+                if len(self._samples) >= self.train_after_pages:
+                    try:
+                        self.train(self._samples)
+                    except zstd.ZstdError as e:
+                        logger.warning(f"couldn't train the zstd dictionary: {e}")
+                    self._samples = []
+        return frame
+
+    def decompress(self, frame: bytes) -> bytes:
+        dict_id = zstd.get_frame_parameters(frame).dict_id
+        with self._lock:
+            if dict_id not in self._decompressors:
+                dictionary = self._load_dictionary(dict_id) if dict_id else None
+                self._decompressors[dict_id] = zstd.ZstdDecompressor(dict_data=dictionary)
+            return self._decompressors[dict_id].decompress(frame)
+
+    def compress_page(self, page: Page, slim: bool = True) -> bytes:
+        if slim and isinstance(page, str):
+            page = slim_page(page)
+        return self.compress(encode_page(page))
+
+    def decompress_page(self, frame: bytes) -> Page:
+        return decode_page(self.decompress(frame))
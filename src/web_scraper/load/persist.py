@@ -7,10 +7,24 @@ from enum import Enum
 
 from web_scraper.support import utils
 from web_scraper.extract.scraper_base import SectionScrape
+from web_scraper.load.manifest import RunManifest
+from web_scraper.load.page_compression import Page, PageCompressor
+from web_scraper.load.segment_store import SegmentStore
 
 
 logger = utils.log_ws(__name__)
 
+MANIFEST_FN = "manifest.sqlite"
+# products parsed in the run, see ProductIndex
+PRODUCT_INDEX_FN = "product_index.sqlite"
+# products of each section parsed in the run, see StagedProducts
+STAGED_PRODUCTS_DIR = "staged_products"
+# zstd dictionaries of the compressed pages, shared by the runs (in the data folder)
+ZSTD_DICT_DIR = "zstd_dictionaries"
+# the sections of a run, see SegmentStore (in the raw folder)
+SEGMENT_FN = "sections.seg"
+
+
 class DataFolders(Enum):
     RAW = "raw"
     PROCESSED = "processed"
@@ -18,43 +32,131 @@ class DataFolders(Enum):
 
 
 class Persist:
+    """
+    Saves the scraped sections of a run
+    :param data_folder: folder of all the runs
+    :param created_at: reference time of the run (its folder name), now if None
+    :param compressor: if given, the pages are compressed, otherwise they are stored as they are
+    :param slim: only keep the product containers of the pages (when compressing)
+    the sections are appended to the run's segment file, the pickle files of
+    older runs (".pkl") can still be loaded
+    """
     def __init__(
             self,
             data_folder: Path,
-            created_at: Optional[str]) -> None:
+            created_at: Optional[str],
+            compressor: Optional[PageCompressor] = None,
+            slim: bool = True) -> None:
         if created_at:
             self.time_ref = created_at
         else:
             self.time_ref = datetime.now().strftime("%Y%m%d_%H%S")
         self.data_folder = data_folder / self.time_ref
         self.raw_data = self.data_folder / DataFolders.RAW.value
+        # the parsed products of all the runs, see ProcessedWriter (partitioned by date)
+        self.processed_data = data_folder / DataFolders.PROCESSED.value
         self._create_dirs()
+        had_manifest = (self.data_folder / MANIFEST_FN).exists()
+        self.manifest = RunManifest(self.data_folder / MANIFEST_FN)
+        self.compressor = compressor
+        self.slim = slim
+        self.segments = SegmentStore(
+            self.raw_data / SEGMENT_FN, compressor, slim, dict_dir=data_folder / ZSTD_DICT_DIR
+        )
+        self._drop_unrecorded_sections(had_manifest)
 
     def _create_dirs(self):
         self.raw_data.mkdir(exist_ok=True, parents=True)
 
+    def _drop_unrecorded_sections(self, had_manifest: bool) -> None:
+        """
+        A section is recorded in the manifest once it's fully appended, what
+        comes after the last recorded section was interrupted
+        :param had_manifest: if the run manifest already existed (without it,
+            the sections are found walking back from the end of the file)
+        """
+        ends = [
+            SegmentStore.end_of(entry.offset, entry.length)
+            for entry in self.manifest.entries() if entry.file_name == SEGMENT_FN
+        ]
+        if ends:
+            self.segments.truncate(max(ends))
+        elif had_manifest:
+            # the first append was interrupted, the file is emptied (the header is written again)
+            self.segments.truncate(0)
+
     def save_section(self, section_scrape: Optional[SectionScrape]) -> None:
         if section_scrape is None:
             logger.warning("no section_scrape to save")
             return
-        name = "_".join(
-            [section_scrape.section_specs[f"category_lvl{i}"] for i in range(1, 4)]
-        ) + ".pkl"
-        with open(self.raw_data / name, 'wb') as file:
-            pickle.dump(section_scrape, file)
+        offset, length = self.segments.append(section_scrape)
+        self._record_section(section_scrape, SEGMENT_FN, offset=offset, length=length)
+
+    def _record_section(
+            self,
+            section_scrape: SectionScrape,
+            name: str,
+            offset: int = 0,
+            length: Optional[int] = None) -> None:
+        self.manifest.record(
+            section_scrape.section_specs['base_url'],
+            name,
+            n_pages=section_scrape.section_specs.get('n_pages'),
+            n_pages_scraped=section_scrape.metadata.get('n_pages_scraped'),
+            offset=offset,
+            length=length
+        )
 
-    def load_section(self, name) -> None:
+    def load_section(self, name: str, offset: int = 0, length: Optional[int] = None) -> SectionScrape:
+        """
+        :param name: file the section was saved to, offset and length of its
+            footer for the segment file (see the run manifest)
+        """
+        if name == SEGMENT_FN:
+            return self.segments.read_section(offset, length)
+        # pickle files of older runs
         with open(self.raw_data / name, 'rb') as file:
             return pickle.load(file)
 
-    def extracted_urls(self) -> list:
-        if self.raw_data.glob('*.pkl'):
-            urls = [
-                self.load_section(file_name).section_specs['base_url']
-                for file_name in self.raw_data.glob('*.pkl')
-            ]
-        else:
-            urls = []
-        return urls
+    def load(self, base_url: str) -> SectionScrape:
+        entry = self.manifest.get(base_url)
+        if entry is None:
+            raise KeyError(f"no section saved for {base_url}")
+        return self.load_section(entry.file_name, entry.offset, entry.length)
+
+    def load_page(self, base_url: str, i: int) -> Page:
+        """
+        Reads a single page of a section (from 0), without reading the others
+        """
+        entry = self.manifest.get(base_url)
+        if entry is None:
+            raise KeyError(f"no section saved for {base_url}")
+        if entry.file_name != SEGMENT_FN:
+            return self.load_section(entry.file_name).html[i]
+        return self.segments.page(self.segments.footer(entry.offset, entry.length), i)
+
+    def _section_files(self) -> list[Path]:
+        return list(self.raw_data.glob('*.pkl'))
+
+    def _rebuild_manifest(self) -> None:
+        """
+        Indexes the sections saved before the run manifest existed (loads the
+        pickle files once, only reads the footers of the segment file)
+        """
+        for file_path in self._section_files():
+            logger.info(f"adding {file_path.name} to the run manifest")
+            self._record_section(self.load_section(file_path.name), file_path.name)
+        for offset, length in self.segments.sections():
+            footer = self.segments.footer(offset, length)
+            section_scrape = SectionScrape([], footer["section_specs"], footer["metadata"])
+            self._record_section(section_scrape, SEGMENT_FN, offset=offset, length=length)
+
+    def extracted_urls(self) -> set[str]:
+        """
+        URLs of the sections already saved in this run, read from the run manifest
+        """
+        if not len(self.manifest) and (self._section_files() or self.segments.path.exists()):
+            self._rebuild_manifest()
+        return self.manifest.completed_urls()
 
 
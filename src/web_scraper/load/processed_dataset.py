@@ -0,0 +1,170 @@
+"""
+Defines the processed dataset, the parsed products saved as partitioned Parquet
+
+The products of all the runs are kept in a single dataset, partitioned by
+scrape date and level 1 category (hive style folders, ex:
+date=2022-12-04/category_lvl1=grandes-eletrodomesticos). Each file is sorted
+by price and written with the min/max statistics of its row groups, so a
+query on dates, categories and a price range only opens the matching folders
+and skips the row groups out of the price range. Strings are dictionary
+encoded, most of them repeat a lot (categories, dates, image hosts). A
+product found in several categories is saved once, under the first one, with
+the list of all of them (the categories column).
+"""
+import uuid
+from pathlib import Path
+from typing import Any, Iterable, Optional, Sequence
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+except ImportError:  # optional dependency, see the arrow extra
+    pa = ds = None
+
+from web_scraper.support import utils
+from web_scraper.transform.product_batch import ProductBatch
+
+logger = utils.log_ws(__name__)
+
+PARTITION_COLUMNS = ("date", "category_lvl1")
+
+
+def _partitioning() -> "ds.Partitioning":
+    return ds.partitioning(pa.schema([(column, pa.string()) for column in PARTITION_COLUMNS]), flavor="hive")
+
+
+class ProcessedWriter:
+    """
+    Writes ProductBatches to the processed dataset, they are kept in memory
+    until there are enough products to write sizeable files
+    :param folder: root folder of the dataset
+    :param flush_rows: products buffered before they are written
+    :param row_group_rows: maximum products per row group
+    :param name: prefix of the files written, to tell the runs apart
+    :param overwrite: removes the files of a previous attempt of the run (same
+        name) first, a resumed run writes all its products again
+    """
+    def __init__(
+            self,
+            folder: Path,
+            flush_rows: int = 100_000,
+            row_group_rows: int = 16_384,
+            name: Optional[str] = None,
+            overwrite: bool = False) -> None:
+        if pa is None:
+            raise ImportError("the processed dataset requires pyarrow, install web-scraper[arrow]")
+        self.folder = Path(folder)
+        self.flush_rows = flush_rows
+        self.row_group_rows = row_group_rows
+        self.name = name or "products"
+        if overwrite:
+            self._remove_written()
+        self._batches: list[tuple[ProductBatch, Optional[list[list[str]]]]] = []
+        self._n_buffered = 0
+        self.n_written = 0
+
+    def _remove_written(self) -> None:
+        previous = list(self.folder.glob(f"*/*/{self.name}-*.parquet"))
+        if previous:
+            logger.warning(f"removing {len(previous)} files of a previous attempt of {self.name}")
+        for path in previous:
+            path.unlink()
+
+    def write(self, batch: ProductBatch, categories: Optional[list[list[str]]] = None) -> None:
+        """
+        :param categories: every category each product was found in, see ProductIndex
+        """
+        if not len(batch):
+            return
+        missing = [column for column in PARTITION_COLUMNS if column not in batch.extras]
+        if missing:
+            raise ValueError(f"the products have no {', '.join(missing)}")
+        if categories is not None and len(categories) != len(batch):
+            raise ValueError(f"{len(categories)} lists of categories for {len(batch)} products")
+        self._batches.append((batch, categories))
+        self._n_buffered += len(batch)
+        if self._n_buffered >= self.flush_rows:
+            self.flush()
+
+    def _table(self, batches: list[tuple[ProductBatch, Optional[list[list[str]]]]]) -> "pa.Table":
+        table = pa.Table.from_batches([ProductBatch.concat(batch for batch, _ in batches).to_arrow()])
+        if batches[0][1] is not None:
+            categories = [product for _, batch_categories in batches for product in batch_categories]
+            table = table.append_column("categories", pa.array(categories, pa.list_(pa.string())))
+        for column in PARTITION_COLUMNS:
+            i = table.schema.get_field_index(column)
+            table = table.set_column(i, column, table[column].cast(pa.string()))
+        # sorted by price, the row groups have narrow price ranges to skip
+        return table.sort_by([(column, "ascending") for column in (*PARTITION_COLUMNS, "price")])
+
+    def flush(self) -> None:
+        if not self._batches:
+            return
+        # ProductBatch.concat needs the same extras, sections without some category levels are written apart
+        groups: dict[tuple[Any, ...], list[tuple[ProductBatch, Optional[list[list[str]]]]]] = {}
+        for batch, categories in self._batches:
+            groups.setdefault((*batch.extras, categories is None), []).append((batch, categories))
+        file_options = ds.ParquetFileFormat().make_write_options(
+            compression="zstd", use_dictionary=True, write_statistics=True
+        )
+        # a resumed run writes new files next to those of its first attempt
+        flush_id = uuid.uuid4().hex[:8]
+        for j, batches in enumerate(groups.values()):
+            ds.write_dataset(
+                self._table(batches),
+                self.folder,
+                format="parquet",
+                partitioning=_partitioning(),
+                file_options=file_options,
+                basename_template=f"{self.name}-{flush_id}-{j}-{{i}}.parquet",
+                max_rows_per_group=self.row_group_rows,
+                existing_data_behavior="overwrite_or_ignore",
+            )
+        logger.info(f"wrote {self._n_buffered} products to {self.folder}")
+        self.n_written += self._n_buffered
+        self._batches = []
+        self._n_buffered = 0
+
+    def close(self) -> None:
+        self.flush()
+
+    def __enter__(self) -> "ProcessedWriter":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+
+def read_products(
+        folder: Path,
+        dates: Optional[Iterable[str]] = None,
+        categories: Optional[Iterable[str]] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        columns: Optional[Sequence[str]] = None) -> "pa.Table":
+    """
+    Reads the products of the processed dataset, the filters are applied
+    while reading: only the partitions of the dates and categories are
+    opened and the row groups out of the price range are skipped
+    :param dates: scrape dates (ex: "2022-12-04"), all if None
+    :param categories: level 1 categories, all if None
+    :param min_price: minimum price (included)
+    :param max_price: maximum price (included)
+    :param columns: columns to read, all if None
+    """
+    if pa is None:
+        raise ImportError("the processed dataset requires pyarrow, install web-scraper[arrow]")
+    conditions = []
+    if dates is not None:
+        conditions.append(ds.field("date").isin(list(dates)))
+    if categories is not None:
+        conditions.append(ds.field("category_lvl1").isin(list(categories)))
+    if min_price is not None:
+        conditions.append(ds.field("price") >= min_price)
+    if max_price is not None:
+        conditions.append(ds.field("price") <= max_price)
+    condition = None
+    for expression in conditions:
+        condition = expression if condition is None else condition & expression
+    dataset = ds.dataset(Path(folder), format="parquet", partitioning=_partitioning())
+    return dataset.to_table(columns=list(columns) if columns is not None else None, filter=condition)
@@ -0,0 +1,211 @@
+"""
+Defines the segment store, an append-only file of the scraped sections
+
+Each section is appended as its page frames, one after the other, followed
+by a JSON footer (section specs, metadata and the offset and length of each
+frame) and a fixed size trailer pointing to the footer:
+
+    | page 1 | page 2 | ... | footer (JSON) | footer offset, footer length, magic |
+
+The run manifest keeps the offset and length of each section's footer, so a
+reader maps the file in memory and reads a single page, or just the specs and
+metadata of a section, without decoding anything else. Without the manifest,
+the sections can be found walking back from the end of the file, trailer to
+trailer. Nothing is unpickled, the file only holds data.
+"""
+import os
+import json
+import mmap
+import struct
+import threading
+from pathlib import Path
+from datetime import datetime
+from typing import Any, Iterator, Optional
+
+try:
+    import fcntl
+except ImportError:  # windows, only the threads of a process are kept from writing at once
+    fcntl = None
+
+from web_scraper.support import utils
+from web_scraper.extract.scraper_base import SectionScrape
+from web_scraper.load.page_compression import Page, PageCompressor, encode_page, decode_page
+
+logger = utils.log_ws(__name__)
+
+FILE_HEADER = b"WSSEG1\n\x00"
+# footer offset, footer length, magic
+_TRAILER = struct.Struct("<QI4s")
+_TRAILER_MAGIC = b"WSF1"
+
+
+class SegmentFormatError(Exception):
+    pass
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"__datetime__": value.isoformat()}
+    raise TypeError(f"{type(value).__name__} can't be saved in a segment footer")
+
+
+def _json_object_hook(value: dict[str, Any]) -> Any:
+    if len(value) == 1 and "__datetime__" in value:
+        return datetime.fromisoformat(value["__datetime__"])
+    return value
+
+
+class SegmentStore:
+    """
+    Append-only file of sections, safe to append to from several threads
+    and processes (the file is locked while a section is appended)
+    :param path: segment file, created on the first append
+    :param compressor: compresses the pages (stored as they are if None)
+    :param slim: only keep the product containers of the pages (when compressing)
+    :param dict_dir: dictionaries folder, to read compressed pages without a compressor
+    """
+    def __init__(
+            self,
+            path: Path,
+            compressor: Optional[PageCompressor] = None,
+            slim: bool = True,
+            dict_dir: Optional[Path] = None) -> None:
+        self.path = Path(path)
+        self.compressor = compressor
+        self.slim = slim
+        self.dict_dir = dict_dir
+        self._lock = threading.Lock()
+        self._map: Optional[mmap.mmap] = None
+        # the readers share the map (replaced when the file grows) and the decompressor
+        self._map_lock = threading.Lock()
+        # reads the compressed pages when there's no compressor (the pages appended stay uncompressed)
+        self._decompressor: Optional[PageCompressor] = None
+
+    def _page_frame(self, page: Page) -> bytes:
+        if self.compressor is None:
+            return encode_page(page)
+        return self.compressor.compress_page(page, self.slim)
+
+    def append(self, section: SectionScrape) -> tuple[int, int]:
+        """
+        :return: offset and length of the section's footer
+        """
+        # compressed before locking the file, the other threads can write meanwhile
+        frames = [self._page_frame(page) for page in section.html]
+        with self._lock, open(self.path, "ab") as file:
+            if fcntl is not None:
+                fcntl.flock(file, fcntl.LOCK_EX)
+            try:
+                start = file.seek(0, os.SEEK_END)
+                if start == 0:
+                    start = file.write(FILE_HEADER)
+                pages = []
+                for frame in frames:
+                    pages.append((file.tell(), len(frame)))
+                    file.write(frame)
+                footer = json.dumps(
+                    {
+                        "start": start,
+                        "codec": "raw" if self.compressor is None else "zstd",
+                        "pages": pages,
+                        "section_specs": section.section_specs,
+                        "metadata": section.metadata,
+                    },
+                    default=_json_default,
+                ).encode()
+                footer_offset = file.tell()
+                file.write(footer)
+                file.write(_TRAILER.pack(footer_offset, len(footer), _TRAILER_MAGIC))
+                file.flush()
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(file, fcntl.LOCK_UN)
+        return footer_offset, len(footer)
+
+    def sync(self) -> None:
+        """
+        Makes sure the sections appended are on disk, not only in the OS's buffers
+        """
+        if self.path.exists():
+            with self._lock, open(self.path, "rb") as file:
+                os.fsync(file.fileno())
+
+    def truncate(self, end: int) -> None:
+        """
+        Drops what was appended after end, ex: a section whose append was interrupted
+        """
+        with self._lock, self._map_lock:
+            self._close_map()
+            if self.path.exists() and self.path.stat().st_size > end:
+                logger.warning(f"dropping {self.path.stat().st_size - end} bytes after {end} in {self.path.name}")
+                os.truncate(self.path, end)
+
+    @staticmethod
+    def end_of(footer_offset: int, footer_length: int) -> int:
+        """
+        :return: where the section with this footer ends in the file
+        """
+        return footer_offset + footer_length + _TRAILER.size
+
+    def _bytes(self, offset: int, length: int) -> bytes:
+        # the file grows with each append, it's mapped again when reading past the current map
+        with self._map_lock:
+            if self._map is None or offset + length > len(self._map):
+                self._close_map()
+                with open(self.path, "rb") as file:
+                    self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            if offset + length > len(self._map):
+                raise SegmentFormatError(f"{self.path.name} has no bytes {offset}-{offset + length}")
+            return self._map[offset:offset + length]
+
+    def _close_map(self) -> None:
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    def footer(self, offset: int, length: int) -> dict[str, Any]:
+        """
+        :return: the footer of a section, its specs, metadata and where its pages are
+        """
+        return json.loads(self._bytes(offset, length), object_hook=_json_object_hook)
+
+    def page(self, footer: dict[str, Any], i: int) -> Page:
+        """
+        :param footer: see footer
+        :param i: index of the page in the section (from 0)
+        """
+        frame = self._bytes(*footer["pages"][i])
+        if footer["codec"] == "raw":
+            return decode_page(frame)
+        if self.compressor is not None:
+            return self.compressor.decompress_page(frame)
+        with self._map_lock:
+            if self._decompressor is None:
+                self._decompressor = PageCompressor(self.dict_dir)
+        return self._decompressor.decompress_page(frame)
+
+    def read_section(self, offset: int, length: int) -> SectionScrape:
+        footer = self.footer(offset, length)
+        pages = [self.page(footer, i) for i in range(len(footer["pages"]))]
+        return SectionScrape(pages, footer["section_specs"], footer["metadata"])
+
+    def sections(self) -> Iterator[tuple[int, int]]:
+        """
+        Finds the sections walking back from the end of the file (without the manifest)
+        :return: offset and length of each section's footer, in the order they were appended
+        """
+        if not self.path.exists():
+            return iter(())
+        found = []
+        end = self.path.stat().st_size
+        while end > len(FILE_HEADER):
+            footer_offset, footer_length, magic = _TRAILER.unpack(self._bytes(end - _TRAILER.size, _TRAILER.size))
+            if magic != _TRAILER_MAGIC:
+                raise SegmentFormatError(f"no section ends at {end} in {self.path.name}")
+            found.append((footer_offset, footer_length))
+            end = self.footer(footer_offset, footer_length)["start"]
+        return reversed(found)
+
+    def close(self) -> None:
+        with self._map_lock:
+            self._close_map()
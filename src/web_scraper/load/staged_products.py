@@ -0,0 +1,88 @@
+"""
+Defines the staged products, the parsed products of each section kept until the run is done
+
+A product is listed under several level 3 categories, it's only output
+(processed dataset, S3, DynamoDB) once, with all of them, so the products
+can't be output before every section is parsed. Meanwhile the products of
+each section are staged in the run folder, a file per section written as
+soon as it's parsed, so a resumed run doesn't lose them. The products are
+collapsed when the run is done, the product index is rebuilt from all the
+staged sections: a section parsed but lost before it was staged (ex: in a
+crash) can't leave its products registered, and output by no one.
+"""
+import os
+import time
+import hashlib
+from pathlib import Path
+from typing import Any, Iterator
+
+import numpy as np
+
+from web_scraper.support import utils
+from web_scraper.transform.product_batch import ProductBatch
+from web_scraper.transform.product_index import ProductIndex, category_path
+
+logger = utils.log_ws(__name__)
+
+
+class StagedProducts:
+    """
+    Parsed products of the sections of a run, a .npz file per section (see ProductBatch.to_arrays)
+    :param folder: staging folder of the run
+    """
+    def __init__(self, folder: Path) -> None:
+        self.folder = Path(folder)
+        self.folder.mkdir(exist_ok=True, parents=True)
+
+    def _path(self, base_url: str) -> Path:
+        return self.folder / f"{hashlib.sha1(base_url.encode()).hexdigest()}.npz"
+
+    def __contains__(self, base_url: str) -> bool:
+        return self._path(base_url).exists()
+
+    def __len__(self) -> int:
+        return len(self._staged())
+
+    def add(self, section_specs: dict[str, Any], products: ProductBatch) -> None:
+        """
+        Stages the products of a section, they are on disk when it returns
+        """
+        path = self._path(section_specs["base_url"])
+        arrays = products.to_arrays()
+        arrays["section:category"] = np.array(category_path(section_specs))
+        arrays["section:staged_at"] = np.array(time.time_ns())
+        # written apart and renamed, a section is either fully staged or not at all
+        temp_path = path.with_suffix(".tmp")
+        with open(temp_path, "wb") as file:
+            np.savez(file, **arrays)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, path)
+
+    def _staged(self) -> list[Path]:
+        # in the order they were staged, the first category of a product is the first one staged
+        staged_at = {}
+        for path in self.folder.glob("*.npz"):
+            with np.load(path) as arrays:
+                staged_at[path] = int(arrays["section:staged_at"])
+        return sorted(staged_at, key=lambda path: (staged_at[path], path.name))
+
+    def first_seen(self, index: ProductIndex) -> Iterator[ProductBatch]:
+        """
+        Registers the products of every staged section in the index (cleared
+        first), then gives the products of each section that weren't found
+        in an earlier one
+        :param index: has the categories of each product once done
+        """
+        index.clear()
+        paths = self._staged()
+        first_seen = []
+        for path in paths:
+            with np.load(path) as arrays:
+                products = ProductBatch.from_arrays(arrays)
+                first_seen.append(index.register(products.product_keys(), str(arrays["section:category"])))
+        n_products = sum(len(mask) for mask in first_seen)
+        logger.info(f"{len(index)} distinct products out of {n_products} in {len(paths)} sections")
+        for path, mask in zip(paths, first_seen):
+            with np.load(path) as arrays:
+                yield ProductBatch.from_arrays(arrays).take(mask)
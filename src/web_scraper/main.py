@@ -1,32 +1,126 @@
+from datetime import datetime
+from itertools import chain
+from contextlib import ExitStack
+
 from web_scraper import config
 from web_scraper.support import utils
-from web_scraper.transform import content_parser
+from web_scraper.support.utils import S3Uploader
+from web_scraper.transform.parse_pipeline import ParsePipeline
 from web_scraper.extract import scraper_worten
+from web_scraper.extract.category_cache import CategoryCache
 from web_scraper.extract.scraper_config import (
     WORTEN_SP_CONFIG_PER_SYSTEM,
     WortenSpConfig
 )
-from web_scraper.load.persist import Persist
+from web_scraper.load.persist import Persist, PRODUCT_INDEX_FN, STAGED_PRODUCTS_DIR, ZSTD_DICT_DIR
+from web_scraper.load.background_persist import BackgroundPersist
+from web_scraper.load.page_compression import PageCompressor
+from web_scraper.load.processed_dataset import ProcessedWriter
+from web_scraper.load.dynamodb_loader import DynamoDBLoader
+from web_scraper.load.staged_products import StagedProducts
+from web_scraper.transform.product_index import ProductIndex
 
 
 logger = utils.log_ws(__name__)
 
 
+def _save_sections(sections, persist: BackgroundPersist):
+    """
+    queues the raw sections to be saved as they are scraped, before they are parsed
+    """
+    for section in sections:
+        if section is not None:
+            persist.save_section(section)
+        yield section
+
+
+def _unstaged_sections(persist: Persist, staged: StagedProducts, saved_urls: set[str]):
+    """
+    the sections saved by a previous attempt of the run but not parsed, loaded to be parsed again
+    """
+    for base_url in saved_urls:
+        if base_url not in staged:
+            logger.info(f"{base_url} was saved but not parsed, parsing it again")
+            yield persist.load(base_url)
+
+
+def _output_products(staged: StagedProducts, index: ProductIndex, processed, uploader, dynamodb_loader):
+    """
+    outputs the products of the run, each product once with the categories it was found in
+    """
+    for products in staged.first_seen(index):
+        records = index.with_categories(products.to_records())
+        if processed is not None:
+            processed.write(products, [record["categories"] for record in records])
+        if uploader is not None:
+            uploader.write(records)
+        if dynamodb_loader is not None:
+            dynamodb_loader.load(records)
+
+
 def run_scraper():
     WORTEN_SP_CONFIG: WortenSpConfig = WORTEN_SP_CONFIG_PER_SYSTEM[config.MODE]
     logger.info(WORTEN_SP_CONFIG)
 
     scraper = scraper_worten.WortenScraper(WORTEN_SP_CONFIG)
+    scraper.set_category_cache(
+        CategoryCache(config.CATEGORY_CACHE_FN, WORTEN_SP_CONFIG.CATEGORY_CACHE_TTL_SEC)
+    )
     if config.HEADLESS_MODE:
         scraper.set_headless()
     scraper.start_chrome()
 
-    persist = Persist(config.DATA_DIR, config.REFERENCE_TIME)
-    parser = content_parser.WortenHtmlParser({"date": config.REFERENCE_TIME})
-    for category in scraper.get_site(select_categories=["lavar", "secar"]):
-        persist.save_section(category)
-        site_prods = parser.parse_category(scraper.site_html)
-        print(site_prods)  # TODO: persist parsed products
+    compressor = None
+    if config.COMPRESS_RAW_PAGES:
+        try:
+            compressor = PageCompressor(config.DATA_DIR / ZSTD_DICT_DIR)
+        except ImportError as e:
+            logger.warning(f"saving the raw pages uncompressed: {e}")
+    persist = Persist(config.DATA_DIR, config.REFERENCE_TIME, compressor)
+    # when continuing a scrape, skip the sections already saved
+    excluded_urls = persist.extracted_urls() if config.REFERENCE_TIME else None
+    sections = scraper.get_site(select_categories=["lavar", "secar"], excluded_urls=excluded_urls)
+    # the products of each section until they are all parsed, see StagedProducts
+    staged = StagedProducts(persist.data_folder / STAGED_PRODUCTS_DIR)
+    outputs = ExitStack()
+    processed = None
+    if config.SAVE_PROCESSED_PRODUCTS:
+        try:
+            # the products are all output again when resuming, the files of the previous attempt are replaced
+            processed = outputs.enter_context(
+                ProcessedWriter(persist.processed_data, name=persist.time_ref, overwrite=True)
+            )
+        except ImportError as e:
+            logger.warning(f"not saving the processed products: {e}")
+    uploader = None
+    if config.S3_BUCKET:
+        # aborts the object being uploaded if the run fails
+        uploader = outputs.enter_context(S3Uploader(config.S3_BUCKET, f"products/{persist.time_ref}"))
+    dynamodb_loader = None
+    if config.DYNAMODB_TABLE:
+        dynamodb_loader = outputs.enter_context(DynamoDBLoader(config.DYNAMODB_TABLE, region_name=config.AWS_REGION))
+    # the scrape date of the run, the processed data is partitioned by it
+    run_date = datetime.strptime(persist.time_ref[:8], "%Y%m%d").date().isoformat()
+    # the sections are saved by writer threads, the scraper doesn't wait for them (unless
+    # they fall behind), closing it waits for the last ones and raises if some couldn't be saved
+    with outputs, BackgroundPersist(persist, max_queued=config.PERSIST_QUEUE_SIZE) as background_persist:
+        # the sections are parsed in other processes while the next ones are scraped
+        with ParsePipeline(
+                {"date": run_date},
+                n_workers=config.PARSE_WORKERS,
+                cache_path=config.PARSE_CACHE_FN) as pipeline:
+            to_parse = chain(
+                _unstaged_sections(persist, staged, excluded_urls or set()),
+                _save_sections(sections, background_persist),
+            )
+            for category, site_prods in pipeline.map(to_parse):
+                logger.info(f"{category.section_specs['base_url']}: {len(site_prods)} products")
+                staged.add(category.section_specs, site_prods)
+        _output_products(
+            staged, ProductIndex(persist.data_folder / PRODUCT_INDEX_FN), processed, uploader, dynamodb_loader
+        )
+        if uploader is not None:
+            logger.info(f"uploaded {uploader.n_records} products to {', '.join(uploader.close())}")
 
 
 if __name__ == '__main__':
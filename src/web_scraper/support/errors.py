@@ -9,3 +9,27 @@ class ScraperBlockedError(Exception):
 
 class NoPopUpError(NoSuchElementException):
     pass
+
+class BrowserRequiredError(Exception):
+    """
+    The page can't be scraped without a browser (captcha or JS only content)
+    """
+    pass
+
+class UnprocessedItemsError(Exception):
+    """
+    DynamoDB didn't process some of the items written, even after retrying
+    """
+    def __init__(self, message: str, requests: list) -> None:
+        super().__init__(message)
+        # the write requests of the items left
+        self.requests = requests
+
+class PersistError(Exception):
+    """
+    Some sections couldn't be saved
+    """
+    def __init__(self, message: str, failures: list) -> None:
+        super().__init__(message)
+        # base URL of each section that couldn't be saved, with its error
+        self.failures = failures
@@ -1,14 +1,23 @@
+import io
 import csv
+import gzip
 import json
 import copy
+import zlib
 import logging
+import threading
 
 from pathlib import Path
 from dataclasses import field
-from typing import Union, Any
+from functools import lru_cache
+from itertools import chain
+from collections import deque
+from typing import Union, Any, Iterable, Iterator, Optional
 from datetime import datetime
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 
 import boto3
+from botocore.config import Config
 
 from web_scraper import config
 
@@ -71,37 +80,298 @@ def get_aws_credentials(file_name: str) -> dict[str, str]:
     return credentials
 
 
-def write_to_s3(data: Any) -> tuple[str, dict[str, Any]]:
+@lru_cache(maxsize=None)
+def aws_session() -> boto3.Session:
+    """
+    Session with the credentials of the credentials file, read once
+    """
     aws_credentials = get_aws_credentials(config.MAIN_DIR / 'web_scraper_accessKeys.csv')
-
-    #Creating Session With Boto3.
-    session = boto3.Session(
+    return boto3.Session(
         aws_access_key_id=aws_credentials['Access key ID'],
         aws_secret_access_key=aws_credentials['Secret access key']
     )
-    #Creating S3 Resource From the Session.
-    s3 = session.resource('s3')
+
+
+@lru_cache(maxsize=None)
+def s3_client(endpoint_url: Optional[str] = None, max_pool_connections: int = 16) -> Any:
+    """
+    S3 client shared by all the uploads and reads, boto3 clients are thread
+    safe and keep their connections open (up to max_pool_connections)
+    :param endpoint_url: to use a local stand-in for S3 (ex: moto server)
+    """
+    return aws_session().client(
+        's3',
+        endpoint_url=endpoint_url,
+        config=Config(max_pool_connections=max_pool_connections, retries={'mode': 'adaptive', 'max_attempts': 5})
+    )
+
+
+def write_to_s3(data: Any) -> tuple[str, dict[str, Any]]:
     datetime_now = datetime.now().strftime("%Y%m%d_%H%M%S")
     obj_name = f'worten_products{datetime_now}'
-    s3_object = s3.Object('shop-scrape', obj_name)
-    response = s3_object.put(Body=json.dumps(data))
+    response = s3_client().put_object(Bucket='shop-scrape', Key=obj_name, Body=json.dumps(data))
     return obj_name, response
 
 
 def read_from_s3(obj_name: str) -> dict[str, Any]:
-    aws_credentials = get_aws_credentials(config.MAIN_DIR / 'web_scraper_accessKeys.csv')
-
-    #Creating Session With Boto3.
-    session = boto3.Session(
-        aws_access_key_id=aws_credentials['Access key ID'],
-        aws_secret_access_key=aws_credentials['Secret access key']
-    )
-    #Creating S3 Resource From the Session.
-    s3 = session.resource('s3')
-    s3_object = s3.Object('shop-scrape', obj_name)
-    response = s3_object.get()['Body'].read().decode('utf-8')
+    response = s3_client().get_object(Bucket='shop-scrape', Key=obj_name)['Body'].read().decode('utf-8')
     return json.loads(response)
 
 
+# S3 refuses the parts of a multipart upload smaller than this (apart from the last one)
+S3_MIN_PART_SIZE = 5 * 1024 * 1024
+
+
+class S3Uploader:
+    """
+    Uploads records to S3 as gzip compressed NDJSON (a JSON record per line)
+
+    The records are compressed as they are written and every time there's a
+    part worth of compressed data it's uploaded, by a pool of threads, as a
+    part of a multipart upload. Only a few parts are kept in memory: writing
+    waits when max_workers * 2 parts are already waiting to be uploaded.
+    Writes go to the same object until it reaches object_size, so the small
+    sections end up together in larger objects.
+    :param bucket: S3 bucket
+    :param prefix: of the objects' keys, which are followed by their number (ex: "-00000.ndjson.gz")
+    :param client: S3 client, the one of s3_client if None
+    :param part_size: compressed bytes per part (at least S3_MIN_PART_SIZE)
+    :param object_size: compressed bytes per object, once reached the next records go to a new object
+    :param max_workers: parts uploaded at the same time
+    """
+    def __init__(
+            self,
+            bucket: str,
+            prefix: str,
+            client: Optional[Any] = None,
+            part_size: int = 8 * 1024 * 1024,
+            object_size: int = 256 * 1024 * 1024,
+            max_workers: int = 4) -> None:
+        if part_size < S3_MIN_PART_SIZE:
+            raise ValueError(f"S3 parts must have at least {S3_MIN_PART_SIZE} bytes")
+        self.bucket = bucket
+        self.prefix = prefix
+        self.client = client if client is not None else s3_client()
+        self.part_size = part_size
+        self.object_size = object_size
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix='s3_upload')
+        self._slots = threading.BoundedSemaphore(max_workers * 2)
+        # objects completed
+        self.keys: list[str] = []
+        self.n_records = 0
+        # object being written
+        self._key: Optional[str] = None
+        self._upload_id: Optional[str] = None
+        self._parts: list[Future] = []
+        self._object_bytes = 0
+        self._buffer = io.BytesIO()
+        self._gzip: Optional[gzip.GzipFile] = None
+
+    def _start_object(self) -> None:
+        self._key = f"{self.prefix}-{len(self.keys):05d}.ndjson.gz"
+        self._upload_id = None
+        self._parts = []
+        self._object_bytes = 0
+        self._buffer = io.BytesIO()
+        self._gzip = gzip.GzipFile(fileobj=self._buffer, mode='wb', compresslevel=6)
+
+    def _take_buffer(self) -> bytes:
+        data = self._buffer.getvalue()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return data
+
+    def _upload_part(self, key: str, upload_id: str, part_number: int, data: bytes) -> dict[str, Any]:
+        # runs in the pool, the object being written can change meanwhile
+        response = self.client.upload_part(
+            Bucket=self.bucket, Key=key, UploadId=upload_id, PartNumber=part_number, Body=data
+        )
+        return {'PartNumber': part_number, 'ETag': response['ETag']}
+
+    def _submit_part(self, data: bytes) -> None:
+        if self._upload_id is None:
+            self._upload_id = self.client.create_multipart_upload(
+                Bucket=self.bucket, Key=self._key, ContentType='application/gzip'
+            )['UploadId']
+        # waits while too many parts are in memory
+        self._slots.acquire()
+        future = self._executor.submit(self._upload_part, self._key, self._upload_id, len(self._parts) + 1, data)
+        future.add_done_callback(lambda _: self._slots.release())
+        self._parts.append(future)
+        self._object_bytes += len(data)
+
+    def write(self, records: Iterable[dict[str, Any]]) -> None:
+        for record in records:
+            if self._gzip is None:
+                self._start_object()
+            self._gzip.write(json.dumps(record, ensure_ascii=False, default=str).encode() + b'\n')
+            self.n_records += 1
+            if self._buffer.tell() >= self.part_size:
+                self._submit_part(self._take_buffer())
+                if self._object_bytes >= self.object_size:
+                    self._finish_object()
+
+    def _finish_object(self) -> None:
+        self._gzip.close()
+        self._gzip = None
+        data = self._take_buffer()
+        if self._upload_id is None:
+            # a single part, no need for a multipart upload
+            self.client.put_object(Bucket=self.bucket, Key=self._key, Body=data, ContentType='application/gzip')
+        else:
+            try:
+                self._submit_part(data)
+                parts = [future.result() for future in self._parts]
+                self.client.complete_multipart_upload(
+                    Bucket=self.bucket, Key=self._key, UploadId=self._upload_id, MultipartUpload={'Parts': parts}
+                )
+            except BaseException:
+                self.client.abort_multipart_upload(Bucket=self.bucket, Key=self._key, UploadId=self._upload_id)
+                raise
+        self.keys.append(self._key)
+
+    def flush(self) -> None:
+        """
+        Completes the object being written, the next records go to a new one
+        """
+        if self._gzip is not None:
+            self._finish_object()
+
+    def close(self) -> list[str]:
+        """
+        :return: keys of the objects uploaded
+        """
+        try:
+            self.flush()
+        finally:
+            self._executor.shutdown()
+        return self.keys
+
+    def abort(self) -> None:
+        """
+        Drops the object being written (its multipart upload is aborted), the completed ones are kept
+        """
+        try:
+            if self._upload_id is not None:
+                for future in self._parts:
+                    future.cancel()
+                wait(self._parts)
+                self.client.abort_multipart_upload(Bucket=self.bucket, Key=self._key, UploadId=self._upload_id)
+        finally:
+            self._gzip = None
+            self._upload_id = None
+            self._executor.shutdown()
+
+    def __enter__(self) -> 'S3Uploader':
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        # the object being written isn't completed with the records written before an error
+        if exc_info[0] is not None:
+            self.abort()
+        else:
+            self.close()
+
+
+_GZIP_MAGIC = b'\x1f\x8b'
+
+
+class S3Reader:
+    """
+    Reads S3 objects without loading them whole in memory: the records of
+    NDJSON objects (gzip compressed or not) are decoded chunk by chunk as
+    they are downloaded, byte ranges of an object can be fetched on their
+    own (ex: a section of a segment file, from its offset in the manifest)
+    and many objects can be read at the same time
+    :param bucket: S3 bucket
+    :param client: S3 client, the one of s3_client if None
+    :param chunk_size: bytes read from the response at a time
+    :param max_workers: objects read at the same time by read_many
+    """
+    def __init__(
+            self,
+            bucket: str,
+            client: Optional[Any] = None,
+            chunk_size: int = 1024 * 1024,
+            max_workers: int = 8) -> None:
+        self.bucket = bucket
+        self.client = client if client is not None else s3_client()
+        self.chunk_size = chunk_size
+        self.max_workers = max_workers
+
+    def _chunks(self, key: str) -> Iterator[bytes]:
+        """
+        the object's bytes as they are downloaded, decompressed if it's gzip
+        """
+        body = self.client.get_object(Bucket=self.bucket, Key=key)['Body']
+        try:
+            chunks = body.iter_chunks(self.chunk_size)
+            first = next(chunks, b'')
+            if first[:2] != _GZIP_MAGIC:
+                yield first
+                yield from chunks
+                return
+            decompressor = zlib.decompressobj(wbits=31)
+            for data in chain([first], chunks):
+                while data:
+                    yield decompressor.decompress(data)
+                    data = b''
+                    # concatenated gzip files, the next one starts in the unused data
+                    if decompressor.eof:
+                        data = decompressor.unused_data
+                        decompressor = zlib.decompressobj(wbits=31)
+        finally:
+            body.close()
+
+    def iter_lines(self, key: str) -> Iterator[bytes]:
+        buffer = bytearray()
+        for data in self._chunks(key):
+            buffer += data
+            end = buffer.rfind(b'\n')
+            if end < 0:
+                continue
+            lines = bytes(buffer[:end]).split(b'\n')
+            del buffer[:end + 1]
+            yield from (line for line in lines if line.strip())
+        if buffer.strip():
+            yield bytes(buffer)
+
+    def iter_records(self, key: str) -> Iterator[Any]:
+        """
+        Records of an NDJSON object, one at a time (the items of a JSON list
+        for the objects written by write_to_s3, which aren't streamed)
+        """
+        for line in self.iter_lines(key):
+            record = json.loads(line)
+            if isinstance(record, list):
+                yield from record
+            else:
+                yield record
+
+    def read_range(self, key: str, offset: int, length: int) -> bytes:
+        """
+        :return: length bytes of the object starting at offset
+        """
+        response = self.client.get_object(Bucket=self.bucket, Key=key, Range=f'bytes={offset}-{offset + length - 1}')
+        return response['Body'].read()
+
+    def read_many(self, keys: Iterable[str]) -> Iterator[tuple[str, list[Any]]]:
+        """
+        Reads the records of many objects at the same time, max_workers at most
+        :return: each key with its records, in the order of keys
+        """
+        with ThreadPoolExecutor(self.max_workers, thread_name_prefix='s3_read') as executor:
+            pending: deque[tuple[str, Future]] = deque()
+            for key in keys:
+                pending.append((key, executor.submit(lambda key: list(self.iter_records(key)), key)))
+                # only max_workers objects are kept in memory
+                if len(pending) >= self.max_workers:
+                    key, future = pending.popleft()
+                    yield key, future.result()
+            while pending:
+                key, future = pending.popleft()
+                yield key, future.result()
+
+
 def default_field(x: Any):
     return field(default_factory=lambda: copy.copy(x))
@@ -0,0 +1,165 @@
+"""
+Generates synthetic pages with the same layout as the Worten site
+
+Only the parts the scraper and the parser rely on are reproduced faithfully
+(category directory, pagination and product containers), the rest of the
+page is filler of a realistic size (menus, inline scripts, styles and svgs).
+"""
+import random
+from html import escape
+from typing import Optional
+
+BRANDS = ["Samsung", "LG", "Bosch", "Siemens", "Balay", "Whirlpool", "Beko", "Indesit", "Candy", "Teka"]
+PRODUCT_TYPES = ["Máquina de Lavar Roupa", "Máquina de Secar Roupa", "Frigorífico", "Micro-ondas", "Forno"]
+
+
+def _page_chrome(title: str, body: str, n_menu_links: int = 400) -> str:
+    """
+    Wraps the body with the header, menus, scripts and footer found on every page
+    """
+    menu = "".join(
+        f'<li class="header__menu-item"><a href="/menu/{i}">Menu {i}</a></li>'
+        for i in range(n_menu_links)
+    )
+    svg = '<svg viewBox="0 0 24 24"><path d="M12 2L2 7l10 5 10-5-10-5z"/></svg>' * 50
+    script = "<script>window.__STATE__ = " + '{"k": "' + "x" * 20_000 + '"};</script>'
+    style = "<style>" + ".w-class{color:#000;margin:0}" * 500 + "</style>"
+    return (
+        f"<!DOCTYPE html><html><head><title>{escape(title)}</title>{style}{script}</head>"
+        f'<body><header class="header"><nav><ul>{menu}</ul></nav>{svg}</header>'
+        f'<main class="main">{body}</main>'
+        f'<footer class="footer"><ul>{menu}</ul>{script}</footer></body></html>'
+    )
+
+
+# malformed prices seen on the site: the first two are decoded (the digits are
+# extracted), the others leave the product out
+MALFORMED_PRICES = ("messy", "spaced", "unavailable", "no_decimals")
+
+
+def _price_html(price_main: int, price_dec: int, malformed: Optional[str] = None) -> str:
+    main, dec = f"{price_main}", f",{price_dec:02d}€"
+    if malformed == "messy":
+        main, dec = f"\n  {price_main}€ ", f"\n ,{price_dec:02d} €\n"
+    elif malformed == "spaced":
+        main = f"{price_main:,}".replace(",", " ")
+    elif malformed == "unavailable":
+        main, dec = "Esgotado", ""
+    html = f'<span class="w-product-price__main">{main}</span>'
+    if malformed != "no_decimals":
+        html += f'<sup class="w-product-price__dec">{dec}</sup>'
+    return html
+
+
+def product_html(
+        rng: random.Random,
+        product_id: int,
+        old_price: bool = False,
+        malformed_price: Optional[str] = None) -> str:
+    """
+    :param malformed_price: one of MALFORMED_PRICES, applied to the current price
+    """
+    name = f"{rng.choice(PRODUCT_TYPES)} {rng.choice(BRANDS)} {product_id} ({rng.randint(5, 12)} kg)"
+    price_main = rng.randint(50, 1500)
+    price_dec = rng.choice([0, 49, 90, 99])
+    old_price_html = ""
+    if old_price:
+        old_price_html = (
+            '<span class="w-oldPrice">'
+            f'{_price_html(price_main + rng.randint(10, 200), price_dec)}'
+            '</span>'
+        )
+    return (
+        '<div class="w-product__wrapper">'
+        f'<a class="w-product__url" href="/produtos/{product_id}">'
+        '<figure class="w-product__image">'
+        f'<img src="data:image/gif;base64,R0lGODlhAQABAAAAACw=" data-src="/i/{product_id:08d}.jpg" alt="">'
+        '</figure>'
+        '<div class="w-product__content">'
+        '<div class="w-product__description"><div class="w-product__title-wrapper">'
+        f'<h3 class="w-product__title">{escape(name)}</h3>'
+        '</div></div>'
+        '<div class="w-product__price">'
+        f'{old_price_html}'
+        '<span class="w-currentPrice iss-current-price">'
+        f'{_price_html(price_main, price_dec, malformed_price)}'
+        '</span>'
+        '</div></div></a></div>'
+    )
+
+
+def pagination_html(page: int, n_pages: int) -> str:
+    items = []
+    for p in range(1, n_pages + 1):
+        if p == page:
+            items.append(f'<li class="current"><span>{p}</span></li>')
+        else:
+            items.append(f'<li><a href="?page={p}">{p}</a></li>')
+    if page < n_pages:
+        items.append(f'<li class="pagination-next"><a href="?page={page + 1}">Seguinte</a></li>')
+    return f'<ul aria-label="Pagination" class="pagination">{"".join(items)}</ul>'
+
+
+def listing_page(
+        category: str,
+        page: int = 1,
+        n_pages: int = 1,
+        n_products: int = 48,
+        old_price_share: float = 0.3,
+        malformed_price_share: float = 0.0,
+        seed: Optional[int] = None) -> str:
+    """
+    Creates a product listing page of a level 3 category
+    :param category: category name displayed in the title
+    :param page: page number (starting at 1)
+    :param n_pages: number of pages in the category
+    :param n_products: number of products in the page
+    :param old_price_share: probability of a product having a previous price
+    :param malformed_price_share: probability of a product's price being malformed
+        (any of MALFORMED_PRICES)
+    :param seed: random seed, by default it depends on the category and page
+    :return: the page HTML
+    """
+    rng = random.Random(seed if seed is not None else f"{category}_{page}")
+    first_id = page * 1000
+    products = "".join(
+        product_html(
+            rng,
+            first_id + i,
+            rng.random() < old_price_share,
+            rng.choice(MALFORMED_PRICES) if rng.random() < malformed_price_share else None,
+        )
+        for i in range(n_products)
+    )
+    body = (
+        f'<h1 class="listing__title">{escape(category)}</h1>'
+        f'<div class="w-product-list">{products}</div>'
+        f'{pagination_html(page, n_pages)}'
+    )
+    return _page_chrome(category, body)
+
+
+def home_page() -> str:
+    body = (
+        '<div id="cookies-banner">'
+        '<button onclick="document.getElementById(\'cookies-banner\').remove()">Aceitar Tudo</button>'
+        '</div>'
+    )
+    return _page_chrome("Worten", body)
+
+
+def category_directory(categories: dict[str, dict[str, list[str]]]) -> str:
+    """
+    Creates the category directory page
+    :param categories: level 2 display name -> level 2 URL path -> level 3 URL names
+    :return: the page HTML
+    """
+    sections = []
+    for lvl2_name, lvl2_paths in categories.items():
+        links = "".join(
+            f'<li><a class="header__submenu-third-level-sitemap" href="/{lvl2_path}/{lvl3}">{lvl3}</a></li>'
+            for lvl2_path, lvl3_names in lvl2_paths.items()
+            for lvl3 in lvl3_names
+        )
+        sections.append(f'<div><div><span>{escape(lvl2_name)}</span></div><ul>{links}</ul></div>')
+    return _page_chrome("Diretório de categorias", "".join(sections))
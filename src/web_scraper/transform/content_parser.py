@@ -1,18 +1,49 @@
-import re
-from typing import Any
+import threading
+from typing import Any, Callable, Collection, Optional, Union
 from datetime import datetime
 
-from bs4 import BeautifulSoup, element
+import numpy as np
 
 from web_scraper.support import utils
 from web_scraper.extract.scraper_base import SectionScrape
+from web_scraper.extract.page_sink import PageSink
+from web_scraper.extract.browser_extraction import EXTRACTED_FIELDS
+from web_scraper.transform.parser_backends import ParserBackend, get_backend
+from web_scraper.transform.html_slicing import slice_elements
+from web_scraper.transform.product_batch import ProductBatch
+from web_scraper.transform.parse_cache import ParseCache
+from web_scraper.transform.field_spec import (
+    WORTEN_PRODUCT_SPEC,
+    CompiledProductSpec,
+    ProductSpec,
+)
 
 logger = utils.log_ws(__name__)
 
 
 class WortenHtmlParser:
-    def __init__(self, metadata: dict[str, Any]) -> None:
+    """
+    Extracts the Worten products from the scraped pages
+    :param metadata: added to every product (the date defaults to today)
+    :param backend: HTML parsing backend, name from PARSER_BACKENDS or instance
+    :param restrict_to_products: only build the trees of the product containers,
+        sliced out of the raw page, instead of the tree of the whole page
+    :param spec: fields of the product records and where to find them
+    :param cache: skips the pages already parsed (the products captured from them are cached)
+    """
+    def __init__(
+            self,
+            metadata: dict[str, Any],
+            backend: Union[str, ParserBackend] = 'html.parser',
+            restrict_to_products: bool = True,
+            spec: ProductSpec = WORTEN_PRODUCT_SPEC,
+            cache: Optional[ParseCache] = None) -> None:
         self.metadata = self._set_metadata_defaults(metadata)
+        self.backend: ParserBackend = get_backend(backend)
+        self.restrict_to_products = restrict_to_products
+        self.spec = spec
+        self._compiled_spec: CompiledProductSpec = spec.compile(self.backend)
+        self.cache = cache
 
     @staticmethod
     def _set_metadata_defaults(metadata: dict[str, Any]):
@@ -21,60 +52,43 @@ class WortenHtmlParser:
             metadata_defaults['date'] = datetime.now().strftime("%Y-%m-%d")
         return dict(metadata, **metadata_defaults)
 
-    @staticmethod
-    def _price_decoding(price_main: str, price_dec: str) -> float:
-        try:
-            price: float = float(f'{price_main}.{price_dec}')
-        except ValueError:
-            price_main = re.findall(r'\d+', price_main)[0]
-            price_dec = re.findall(r'\d+', price_dec)[0]
-            price: float = float(f'{price_main}.{price_dec}')
-        return price
+    def _extract_field(self, container: Any, field_name: str) -> Any:
+        return self.spec.decode_field(field_name, self._compiled_spec.capture(container))
 
-    @staticmethod
-    def extract_prod_name(container: element.Tag) -> str:
-        description_html: element.Tag = container.findChild("div", {"class": "w-product__description"})
-        # description_html.findChild(re.compile("^h[1-6]$"), {"class": 'w-product__title'})
-        return description_html.div.h3.text
-
-    def extract_current_price(self, container: element.Tag) -> float:
-        details_html: element.Tag = container.findChild('span', {"class": "w-currentPrice iss-current-price"})
-        price_main: str = details_html.findChild("span", {"class": "w-product-price__main"}).text
-        price_dec: str = details_html.findChild("sup", {"class": "w-product-price__dec"}).text
-        return self._price_decoding(price_main, price_dec)
-
-    def extract_previous_price(self, container: element.Tag) -> float:
-        details_html: element.Tag = container.findChild('span', {"class": "w-oldPrice"})
-        if details_html:
-            price_main: str = details_html.findChild("span", {"class": "w-product-price__main"}).text
-            price_dec: str = details_html.findChild("sup", {"class": "w-product-price__dec"}).text
-            return self._price_decoding(price_main, price_dec)
+    def extract_prod_name(self, container: Any) -> str:
+        return self._extract_field(container, 'name')
 
-    @staticmethod
-    def extract_image_url(container: element.Tag) -> str:
-        image_html: element.Tag = container.findChild('figure', {"class": "w-product__image"})
-        return f"worten.pt{image_html.img['data-src']}"
+    def extract_current_price(self, container: Any) -> float:
+        return self._extract_field(container, 'price')
+
+    def extract_previous_price(self, container: Any) -> Optional[float]:
+        return self._extract_field(container, 'price_previous')
 
-    def extract_prod_specs(self, container: element.Tag) -> dict[str, Any]:
+    def extract_image_url(self, container: Any) -> str:
+        return self._extract_field(container, 'img_url')
+
+    def extract_prod_specs(self, container: Any) -> dict[str, Any]:
         """
-        parses a product name in a container
+        extracts all the fields of the product in a container, in a single traversal
         """
-        prod: dict = {
-            'name': self.extract_prod_name(container),
-            'price': self.extract_current_price(container),
-            'img_url': self.extract_image_url(container)
-        }
-        price_previous = self.extract_previous_price(container)
-        if price_previous:
-            prod['price_previous'] = price_previous
-        return prod
+        return self._compiled_spec.extract(container)
 
-    def try_extract_prod_specs(self, container):
-        try:
-            return self.extract_prod_specs(container)
-        except (ValueError, TypeError) as e:
-            logger.warning(e)
-            return None
+    def try_extract_prod_specs(self, container: Any) -> Optional[dict[str, Any]]:
+        """
+        like extract_prod_specs, None if the product is invalid (see try_decode_captured)
+        """
+        return self.try_decode_captured(self._compiled_spec.capture(container))
+
+    def _find_containers(self, page_html: str, sliced: Optional[list[str]] = None) -> list[Any]:
+        """
+        :param sliced: the containers already sliced out of the page, if they were
+        """
+        container_tag, container_class = self.spec.container
+        if self.restrict_to_products:
+            if sliced is None:
+                sliced = slice_elements(page_html, container_tag, container_class)
+            page_html = "\n".join(sliced)
+        return self.backend.find_all(page_html, container_tag, container_class)
 
     def parse_containers(
             self,
@@ -82,28 +96,154 @@ class WortenHtmlParser:
         """
         takes a page's raw HTML and extracts the product containers from it
         """
-        # parse webpage
-        page_soup: BeautifulSoup = BeautifulSoup(page_html, 'html.parser')
-        # select product divs
-        containers: element.ResultSet = page_soup.findAll("div", {"class": "w-product__wrapper"})
-        if containers:
-            return [
-                self.try_extract_prod_specs(container) for container in containers
-            ]
-        return []
-
-    def parse_category(self, category: SectionScrape) -> list[dict[str, Any]]:
-        assert category, "no pages to parse"
+        return [self.try_decode_captured(captured) for captured in self.capture_page(page_html)]
+
+    def parse_extracted(
+            self,
+            extracted_products: list[list[Optional[str]]]) -> list[dict[str, Any]]:
+        """
+        takes the products extracted in the browser (see browser_extraction) and
+        turns them into the same records as extract_prod_specs
+        """
+        return [
+            self.try_decode_captured(dict(zip(EXTRACTED_FIELDS, product)))
+            for product in extracted_products
+        ]
+
+    def try_decode_captured(
+            self,
+            fields: dict[str, Optional[str]],
+            skip: Collection[str] = ()) -> Optional[dict[str, Any]]:
+        try:
+            return self.spec.decode(fields, skip)
+        except (ValueError, TypeError, IndexError) as e:
+            logger.warning(e)
+            return None
+
+    def parse_page(
+            self,
+            page: Union[str, list[list[Optional[str]]]]) -> list[dict[str, Any]]:
+        """
+        parses a page whether it's raw HTML or the products extracted in the browser
+        """
+        if isinstance(page, str):
+            return self.parse_containers(page)
+        return self.parse_extracted(page)
+
+    def capture_page(self, page: Union[str, list[list[Optional[str]]]]) -> list[dict[str, Optional[str]]]:
+        """
+        the raw strings of each product in a page (raw HTML or extracted in the
+        browser), before they are decoded
+        """
+        if not isinstance(page, str):
+            return [dict(zip(EXTRACTED_FIELDS, product)) for product in page]
+        if self.cache is None:
+            return [self._compiled_spec.capture(container) for container in self._find_containers(page)]
+
+        # sliced once, for the key and the parsing
+        sliced = slice_elements(page, *self.spec.container)
+        key = self.cache.page_key(sliced, self.spec)
+        captured = self.cache.get(key)
+        if captured is None:
+            captured = [self._compiled_spec.capture(container) for container in self._find_containers(page, sliced)]
+            self.cache.put(key, captured)
+        return captured
+
+    def section_extras(self, section_specs: dict[str, Any]) -> dict[str, Any]:
+        """
+        the extras of the section's ProductBatch: the metadata and category levels
+        """
+        category_lvls = {key: val for key, val in section_specs.items() if key.startswith("category_lvl")}
+        return dict(self.metadata, **category_lvls)
+
+    def parse_page_batch(
+            self,
+            page: Union[str, list[list[Optional[str]]]],
+            section_specs: dict[str, Any]) -> ProductBatch:
+        """
+        parses a page into a ProductBatch, with the metadata and category levels of the section
+        """
+        return self._decode_batch(self.capture_page(page), section_specs)
+
+    def _decode_batch(
+            self,
+            captured: list[dict[str, Optional[str]]],
+            section_specs: dict[str, Any]) -> ProductBatch:
+        """
+        decodes the products like parse_containers (the invalid ones are left out)
+        into a batch, the fields with a batch decoder (prices) are decoded by column
+        """
+        batch_fields = self.spec.batch_fields
+        invalid = np.zeros(len(captured), dtype=bool)
+        decoded: dict[str, np.ndarray] = {}
+        for name in batch_fields:
+            decoded[name], field_invalid = self.spec.decode_column(name, captured)
+            if field_invalid.any():
+                logger.warning(f"{field_invalid.sum()} products without a valid {name}")
+            invalid |= field_invalid
+
+        records: list[dict[str, Any]] = []
+        keep = ~invalid
+        for i, product in enumerate(captured):
+            record = self.try_decode_captured(product, skip=batch_fields) if keep[i] else None
+            if record is None:
+                keep[i] = False
+            else:
+                records.append(record)
+        decoded = {name: values[keep] for name, values in decoded.items()}
+        return ProductBatch.from_records(records, self.spec, self.section_extras(section_specs), decoded)
+
+    def parse_category(self, category: SectionScrape) -> ProductBatch:
+        assert category.html, "no pages to parse"
         specs = category.section_specs
         category_lvl3 = specs['category_lvl3']
         logger.info(f"parsing category: {category_lvl3}")
 
-        parsed_category: list = []
-        category_lvls = {f"category_lvl{i}": specs[f"category_lvl{i}"] for i in range(1, 4)}
-        extra: dict[str, Any] = dict(self.metadata, **category_lvls)
+        captured: list[dict[str, Optional[str]]] = []
         for page_html in category.html:
-            parsed_page_html = self.parse_containers(page_html)
-            parsed_page = dict({'html': parsed_page_html}, **extra)
-            parsed_category.extend(parsed_page)
+            captured.extend(self.capture_page(page_html))
+        parsed_category = self._decode_batch(captured, specs)
         logger.info('Finished parsing Worten')
         return parsed_category
+
+
+class ParserSink(PageSink):
+    """
+    Parses each page as soon as it's scraped, only the products are kept in memory.
+    on_section (if given) receives the products of each section once it's done.
+    The sections are kept apart, several scrapers can share the sink.
+    """
+    def __init__(
+            self,
+            parser: WortenHtmlParser,
+            on_section: Optional[Callable[[ProductBatch, dict[str, Any], dict[str, Any]], None]] = None
+            ) -> None:
+        self.parser = parser
+        self.on_section = on_section
+        self._lock = threading.Lock()
+        # products of each section being scraped, by base URL
+        self._batches: dict[str, list[ProductBatch]] = {}
+
+    def open_section(self, section_specs: dict[str, Any]) -> None:
+        with self._lock:
+            self._batches[section_specs["base_url"]] = []
+
+    def write_page(
+            self,
+            page: Union[str, list[list[Optional[str]]]],
+            page_number: int,
+            section_specs: dict[str, Any]) -> None:
+        batch = self.parser.parse_page_batch(page, section_specs)
+        with self._lock:
+            self._batches[section_specs["base_url"]].append(batch)
+
+    def close_section(self, section_specs: dict[str, Any], metadata: dict[str, Any]) -> None:
+        with self._lock:
+            batches = self._batches.pop(section_specs["base_url"])
+        if self.on_section is not None:
+            products = ProductBatch.concat(batches, self.parser.spec, self.parser.section_extras(section_specs))
+            self.on_section(products, section_specs, metadata)
+
+    def abort_section(self, section_specs: dict[str, Any], error: BaseException) -> None:
+        with self._lock:
+            self._batches.pop(section_specs["base_url"], None)
@@ -0,0 +1,303 @@
+"""
+Declares the fields of a product record and where they are found in a product container
+
+A Capture is a raw string found by following a path of (tag, class) steps
+from the container, each step being the first descendant matching it (like
+chained findChild calls), a FieldSpec decodes one or more captures into a
+field of the record. The spec is compiled once per parser backend into a
+tree of steps, so all the captures of a container are found in a single
+traversal whatever the number of fields. Adding a field is a spec change,
+the same captures are also collected in the browser (see browser_extraction).
+"""
+import re
+from dataclasses import dataclass, field
+from typing import Any, Callable, Collection, Optional, Sequence
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import numpy as np
+
+from web_scraper.transform.parser_backends import ParserBackend
+
+Step = tuple[str, Optional[str]]  # tag, space separated classes
+
+# query parameters of the product links that change between loads of the same page
+TRACKING_PARAMS = r"utm_\w+|sid|session_id"
+
+
+def decode_text(text: str) -> str:
+    return text
+
+
+def decode_price(price_main: str, price_dec: str) -> float:
+    try:
+        price: float = float(f'{price_main}.{price_dec}')
+    except ValueError:
+        price_main = re.findall(r'\d+', price_main)[0]
+        price_dec = re.findall(r'\d+', price_dec)[0]
+        price: float = float(f'{price_main}.{price_dec}')
+    return price
+
+
+def decode_prices(price_main: Sequence[Optional[str]], price_dec: Sequence[Optional[str]]) -> np.ndarray:
+    """
+    decode_price for many products at once, the well formed prices are parsed
+    by numpy in one go and the others one by one (NaN where a price is
+    missing or can't be decoded)
+    """
+    prices = np.full(len(price_main), np.nan, dtype=np.float64)
+    present = [i for i, (main, dec) in enumerate(zip(price_main, price_dec)) if main is not None and dec is not None]
+    if not present:
+        return prices
+    main = np.array([price_main[i] for i in present], dtype=str)
+    dec = np.array([price_dec[i] for i in present], dtype=str)
+    try:
+        prices[present] = np.char.add(np.char.add(main, "."), dec).astype(np.float64)
+    except ValueError:
+        for i in present:
+            try:
+                prices[i] = decode_price(price_main[i], price_dec[i])
+            except (ValueError, IndexError):
+                pass
+    return prices
+
+
+def decode_image_url(image_src: str) -> str:
+    return f"worten.pt{image_src}"
+
+
+def decode_product_url(href: str) -> str:
+    """
+    the product's link without the tracking parameters (see TRACKING_PARAMS)
+    """
+    parts = urlsplit(href)
+    params = parse_qsl(parts.query, keep_blank_values=True)
+    kept = [(name, value) for name, value in params if not re.fullmatch(TRACKING_PARAMS, name)]
+    if len(kept) == len(params):
+        return href
+    return urlunsplit(parts._replace(query=urlencode(kept)))
+
+
+@dataclass(frozen=True)
+class Capture:
+    """
+    :param name: name of the raw string
+    :param path: steps from the container to the element
+    :param attr: attribute of the element to take, its text if None
+    """
+    name: str
+    path: tuple[Step, ...]
+    attr: Optional[str] = None
+
+    @property
+    def css_path(self) -> list[str]:
+        """
+        the steps as CSS selectors
+        """
+        return [
+            tag + "".join(f".{class_token}" for class_token in (class_ or "").split())
+            for tag, class_ in self.path
+        ]
+
+
+@dataclass(frozen=True)
+class FieldSpec:
+    """
+    :param name: field of the product record
+    :param captures: names of the captures passed to the decoder
+    :param decoder: turns the captures into the field value
+    :param required: if a capture is missing, the product is invalid, otherwise
+        the field is left out of the record
+    :param dtype: type of the decoded values, float or str (the column type in a ProductBatch)
+    :param batch_decoder: decodes the captures of many products at once into
+        a float array, NaN where it can't (optional, for the float fields)
+    """
+    name: str
+    captures: tuple[str, ...]
+    decoder: Callable[..., Any]
+    required: bool = True
+    dtype: type = str
+    batch_decoder: Optional[Callable[..., np.ndarray]] = None
+
+
+@dataclass(frozen=True)
+class ProductSpec:
+    container: Step
+    captures: tuple[Capture, ...]
+    fields: tuple[FieldSpec, ...]
+
+    def __post_init__(self) -> None:
+        capture_names = {capture.name for capture in self.captures}
+        for field_spec in self.fields:
+            missing = set(field_spec.captures) - capture_names
+            assert not missing, f"field {field_spec.name} uses undeclared captures {missing}"
+
+    @staticmethod
+    def _decode(field_spec: FieldSpec, captured: dict[str, Optional[str]]) -> Any:
+        values = [captured[name] for name in field_spec.captures]
+        if any(value is None for value in values):
+            if field_spec.required:
+                missing = [name for name, value in zip(field_spec.captures, values) if value is None]
+                raise ValueError(f"no {', '.join(missing)} in product container")
+            return None
+        return field_spec.decoder(*values)
+
+    def _field(self, field_name: str) -> FieldSpec:
+        return next(field_spec for field_spec in self.fields if field_spec.name == field_name)
+
+    @property
+    def batch_fields(self) -> tuple[str, ...]:
+        """
+        the fields with a batch decoder
+        """
+        return tuple(field_spec.name for field_spec in self.fields if field_spec.batch_decoder is not None)
+
+    def decode_field(self, field_name: str, captured: dict[str, Optional[str]]) -> Any:
+        """
+        :return: the value of the field, None if an optional field is missing
+            (raises a ValueError if a required field is missing)
+        """
+        return self._decode(self._field(field_name), captured)
+
+    def decode_column(
+            self,
+            field_name: str,
+            captured: Sequence[dict[str, Optional[str]]]) -> tuple[np.ndarray, np.ndarray]:
+        """
+        decodes a field of many products at once with its batch decoder
+        :return: the values (NaN where missing) and which products are invalid,
+            like in decode: a required field missing or a field that can't be decoded
+        """
+        field_spec = self._field(field_name)
+        raw = [[product[name] for product in captured] for name in field_spec.captures]
+        present = np.array([all(value is not None for value in values) for values in zip(*raw)], dtype=bool)
+        values = field_spec.batch_decoder(*raw)
+        invalid = present & np.isnan(values)
+        if field_spec.required:
+            invalid |= ~present
+        return values, invalid
+
+    def decode(self, captured: dict[str, Optional[str]], skip: Collection[str] = ()) -> dict[str, Any]:
+        """
+        turns the captured strings into a product record, missing optional
+        fields are left out (raises a ValueError if a required one is missing)
+        :param skip: fields not decoded, ex: the ones decoded with decode_column
+        """
+        prod: dict[str, Any] = {}
+        for field_spec in self.fields:
+            if field_spec.name in skip:
+                continue
+            value = self._decode(field_spec, captured)
+            if value is not None:
+                prod[field_spec.name] = value
+        return prod
+
+    def compile(self, backend: ParserBackend) -> "CompiledProductSpec":
+        return CompiledProductSpec(self, backend)
+
+
+@dataclass
+class _StepNode:
+    tag: str
+    classes: frozenset[str]
+    index: int
+    children: list["_StepNode"] = field(default_factory=list)
+
+
+class CompiledProductSpec:
+    """
+    The captures' paths merged into a tree of steps (the paths share their
+    common prefixes), matched on a single traversal of the container
+    """
+    def __init__(self, spec: ProductSpec, backend: ParserBackend) -> None:
+        self.spec = spec
+        self.backend = backend
+        self._roots: list[_StepNode] = []
+        self._capture_steps: list[tuple[Capture, int]] = []
+        nodes: dict[tuple[Step, ...], _StepNode] = {}
+        for capture in spec.captures:
+            siblings = self._roots
+            for depth in range(1, len(capture.path) + 1):
+                prefix = capture.path[:depth]
+                if prefix not in nodes:
+                    tag, class_ = prefix[-1]
+                    nodes[prefix] = _StepNode(tag, frozenset((class_ or "").split()), len(nodes))
+                    siblings.append(nodes[prefix])
+                siblings = nodes[prefix].children
+            self._capture_steps.append((capture, nodes[capture.path].index))
+        self._n_steps = len(nodes)
+
+    def _match(self, container: Any) -> dict[int, Any]:
+        backend = self.backend
+        matched: dict[int, Any] = {}
+
+        def walk(node: Any, open_steps: list[_StepNode]) -> None:
+            for child in backend.children(node):
+                tag = backend.tag(child)
+                classes: Optional[set[str]] = None
+                next_steps: list[_StepNode] = []
+                for step in open_steps:
+                    if step.index in matched or step.tag != tag:
+                        continue
+                    if step.classes:
+                        classes = set(backend.classes(child)) if classes is None else classes
+                        if not step.classes <= classes:
+                            continue
+                    matched[step.index] = child
+                    # the next steps are looked for inside the matched element only
+                    next_steps.extend(step.children)
+                child_steps = [step for step in open_steps if step.index not in matched] + next_steps
+                if child_steps:
+                    walk(child, child_steps)
+                if len(matched) == self._n_steps:
+                    return
+
+        walk(container, self._roots)
+        return matched
+
+    def capture(self, container: Any) -> dict[str, Optional[str]]:
+        """
+        :return: the raw string of each capture, None if it wasn't found
+        """
+        matched = self._match(container)
+        captured: dict[str, Optional[str]] = {}
+        for capture, index in self._capture_steps:
+            node = matched.get(index)
+            if node is None:
+                captured[capture.name] = None
+            elif capture.attr is None:
+                captured[capture.name] = self.backend.text(node)
+            else:
+                captured[capture.name] = self.backend.attr(node, capture.attr)
+        return captured
+
+    def extract(self, container: Any) -> dict[str, Any]:
+        return self.spec.decode(self.capture(container))
+
+
+_CURRENT_PRICE: Step = ("span", "w-currentPrice iss-current-price")
+_OLD_PRICE: Step = ("span", "w-oldPrice")
+_PRICE_MAIN: Step = ("span", "w-product-price__main")
+_PRICE_DEC: Step = ("sup", "w-product-price__dec")
+
+WORTEN_PRODUCT_SPEC = ProductSpec(
+    container=("div", "w-product__wrapper"),
+    captures=(
+        Capture("name", (("div", "w-product__description"), ("div", None), ("h3", None))),
+        Capture("price_main", (_CURRENT_PRICE, _PRICE_MAIN)),
+        Capture("price_dec", (_CURRENT_PRICE, _PRICE_DEC)),
+        Capture("price_previous_main", (_OLD_PRICE, _PRICE_MAIN)),
+        Capture("price_previous_dec", (_OLD_PRICE, _PRICE_DEC)),
+        Capture("img_src", (("figure", "w-product__image"), ("img", None)), attr="data-src"),
+        Capture("href", (("a", "w-product__url"),), attr="href"),
+    ),
+    fields=(
+        FieldSpec("name", ("name",), decode_text),
+        FieldSpec("price", ("price_main", "price_dec"), decode_price, dtype=float, batch_decoder=decode_prices),
+        FieldSpec("img_url", ("img_src",), decode_image_url),
+        FieldSpec(
+            "price_previous", ("price_previous_main", "price_previous_dec"), decode_price,
+            required=False, dtype=float, batch_decoder=decode_prices,
+        ),
+        FieldSpec("url", ("href",), decode_product_url, required=False),
+    ),
+)
@@ -0,0 +1,74 @@
+"""
+Cuts the elements of interest out of a raw HTML page before it's parsed
+
+A listing page is mostly header, menus, scripts and footer, the product
+containers are a small part of it. Scanning the raw string for the container
+start tags and balancing the nested tags until they close is much cheaper than
+building the tree of the whole document, so the parser only builds the
+containers' subtrees.
+"""
+import re
+from functools import lru_cache
+from typing import Pattern
+
+# the contents of comments, scripts and styles can look like tags, they are skipped whole
+# (unrolled as "anything but the first character of the end, or that character
+# when it doesn't start the end", much faster than a lazy .*?)
+_SKIPPED = (
+    r"!--[^-]*(?:-(?!->)[^-]*)*-->"
+    r"|script\b[^<]*(?:<(?!/script)[^<]*)*</script\s*>"
+    r"|style\b[^<]*(?:<(?!/style)[^<]*)*</style\s*>"
+)
+# attribute values may contain ">", so they are matched as quoted strings
+_START_TAG = r"{tag}\b[^>\"']*(?:(?:\"[^\"]*\"|'[^']*')[^>\"']*)*>"
+_CLASS_ATTR = re.compile(r"""\sclass\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+))""", re.IGNORECASE)
+
+
+@lru_cache(maxsize=None)
+def _tag_tokens(tag: str) -> Pattern:
+    # the common "<" prefix lets the regex engine jump from one "<" to the next
+    return re.compile(
+        f"<(?:(?P<skipped>{_SKIPPED})|(?P<start>{_START_TAG.format(tag=tag)})|(?P<end>/{tag}\\s*>))",
+        re.IGNORECASE | re.DOTALL,
+    )
+
+
+def _has_class(start_tag: str, class_: str) -> bool:
+    match = _CLASS_ATTR.search(start_tag)
+    if match is None:
+        return False
+    classes = next(group for group in match.groups() if group is not None).split()
+    return all(class_token in classes for class_token in class_.split())
+
+
+def slice_elements(page_html: str, tag: str, class_: str) -> list[str]:
+    """
+    Finds the outermost elements with the tag and all the class tokens in the raw HTML
+    :param page_html: raw HTML of the page
+    :param tag: tag of the elements (they can contain elements with the same tag)
+    :param class_: space separated class tokens the elements must all have
+    :return: the HTML of each element, from its start tag to its matching end
+        tag (or the end of the page if it isn't closed)
+    """
+    fragments: list[str] = []
+    start, depth = 0, 0
+    for token in _tag_tokens(tag).finditer(page_html):
+        if token.lastgroup == "skipped":
+            continue
+        # self-closing start tags (<div/>) open and close the element
+        self_closing = token.lastgroup == "start" and token.group().endswith("/>")
+        if depth == 0:
+            if token.lastgroup == "start" and _has_class(token.group(), class_):
+                if self_closing:
+                    fragments.append(token.group())
+                else:
+                    start, depth = token.start(), 1
+        elif token.lastgroup == "start":
+            depth += 0 if self_closing else 1
+        else:
+            depth -= 1
+            if depth == 0:
+                fragments.append(page_html[start:token.end()])
+    if depth > 0:
+        fragments.append(page_html[start:])
+    return fragments
@@ -0,0 +1,129 @@
+"""
+Defines the parse cache, which skips parsing pages already parsed before
+
+Most listing pages don't change from one week to the next, apart from tokens
+(nonces, tracking ids, inline scripts) that have nothing to do with the
+products. A page is identified by the hash of its product containers with
+those tokens removed, and the products captured from it (see field_spec) are
+kept in an in-memory LRU backed by a SQLite file. The captures are cached
+rather than the decoded records, so changing a decoder doesn't invalidate
+the cache, changing what is captured does (the spec is part of the key).
+The volatile tokens must not end up in the records: the product links are
+captured with their tracking parameters, which decode_product_url drops.
+"""
+import re
+import json
+import sqlite3
+import hashlib
+import threading
+from pathlib import Path
+from functools import lru_cache
+from collections import OrderedDict
+from typing import Optional, Pattern, Sequence
+
+from web_scraper.transform.field_spec import TRACKING_PARAMS, ProductSpec
+
+Captured = list[dict[str, Optional[str]]]
+
+# attributes that change between loads of the same page
+VOLATILE_PATTERNS: tuple[str, ...] = (
+    r"""\snonce=(?:"[^"]*"|'[^']*')""",
+    r"""\sdata-(?:impression|tracking|gtm|session)[\w-]*=(?:"[^"]*"|'[^']*')""",
+    rf"""[?&](?:{TRACKING_PARAMS})=[^"'&\s>]*""",
+)
+
+
+@lru_cache(maxsize=None)
+def spec_fingerprint(spec: ProductSpec) -> str:
+    """
+    hash of what the spec captures and where
+    """
+    captures = [[capture.name, capture.path, capture.attr] for capture in spec.captures]
+    return hashlib.sha256(json.dumps([spec.container, captures]).encode()).hexdigest()[:16]
+
+
+class ParseCache:
+    """
+    Captured products of each page, by normalized page hash
+    :param path: SQLite file the cache is persisted to (only in memory if None)
+    :param max_entries: pages kept in memory, the least recently used are dropped
+    :param volatile_patterns: regexes of the parts of the product containers to ignore
+    """
+    def __init__(
+            self,
+            path: Optional[Path] = None,
+            max_entries: int = 4096,
+            volatile_patterns: Sequence[str] = VOLATILE_PATTERNS) -> None:
+        self.path = Path(path) if path is not None else None
+        self.max_entries = max_entries
+        self._volatile: list[Pattern] = [re.compile(pattern) for pattern in volatile_patterns]
+        self._memory: OrderedDict[str, Captured] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        # sqlite connections can't be shared between threads
+        self._local = threading.local()
+        if self.path is not None:
+            self.path.parent.mkdir(exist_ok=True, parents=True)
+            connection = self._connection()
+            # several parsing processes can share the file
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS pages (key TEXT PRIMARY KEY, captured TEXT NOT NULL)"
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        if getattr(self._local, "connection", None) is None:
+            self._local.connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        return self._local.connection
+
+    def page_key(self, containers: Sequence[str], spec: ProductSpec) -> str:
+        """
+        :param containers: the page's product containers, sliced out of it (see slice_elements)
+        :return: hash of the containers without the volatile tokens, prefixed
+            with the spec's fingerprint
+        """
+        normalized = "\n".join(containers)
+        for pattern in self._volatile:
+            normalized = pattern.sub("", normalized)
+        return f"{spec_fingerprint(spec)}:{hashlib.sha256(normalized.encode()).hexdigest()}"
+
+    def _remember(self, key: str, captured: Captured) -> None:
+        with self._lock:
+            self._memory[key] = captured
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def get(self, key: str) -> Optional[Captured]:
+        with self._lock:
+            captured = self._memory.get(key)
+            if captured is not None:
+                self._memory.move_to_end(key)
+        if captured is None and self.path is not None:
+            row = self._connection().execute("SELECT captured FROM pages WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                captured = json.loads(row[0])
+                self._remember(key, captured)
+        with self._lock:
+            if captured is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if captured is None:
+            return None
+        # copies, the caller may change the products
+        return [dict(product) for product in captured]
+
+    def put(self, key: str, captured: Captured) -> None:
+        captured = [dict(product) for product in captured]
+        self._remember(key, captured)
+        if self.path is not None:
+            self._connection().execute(
+                "INSERT OR REPLACE INTO pages (key, captured) VALUES (?, ?)", (key, json.dumps(captured))
+            )
+
+    def __len__(self) -> int:
+        if self.path is None:
+            return len(self._memory)
+        return self._connection().execute("SELECT COUNT(*) FROM pages").fetchone()[0]
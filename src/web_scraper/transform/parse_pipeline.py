@@ -0,0 +1,119 @@
+"""
+Defines the parsing pipeline, which parses the scraped sections in worker
+processes while the scraper moves on to the next sections
+
+Parsing is CPU bound and the scraping mostly waits for the browser, so
+running them one after the other leaves the browser idle while parsing and
+only ever uses one core for it.
+"""
+from pathlib import Path
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Iterable, Iterator, Optional, Union
+
+from web_scraper.support import utils
+from web_scraper.extract.scraper_base import SectionScrape
+from web_scraper.transform.content_parser import WortenHtmlParser
+from web_scraper.transform.parser_backends import ParserBackend
+from web_scraper.transform.product_batch import ProductBatch
+from web_scraper.transform.parse_cache import ParseCache
+
+logger = utils.log_ws(__name__)
+
+# each worker process builds its parser once, in _init_worker
+_worker_parser: Optional[WortenHtmlParser] = None
+
+
+def _init_worker(
+        metadata: dict[str, Any],
+        backend: str,
+        restrict_to_products: bool,
+        cache_path: Optional[Path]) -> None:
+    global _worker_parser
+    cache = ParseCache(cache_path) if cache_path is not None else None
+    _worker_parser = WortenHtmlParser(metadata, backend, restrict_to_products, cache=cache)
+
+
+def _parse_page(
+        page: Union[str, list[list[Optional[str]]]],
+        section_specs: dict[str, Any]) -> ProductBatch:
+    # the batch's arrays are much cheaper to send back than product dicts
+    return _worker_parser.parse_page_batch(page, section_specs)
+
+
+class ParsePipeline:
+    """
+    Parses sections in a pool of WortenHtmlParser worker processes, a task per page
+    :param metadata: parser metadata (see WortenHtmlParser)
+    :param n_workers: number of parsing processes
+    :param max_in_flight: sections being parsed at the same time, once reached
+        the sections aren't consumed until the oldest one is parsed
+    :param backend: name of the parser backend (instances can't be sent to the workers)
+    :param restrict_to_products: see WortenHtmlParser
+    :param cache_path: file of the ParseCache shared by the workers (no cache if None)
+    """
+    def __init__(
+            self,
+            metadata: dict[str, Any],
+            n_workers: int = 2,
+            max_in_flight: int = 4,
+            backend: str = 'html.parser',
+            restrict_to_products: bool = True,
+            cache_path: Optional[Path] = None) -> None:
+        assert n_workers > 0 and max_in_flight > 0, "n_workers and max_in_flight must be positive"
+        assert not isinstance(backend, ParserBackend), "the backend must be given by name"
+        self.n_workers = n_workers
+        self.max_in_flight = max_in_flight
+        # the date defaults once for all the workers, the empty sections get the same extras
+        self._parser = WortenHtmlParser(metadata, backend, restrict_to_products)
+        self._executor = ProcessPoolExecutor(
+            max_workers=n_workers,
+            initializer=_init_worker,
+            initargs=(self._parser.metadata, backend, restrict_to_products, cache_path),
+        )
+
+    def submit(self, section: SectionScrape) -> list[Future]:
+        """
+        :return: a future per page, each with the page's ProductBatch
+        """
+        return [self._executor.submit(_parse_page, page, section.section_specs) for page in section.html]
+
+    def _gather(self, pending: tuple[SectionScrape, list[Future]]) -> tuple[SectionScrape, ProductBatch]:
+        section, futures = pending
+        products = ProductBatch.concat(
+            (future.result() for future in futures),
+            self._parser.spec,
+            self._parser.section_extras(section.section_specs),
+        )
+        logger.info(f"parsed {len(products)} products of {section.section_specs.get('category_lvl3')}")
+        return section, products
+
+    def map(
+            self,
+            sections: Iterable[Optional[SectionScrape]]
+            ) -> Iterator[tuple[SectionScrape, ProductBatch]]:
+        """
+        Parses the sections as they come (the iterable can be the scraping
+        generator, it keeps scraping while the previous sections are parsed)
+        :return: the sections with their products, in the order the sections came
+        """
+        pending: deque[tuple[SectionScrape, list[Future]]] = deque()
+        for section in sections:
+            if section is None:  # failed to scrape
+                continue
+            pending.append((section, self.submit(section)))
+            # yield what's already parsed and wait for the oldest section when the queue is full
+            while pending and (
+                    len(pending) >= self.max_in_flight or all(f.done() for f in pending[0][1])):
+                yield self._gather(pending.popleft())
+        while pending:
+            yield self._gather(pending.popleft())
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def __enter__(self) -> "ParsePipeline":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
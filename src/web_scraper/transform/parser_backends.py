@@ -0,0 +1,193 @@
+"""
+Defines the HTML parsing backends WortenHtmlParser can run on
+
+They all expose the few operations the product extractors need (find the
+product containers, find a descendant by tag and class, get a text or an
+attribute), so the same extractors produce the same records whatever the
+backend. html.parser (BeautifulSoup) is the reference backend, lxml and
+selectolax are much faster but are optional dependencies.
+"""
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from typing import Any, Iterable, Optional, Type, Union
+
+from bs4 import BeautifulSoup, Tag
+
+
+class ParserBackend(ABC):
+    """
+    Operations on a parsed HTML tree, nodes are whatever the backend uses
+    """
+    name: str
+
+    @abstractmethod
+    def find_all(self, page_html: str, tag: str, class_: str) -> list[Any]:
+        """
+        Parses the page and finds all the elements with the tag and class
+        """
+
+    @abstractmethod
+    def find(self, node: Any, tag: str, class_: Optional[str] = None) -> Optional[Any]:
+        """
+        First descendant of the node with the tag (and class if given), None if there is none
+        """
+
+    @abstractmethod
+    def text(self, node: Any) -> str:
+        """
+        Text of the node and all its descendants
+        """
+
+    @abstractmethod
+    def attr(self, node: Any, name: str) -> Optional[str]:
+        pass
+
+    @abstractmethod
+    def children(self, node: Any) -> Iterable[Any]:
+        """
+        Child elements of the node (no text nodes)
+        """
+
+    @abstractmethod
+    def tag(self, node: Any) -> str:
+        pass
+
+    @abstractmethod
+    def classes(self, node: Any) -> list[str]:
+        pass
+
+
+class Bs4Backend(ParserBackend):
+    """
+    BeautifulSoup with the python html.parser, slow but the reference behaviour
+    """
+    name = 'html.parser'
+
+    def find_all(self, page_html: str, tag: str, class_: str) -> list[Any]:
+        page_soup = BeautifulSoup(page_html, 'html.parser')
+        return page_soup.findAll(tag, {"class": class_})
+
+    def find(self, node: Any, tag: str, class_: Optional[str] = None) -> Optional[Any]:
+        if class_ is None:
+            return node.findChild(tag)
+        return node.findChild(tag, {"class": class_})
+
+    def text(self, node: Any) -> str:
+        return node.text
+
+    def attr(self, node: Any, name: str) -> Optional[str]:
+        return node.get(name)
+
+    def children(self, node: Any) -> Iterable[Any]:
+        return (child for child in node.children if isinstance(child, Tag))
+
+    def tag(self, node: Any) -> str:
+        return node.name
+
+    def classes(self, node: Any) -> list[str]:
+        return node.get("class", [])
+
+
+class LxmlBackend(ParserBackend):
+    """
+    lxml (libxml2) HTML parser with compiled XPath queries
+    """
+    name = 'lxml'
+
+    def __init__(self) -> None:
+        import lxml.html
+        from lxml import etree
+        self._html = lxml.html
+        self._etree = etree
+
+    @lru_cache(maxsize=None)
+    def _xpath(self, tag: str, class_: Optional[str], relative: bool = True) -> Any:
+        conditions = "".join(
+            f"[contains(concat(' ', normalize-space(@class), ' '), ' {class_token} ')]"
+            for class_token in (class_ or "").split()
+        )
+        prefix = ".//" if relative else "//"
+        return self._etree.XPath(f"{prefix}{tag}{conditions}")
+
+    def find_all(self, page_html: str, tag: str, class_: str) -> list[Any]:
+        if not page_html.strip():
+            return []
+        tree = self._html.document_fromstring(page_html)
+        return self._xpath(tag, class_, relative=False)(tree)
+
+    def find(self, node: Any, tag: str, class_: Optional[str] = None) -> Optional[Any]:
+        matches = self._xpath(tag, class_)(node)
+        return matches[0] if matches else None
+
+    def text(self, node: Any) -> str:
+        return node.text_content()
+
+    def attr(self, node: Any, name: str) -> Optional[str]:
+        return node.get(name)
+
+    def children(self, node: Any) -> Iterable[Any]:
+        return node.iterchildren()
+
+    def tag(self, node: Any) -> str:
+        # comments and processing instructions have a function as tag
+        return node.tag if isinstance(node.tag, str) else ""
+
+    def classes(self, node: Any) -> list[str]:
+        return (node.get("class") or "").split()
+
+
+class SelectolaxBackend(ParserBackend):
+    """
+    selectolax parser with CSS selectors, on the Lexbor engine (the Modest one is
+    deprecated since selectolax 1.0 but still used by older versions)
+    """
+    name = 'selectolax'
+
+    def __init__(self) -> None:
+        try:
+            from selectolax.lexbor import LexborHTMLParser as HTMLParser
+        except ImportError:
+            from selectolax.parser import HTMLParser
+        self._parser = HTMLParser
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def _selector(tag: str, class_: Optional[str]) -> str:
+        return tag + "".join(f".{class_token}" for class_token in (class_ or "").split())
+
+    def find_all(self, page_html: str, tag: str, class_: str) -> list[Any]:
+        return self._parser(page_html).css(self._selector(tag, class_))
+
+    def find(self, node: Any, tag: str, class_: Optional[str] = None) -> Optional[Any]:
+        return node.css_first(self._selector(tag, class_))
+
+    def text(self, node: Any) -> str:
+        return node.text(deep=True)
+
+    def attr(self, node: Any, name: str) -> Optional[str]:
+        return node.attributes.get(name)
+
+    def children(self, node: Any) -> Iterable[Any]:
+        return node.iter(include_text=False)
+
+    def tag(self, node: Any) -> str:
+        return node.tag
+
+    def classes(self, node: Any) -> list[str]:
+        return (node.attributes.get("class") or "").split()
+
+
+PARSER_BACKENDS: dict[str, Type[ParserBackend]] = {
+    backend.name: backend for backend in (Bs4Backend, LxmlBackend, SelectolaxBackend)
+}
+
+
+def get_backend(backend: Union[str, ParserBackend]) -> ParserBackend:
+    """
+    :param backend: name of the backend (see PARSER_BACKENDS) or a backend instance
+    :return: the backend instance
+    """
+    if isinstance(backend, ParserBackend):
+        return backend
+    assert backend in PARSER_BACKENDS, f"backend must be one of {list(PARSER_BACKENDS)}"
+    return PARSER_BACKENDS[backend]()
@@ -0,0 +1,334 @@
+"""
+Defines ProductBatch, the parsed products of a section stored by column
+
+A list of product dicts repeats the keys, the date and the category levels in
+every record and keeps each price as a python float. The batch has a column
+per field of the product spec: the float fields (prices) in float64 arrays,
+NaN where missing, the strings in a single UTF-8 buffer with offsets, and
+the columns shared by many products (metadata and category levels)
+dictionary encoded. The columns can be handed to NumPy and Arrow without
+copying the values.
+"""
+from dataclasses import dataclass, field
+from typing import Any, Iterable, Mapping, Optional, Sequence, Union
+
+import numpy as np
+
+from web_scraper.transform.field_spec import WORTEN_PRODUCT_SPEC, ProductSpec
+from web_scraper.transform.product_index import product_key
+
+
+def _validity_bitmap(valid: Optional[np.ndarray]) -> Any:
+    """
+    Arrow wants the validity as a little-endian bitmap (None when there are no nulls)
+    """
+    import pyarrow as pa
+    if valid is None or valid.all():
+        return None
+    return pa.py_buffer(np.packbits(valid, bitorder="little"))
+
+
+@dataclass(frozen=True)
+class StringColumn:
+    """
+    Strings stored as in Arrow: the UTF-8 bytes of all of them one after the
+    other and the offset where each one starts (n + 1 offsets), valid is
+    False for the null strings (None if there are none)
+    """
+    offsets: np.ndarray
+    data: bytes
+    valid: Optional[np.ndarray] = None
+
+    @classmethod
+    def from_strings(cls, strings: Sequence[Optional[str]]) -> "StringColumn":
+        encoded = [string.encode() if string is not None else b"" for string in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int32)
+        offsets[1:] = np.cumsum([len(string) for string in encoded])
+        valid = None
+        if any(string is None for string in strings):
+            valid = np.array([string is not None for string in strings], dtype=bool)
+        return cls(offsets, b"".join(encoded), valid)
+
+    @staticmethod
+    def concat(columns: Sequence["StringColumn"]) -> "StringColumn":
+        # the bytes are joined and the offsets of each column shifted by the bytes before it
+        starts = np.cumsum([0] + [len(column.data) for column in columns])
+        offsets = [column.offsets[:-1] + start for column, start in zip(columns, starts)]
+        offsets.append(np.array([starts[-1]]))
+        valid = None
+        if any(column.valid is not None for column in columns):
+            valid = np.concatenate([
+                column.valid if column.valid is not None else np.ones(len(column), dtype=bool)
+                for column in columns
+            ])
+        return StringColumn(
+            np.concatenate(offsets).astype(np.int32), b"".join(column.data for column in columns), valid
+        )
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> Optional[str]:
+        if self.valid is not None and not self.valid[i]:
+            return None
+        return self.data[self.offsets[i]:self.offsets[i + 1]].decode()
+
+    def to_list(self) -> list[Optional[str]]:
+        return [self[i] for i in range(len(self))]
+
+    def take(self, indices: np.ndarray) -> "StringColumn":
+        return StringColumn.from_strings([self[i] for i in indices])
+
+    @property
+    def nbytes(self) -> int:
+        return self.offsets.nbytes + len(self.data) + (self.valid.nbytes if self.valid is not None else 0)
+
+    def to_arrow(self) -> Any:
+        import pyarrow as pa
+        return pa.StringArray.from_buffers(
+            len(self), pa.py_buffer(self.offsets), pa.py_buffer(self.data), _validity_bitmap(self.valid)
+        )
+
+
+@dataclass(frozen=True)
+class DictionaryColumn:
+    """
+    Column with few distinct values: the values (dictionary) and the index of each row's value (codes)
+    """
+    codes: np.ndarray
+    dictionary: tuple[str, ...]
+
+    @classmethod
+    def constant(cls, value: Any, n_rows: int) -> "DictionaryColumn":
+        return cls(np.zeros(n_rows, dtype=np.int32), (str(value),))
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def to_list(self) -> list[str]:
+        return [self.dictionary[code] for code in self.codes]
+
+    def take(self, indices: np.ndarray) -> "DictionaryColumn":
+        return DictionaryColumn(self.codes[indices], self.dictionary)
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + sum(len(value) for value in self.dictionary)
+
+    def to_arrow(self) -> Any:
+        import pyarrow as pa
+        return pa.DictionaryArray.from_arrays(pa.array(self.codes), pa.array(self.dictionary, pa.string()))
+
+    @staticmethod
+    def concat(columns: Sequence["DictionaryColumn"]) -> "DictionaryColumn":
+        dictionary: dict[str, int] = {}
+        codes = [np.zeros(0, dtype=np.int32)]
+        for column in columns:
+            # maps the column's codes to the codes of the merged dictionary
+            remap = [dictionary.setdefault(value, len(dictionary)) for value in column.dictionary]
+            codes.append(np.array(remap, dtype=np.int32)[column.codes] if remap else column.codes)
+        return DictionaryColumn(np.concatenate(codes), tuple(dictionary))
+
+
+FieldColumn = Union[np.ndarray, StringColumn]
+
+
+@dataclass
+class ProductBatch:
+    """
+    Products of a section by column, a column per field of the product spec:
+    float64 arrays for the float fields (NaN where an optional field is
+    missing) and StringColumns for the others (null where it's missing)
+    :param extras: columns that repeat the same few values, ex: the date and category levels
+    """
+    columns: dict[str, FieldColumn]
+    extras: dict[str, DictionaryColumn] = field(default_factory=dict)
+
+    @classmethod
+    def from_records(
+            cls,
+            records: Sequence[dict[str, Any]],
+            spec: ProductSpec = WORTEN_PRODUCT_SPEC,
+            extras: Optional[dict[str, Any]] = None,
+            decoded: Optional[dict[str, np.ndarray]] = None) -> "ProductBatch":
+        """
+        :param records: products decoded with the spec (see ProductSpec.decode)
+        :param spec: its fields are the columns of the batch
+        :param extras: values shared by all the products
+        :param decoded: columns of the fields decoded apart, left out of the
+            records (see ProductSpec.decode_column)
+        """
+        columns: dict[str, FieldColumn] = {}
+        for field_spec in spec.fields:
+            if decoded and field_spec.name in decoded:
+                columns[field_spec.name] = decoded[field_spec.name]
+                continue
+            values = [record.get(field_spec.name) for record in records]
+            if field_spec.dtype is float:
+                columns[field_spec.name] = np.array(
+                    [np.nan if value is None else value for value in values], dtype=np.float64
+                )
+            else:
+                columns[field_spec.name] = StringColumn.from_strings(values)
+        return cls(
+            columns,
+            extras={key: DictionaryColumn.constant(value, len(records)) for key, value in (extras or {}).items()},
+        )
+
+    @classmethod
+    def concat(
+            cls,
+            batches: Iterable["ProductBatch"],
+            spec: ProductSpec = WORTEN_PRODUCT_SPEC,
+            extras: Optional[dict[str, Any]] = None) -> "ProductBatch":
+        """
+        :param spec: the columns if there are no batches
+        :param extras: the extras if there are no batches (like in from_records)
+        """
+        batches = list(batches)
+        if not batches:
+            return cls.from_records([], spec, extras)
+        names, extra_keys = list(batches[0].columns), list(batches[0].extras)
+        assert all(list(batch.columns) == names for batch in batches), "batches have different fields"
+        assert all(list(batch.extras) == extra_keys for batch in batches), "batches have different extras"
+        columns: dict[str, FieldColumn] = {}
+        for name in names:
+            parts = [batch.columns[name] for batch in batches]
+            columns[name] = StringColumn.concat(parts) if isinstance(parts[0], StringColumn) else np.concatenate(parts)
+        return cls(
+            columns,
+            extras={key: DictionaryColumn.concat([batch.extras[key] for batch in batches]) for key in extra_keys},
+        )
+
+    def __len__(self) -> int:
+        return len(next(iter(self.columns.values()))) if self.columns else 0
+
+    def column(self, name: str) -> FieldColumn:
+        return self.columns[name]
+
+    def _strings(self, name: str) -> list[Optional[str]]:
+        column = self.columns.get(name)
+        return column.to_list() if column is not None else [None] * len(self)
+
+    def take(self, indices: np.ndarray) -> "ProductBatch":
+        """
+        :param indices: rows to keep (indices or boolean mask)
+        """
+        indices = np.flatnonzero(indices) if np.asarray(indices).dtype == bool else np.asarray(indices)
+        return ProductBatch(
+            {name: column.take(indices) if isinstance(column, StringColumn) else column[indices]
+             for name, column in self.columns.items()},
+            extras={key: column.take(indices) for key, column in self.extras.items()},
+        )
+
+    def product_keys(self) -> list[str]:
+        """
+        :return: the identity of each product, see product_key
+        """
+        return [
+            product_key(url, name, img_url)
+            for url, name, img_url in zip(self._strings("url"), self._strings("name"), self._strings("img_url"))
+        ]
+
+    @property
+    def nbytes(self) -> int:
+        return (
+            sum(column.nbytes for column in self.columns.values())
+            + sum(column.nbytes for column in self.extras.values())
+        )
+
+    def to_numpy(self) -> dict[str, np.ndarray]:
+        """
+        :return: the columns as arrays, the float columns are masked (where
+            NaN) views of the batch's arrays, not copies
+        """
+        columns: dict[str, np.ndarray] = {}
+        for name, column in self.columns.items():
+            if isinstance(column, StringColumn):
+                columns[name] = np.array(column.to_list(), dtype=object)
+            else:
+                columns[name] = np.ma.masked_invalid(column, copy=False)
+        for key, column in self.extras.items():
+            columns[key] = np.array(column.dictionary, dtype=object)[column.codes]
+        return columns
+
+    def to_arrow(self) -> Any:
+        """
+        :return: a pyarrow RecordBatch sharing the batch's buffers (requires pyarrow)
+        """
+        import pyarrow as pa
+        columns = {}
+        for name, column in self.columns.items():
+            if isinstance(column, StringColumn):
+                columns[name] = column.to_arrow()
+            else:
+                # only the validity mask is copied (into a bitmap)
+                columns[name] = pa.Array.from_buffers(
+                    pa.float64(), len(self), [_validity_bitmap(~np.isnan(column)), pa.py_buffer(column)]
+                )
+        columns.update({key: column.to_arrow() for key, column in self.extras.items()})
+        return pa.RecordBatch.from_arrays(list(columns.values()), names=list(columns))
+
+    def to_arrays(self) -> dict[str, np.ndarray]:
+        """
+        :return: the buffers of the batch by name, to save it with np.savez (see from_arrays)
+        """
+        arrays: dict[str, np.ndarray] = {}
+        for name, column in self.columns.items():
+            if isinstance(column, StringColumn):
+                arrays[f"string:{name}:offsets"] = column.offsets
+                arrays[f"string:{name}:data"] = np.frombuffer(column.data, dtype=np.uint8)
+                if column.valid is not None:
+                    arrays[f"string:{name}:valid"] = column.valid
+            else:
+                arrays[f"float:{name}"] = column
+        for key, column in self.extras.items():
+            arrays[f"extra:{key}:codes"] = column.codes
+            arrays[f"extra:{key}:dictionary"] = np.array(column.dictionary, dtype=str)
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays: Mapping[str, np.ndarray]) -> "ProductBatch":
+        """
+        :param arrays: see to_arrays (other names are ignored), ex: a file loaded with np.load
+        """
+        columns: dict[str, FieldColumn] = {}
+        extras: dict[str, DictionaryColumn] = {}
+        for name in arrays:
+            kind, _, rest = name.partition(":")
+            if kind == "float":
+                columns[rest] = arrays[name]
+            elif kind == "string" and rest.endswith(":offsets"):
+                field_name = rest[:-len(":offsets")]
+                valid = f"string:{field_name}:valid"
+                columns[field_name] = StringColumn(
+                    arrays[name],
+                    arrays[f"string:{field_name}:data"].tobytes(),
+                    arrays[valid] if valid in arrays else None,
+                )
+            elif kind == "extra" and rest.endswith(":codes"):
+                key = rest[:-len(":codes")]
+                extras[key] = DictionaryColumn(
+                    arrays[name], tuple(str(value) for value in arrays[f"extra:{key}:dictionary"])
+                )
+        return cls(columns, extras)
+
+    def to_records(self) -> list[dict[str, Any]]:
+        """
+        :return: the products as dicts, like WortenHtmlParser.parse_containers with the extras added
+        """
+        values = {
+            name: column.to_list() if isinstance(column, StringColumn) else column.tolist()
+            for name, column in self.columns.items()
+        }
+        extras = {key: column.to_list() for key, column in self.extras.items()}
+        records = []
+        for i in range(len(self)):
+            # the missing fields are left out, like ProductSpec.decode does
+            prod: dict[str, Any] = {
+                name: column[i] for name, column in values.items()
+                if column[i] is not None and column[i] == column[i]  # not NaN
+            }
+            prod.update((key, column[i]) for key, column in extras.items())
+            records.append(prod)
+        return records
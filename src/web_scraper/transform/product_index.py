@@ -0,0 +1,123 @@
+"""
+Defines the product index, which recognises the products already parsed in the run
+
+The same product is listed under several level 3 categories. The index keeps
+every product seen in the run (by its URL, or its name and image when it has
+none) with the categories it was found in, so a product is only output the
+first time, with the list of its categories. It's a SQLite file, the products
+of a run don't have to fit in memory. See StagedProducts, which fills it.
+"""
+import sqlite3
+import hashlib
+import threading
+from pathlib import Path
+from typing import Any, Optional, Sequence
+
+import numpy as np
+
+
+def product_key(url: Optional[str], name: str, img_url: str) -> str:
+    """
+    :return: the product's URL without the query string, or a hash of its
+        name and image if it has no URL
+    """
+    if url:
+        return "url:" + url.split("?")[0].split("#")[0]
+    return "name_img:" + hashlib.sha1(f"{name.strip()}|{img_url}".encode()).hexdigest()
+
+
+def category_path(section_specs: dict[str, Any]) -> str:
+    return "/".join(str(section_specs.get(f"category_lvl{i}")) for i in range(1, 4))
+
+
+class ProductIndex:
+    """
+    Products seen in a run and the categories each one was found in
+    """
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(exist_ok=True, parents=True)
+        # sqlite connections can't be shared between threads
+        self._local = threading.local()
+        connection = self._connection()
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS products (
+                product_key TEXT PRIMARY KEY,
+                category TEXT NOT NULL
+            )
+            """
+        )
+        connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS product_categories (
+                product_key TEXT NOT NULL,
+                category TEXT NOT NULL,
+                PRIMARY KEY (product_key, category)
+            )
+            """
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        if getattr(self._local, "connection", None) is None:
+            self._local.connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        return self._local.connection
+
+    def clear(self) -> None:
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        connection.execute("DELETE FROM products")
+        connection.execute("DELETE FROM product_categories")
+        connection.execute("COMMIT")
+
+    def register(self, keys: Sequence[str], category: str) -> np.ndarray:
+        """
+        Adds the products found in a category
+        :return: mask of the products seen for the first time (duplicates
+            within keys included, only their first occurrence is new)
+        """
+        connection = self._connection()
+        first_seen = np.zeros(len(keys), dtype=bool)
+        # a single write transaction, the other processes wait for it
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            for i, key in enumerate(keys):
+                cursor = connection.execute(
+                    "INSERT OR IGNORE INTO products (product_key, category) VALUES (?, ?)", (key, category)
+                )
+                first_seen[i] = cursor.rowcount == 1
+            connection.executemany(
+                "INSERT OR IGNORE INTO product_categories (product_key, category) VALUES (?, ?)",
+                [(key, category) for key in keys]
+            )
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        return first_seen
+
+    def categories(self, key: str) -> list[str]:
+        rows = self._connection().execute(
+            "SELECT category FROM product_categories WHERE product_key = ? ORDER BY rowid", (key,)
+        )
+        return [row[0] for row in rows]
+
+    def categories_by_product(self) -> dict[str, list[str]]:
+        categories: dict[str, list[str]] = {}
+        rows = self._connection().execute("SELECT product_key, category FROM product_categories ORDER BY rowid")
+        for key, category in rows:
+            categories.setdefault(key, []).append(category)
+        return categories
+
+    def with_categories(self, records: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        """
+        :return: the product records, each with the list of categories it was found in
+        """
+        return [
+            dict(record, categories=self.categories(product_key(record.get("url"), record["name"], record["img_url"])))
+            for record in records
+        ]
+
+    def __len__(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM products").fetchone()[0]